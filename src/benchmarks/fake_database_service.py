@@ -0,0 +1,307 @@
+import asyncio
+import itertools
+import json
+from bisect import bisect_right
+from collections import Counter, defaultdict
+from types import SimpleNamespace
+from typing import Dict, List, Optional
+
+from fastapi import FastAPI, HTTPException, Request, UploadFile, File
+from fastapi.responses import Response
+
+from src.database_service.cursors import decode_cursor, encode_cursor
+from src.database_service.filter_index import FilterIndex, IndexedFilter, RANGE_FIELDS
+from src.database_service.search_sessions import SearchSessionStore
+
+FILTER_FIELDS = (
+    "name", "property_type", "deal_type", "city", "areas", "min_price", "max_price", "min_rooms", "max_rooms",
+    "min_total_area", "max_total_area", "balcony", "renovated", "min_deposit", "max_deposit", "floor",
+    "is_active", "total_floors",
+)
+
+PROPERTY_FIELDS = (
+    "return_contact", "property_type", "deal_type", "price", "city", "area", "street", "house_number",
+    "apartment_number", "rooms", "balcony", "renovated", "total_area", "floor", "total_floors", "deposit",
+    "description",
+)
+
+PHOTO_BYTES = b"\xff\xd8\xff\xe0" + b"\x00" * 4096
+# Уменьшенные варианты отдаются короче, как и в настоящем сервисе
+PHOTO_SIZE_BYTES = {"thumb": 512, "card": 2048}
+
+
+def _areas_json(value) -> Optional[str]:
+    if value is None:
+        return None
+    if isinstance(value, list):
+        return json.dumps(value)
+    return json.dumps([area.strip() for area in str(value).split(",")])
+
+
+class FakeDatabase:
+    """Данные database_service в памяти с той же семантикой ответов"""
+
+    def __init__(self):
+        self.admins = set()
+        self.admin_version = 0
+        self.users = set()
+        self.filters: Dict[int, Dict] = {}
+        self.properties: Dict[int, Dict] = {}
+        self.property_ids: List[int] = []
+        self.photos: Dict[int, int] = {}
+        self.favorites: Dict[int, Dict] = {}
+        self.statistics: Dict[int, Counter] = defaultdict(Counter)
+        self.filter_index = FilterIndex()
+        self.search_sessions = SearchSessionStore()
+        self._filter_ids = itertools.count(1)
+        self._property_ids = itertools.count(1)
+        self._favorite_ids = itertools.count(1)
+
+    def add_filter(self, data: Dict) -> int:
+        filter_id = next(self._filter_ids)
+        row = {field: data.get(field) for field in FILTER_FIELDS}
+        row["id"] = filter_id
+        row["telegram_id"] = data["telegram_id"]
+        row["areas"] = _areas_json(row["areas"])
+        if row["is_active"] is None:
+            row["is_active"] = True
+        self.filters[filter_id] = row
+        self.users.add(row["telegram_id"])
+        self.filter_index.upsert(row)
+        return filter_id
+
+    def add_property(self, data: Dict, photos: int = 0) -> int:
+        property_id = next(self._property_ids)
+        row = {field: data.get(field) for field in PROPERTY_FIELDS}
+        row.update(id=property_id, state="Активно", created_at=None, updated_at=None)
+        self.properties[property_id] = row
+        self.property_ids.append(property_id)
+        self.photos[property_id] = photos
+        return property_id
+
+    def delete_property(self, property_id: int):
+        self.properties.pop(property_id, None)
+        self.photos.pop(property_id, None)
+        if property_id in self.property_ids:
+            self.property_ids.remove(property_id)
+
+    def seed_properties(self, count: int, photos: int = 3):
+        for number in range(count):
+            self.add_property({
+                "return_contact": "1", "property_type": "квартира", "deal_type": "аренда",
+                "price": 30000 + number * 100, "city": "Москва", "area": "Центр", "rooms": 1 + number % 4,
+                "balcony": bool(number % 2), "renovated": "Да", "total_area": 30 + number % 60,
+                "floor": 1 + number % 9, "total_floors": 9, "deposit": 30000, "description": "Тестовое объявление",
+            }, photos=photos)
+
+    def matches(self, filter_row: Dict, property_row: Dict) -> bool:
+        indexed = IndexedFilter(filter_row)
+        property = SimpleNamespace(**property_row)
+        if any(value is not None and value != getattr(property, field)
+               for value, field in zip(indexed.key, ("city", "property_type", "deal_type"))):
+            return False
+        values = tuple(property_row.get(field) for field, _, _ in RANGE_FIELDS)
+        return indexed.matches(property, values)
+
+    def next_property_for_filter(self, filter_id: int, telegram_id: Optional[int]) -> Optional[int]:
+        filter_row = self.filters.get(filter_id)
+        if filter_row is None:
+            return None
+        session = self.search_sessions.get(telegram_id or 0, filter_id)
+        start = bisect_right(self.property_ids, session.cursor)
+        for property_id in self.property_ids[start:]:
+            if self.matches(filter_row, self.properties[property_id]):
+                session.advance(property_id)
+                return property_id
+        return None
+
+
+def create_app(database: FakeDatabase, latency: float = 0.0) -> FastAPI:
+    """ASGI замена database_service. latency - задержка каждого ответа в секундах"""
+    app = FastAPI()
+
+    @app.middleware("http")
+    async def emulate_service(request: Request, call_next):
+        if latency:
+            await asyncio.sleep(latency)
+        response = await call_next(request)
+        response.headers["X-Admin-Version"] = str(database.admin_version)
+        return response
+
+    # ---------------- Users ----------------
+
+    @app.post("/create_filter")
+    async def create_filter(request: Request):
+        data = await request.json()
+        database.add_filter(data)
+        return {"status": "ok", "telegram_id": data["telegram_id"]}
+
+    @app.get("/get_filters")
+    async def get_filters(telegram_id: int):
+        return [row for row in database.filters.values() if row["telegram_id"] == telegram_id]
+
+    @app.get("/get_filter")
+    async def get_filter(filter_id: int):
+        return database.filters.get(filter_id)
+
+    @app.get("/get_property_for_filter")
+    async def get_property_for_filter(filter_id: int, telegram_id: Optional[int] = None):
+        return database.next_property_for_filter(filter_id, telegram_id)
+
+    @app.delete("/search_session")
+    async def reset_search_session(telegram_id: int, filter_id: int):
+        database.search_sessions.reset(telegram_id, filter_id)
+        return {"status": "ok", "telegram_id": telegram_id, "filter_id": filter_id}
+
+    @app.post("/add_to_favorites/{telegram_id}/{property_id}")
+    async def add_to_favorites(telegram_id: int, property_id: int):
+        favorite_id = next(database._favorite_ids)
+        database.favorites[favorite_id] = {"id": favorite_id, "telegram_id": telegram_id, "property_id": property_id}
+        return {"status": "ok", "telegram_id": telegram_id}
+
+    @app.get("/get_favorites/{telegram_id}/{offset}/{limit}")
+    async def get_favorites(telegram_id: int, offset: int, limit: int):
+        favorites = [
+            {"id": row["id"], "property_id": row["property_id"]}
+            for row in database.favorites.values() if row["telegram_id"] == telegram_id
+        ]
+        return favorites[offset:offset + limit]
+
+    @app.get("/favorites/{telegram_id}")
+    async def get_favorites_page(telegram_id: int, cursor: Optional[str] = None, limit: int = 10):
+        after = decode_cursor(cursor, 1)
+        favorites = [
+            {"id": row["id"], "property_id": row["property_id"]}
+            for row in database.favorites.values()
+            if row["telegram_id"] == telegram_id and row["id"] > (after[0] if after else 0)
+        ]
+        page = favorites[:limit]
+        next_cursor = encode_cursor(page[-1]["id"]) if len(favorites) > limit else None
+        return {"favorites": page, "next_cursor": next_cursor}
+
+    @app.post("/increase_statistics")
+    async def increase_statistics(request: Request):
+        data = await request.json()
+        database.statistics[int(data["property_id"])][data["param_name"]] += data.get("count", 1)
+        return {"status": "ok", "property_id": data["property_id"]}
+
+    # ---------------- Admins ----------------
+
+    @app.get("/is_admin")
+    async def is_admin(telegram_id: int):
+        return {"is_admin": telegram_id in database.admins}
+
+    @app.get("/admins")
+    async def get_admins():
+        return {"admins": sorted(database.admins), "version": database.admin_version}
+
+    @app.get("/admins/version")
+    async def get_admin_version():
+        return {"version": database.admin_version}
+
+    @app.post("/register_admin/{telegram_id}")
+    async def register_admin(telegram_id: int):
+        if telegram_id not in database.admins:
+            database.admins.add(telegram_id)
+            database.admin_version += 1
+        return {"status": "ok", "telegram_id": telegram_id}
+
+    @app.post("/unregister_admin/{telegram_id}")
+    async def unregister_admin(telegram_id: int):
+        if telegram_id in database.admins:
+            database.admins.discard(telegram_id)
+            database.admin_version += 1
+        return {"status": "ok", "telegram_id": telegram_id}
+
+    # ---------------- Properties ----------------
+
+    @app.post("/add_property")
+    async def add_property(request: Request):
+        data = await request.json()
+        property_id = database.add_property(data)
+        property = SimpleNamespace(**{field: data.get(field) for field in PROPERTY_FIELDS})
+        return {
+            "status": "ok",
+            "property_id": property_id,
+            "users_id": database.filter_index.match_telegram_ids(property),
+        }
+
+    @app.post("/add_properties")
+    async def add_properties(request: Request):
+        rows = (await request.json())["properties"]
+        properties = [SimpleNamespace(**{field: data.get(field) for field in PROPERTY_FIELDS}) for data in rows]
+        matches = database.filter_index.match_telegram_ids_many(properties)
+        return {
+            "status": "ok",
+            "results": [
+                {"property_id": database.add_property(data), "error": None, "users_id": users_id}
+                for data, users_id in zip(rows, matches)
+            ],
+        }
+
+    @app.post("/upload_images/{property_id}")
+    async def upload_images(property_id: int, images: List[UploadFile] = File(...)):
+        for image in images:
+            await image.read()
+        database.photos[property_id] = database.photos.get(property_id, 0) + len(images)
+        return {"status": "ok", "property_id": property_id, "count": len(images)}
+
+    @app.post("/upload_image")
+    async def upload_image(image: UploadFile = File(...)):
+        await image.read()
+        property_id = int(image.filename.split("_")[0])
+        database.photos[property_id] = database.photos.get(property_id, 0) + 1
+        return {"status": "ok"}
+
+    @app.get("/get_properties/{offset}/{limit}")
+    async def get_properties(offset: int, limit: int):
+        ids = list(reversed(database.property_ids))[offset:offset + limit]
+        return {"properties": [{"id": property_id} for property_id in ids]}
+
+    @app.get("/properties")
+    async def get_properties_page(cursor: Optional[str] = None, limit: int = 10):
+        # В памяти id растут вместе с временем создания, ключом служит только id
+        after = decode_cursor(cursor, 2)
+        ids = [property_id for property_id in reversed(database.property_ids)
+               if after is None or property_id < after[1]]
+        page = ids[:limit]
+        next_cursor = encode_cursor(0, page[-1]) if len(ids) > limit else None
+        return {"properties": [{"id": property_id} for property_id in page], "next_cursor": next_cursor}
+
+    @app.get("/get_property_info/{property_id}")
+    async def get_property_info(property_id: int):
+        if property_id not in database.properties:
+            raise HTTPException(status_code=404, detail="Объект недвижимости не найден")
+        return database.properties[property_id]
+
+    @app.get("/property_card/{property_id}")
+    async def get_property_card(property_id: int, viewer: Optional[int] = None):
+        if property_id not in database.properties:
+            raise HTTPException(status_code=404, detail="Объект недвижимости не найден")
+        statistics = database.statistics[property_id]
+        return {
+            "property": database.properties[property_id],
+            "photos": [
+                {"num": num, "id": property_id * 100 + num, "size": len(PHOTO_BYTES)}
+                for num in range(database.photos.get(property_id, 0))
+            ],
+            "statistics": {name: statistics[name] for name in ("views", "favorites", "likes")},
+            "viewer_is_admin": viewer in database.admins,
+        }
+
+    @app.get("/get_property_photos_count/{property_id}")
+    async def get_property_photos_count(property_id: int):
+        return {"photos_count": database.photos.get(property_id, 0)}
+
+    @app.get("/properties/{property_id}/photo/{photo_num}")
+    async def get_property_photo(property_id: int, photo_num: int, size: str = "original"):
+        if photo_num >= database.photos.get(property_id, 0):
+            raise HTTPException(status_code=404, detail="Фотография не найдена")
+        return Response(content=PHOTO_BYTES[:PHOTO_SIZE_BYTES.get(size)], media_type="image/jpeg")
+
+    @app.delete("/delete_property/{property_id}")
+    async def delete_property(property_id: int):
+        database.delete_property(property_id)
+        return {"status": "ok", "property_id": property_id}
+
+    return app
@@ -0,0 +1,215 @@
+import datetime
+import itertools
+import time
+from collections import Counter, defaultdict
+from typing import Callable, Dict, List, Optional, Tuple
+
+from telethon import events
+from telethon.tl.types import InputFile, MessageMediaPhoto, Photo
+
+from src.benchmarks.stats import LatencyRecorder
+
+
+class FakeMessage:
+    def __init__(self, message_id: int, text: str = "", buttons=None, photo: Optional[Photo] = None, media=None):
+        self.id = message_id
+        self.text = text
+        self.buttons = buttons
+        self.photo = photo
+        self.media = media
+
+
+class FakeEvent:
+    """Минимальный аналог событий Telethon, который используют обработчики бота"""
+
+    def __init__(self, client, kind: str, user_id: int, text: str = None, data: bytes = None, media=None, messages=None):
+        self.client = client
+        self.kind = kind
+        self.sender_id = user_id
+        self.chat_id = user_id
+        self.text = text
+        self.raw_text = text
+        self.data = data
+        self.media = media
+        self.photo = media.photo if isinstance(media, MessageMediaPhoto) else None
+        self.messages = messages or []
+        self.pattern_match = None
+        self.data_match = None
+
+    async def respond(self, message="", *args, **kwargs):
+        return await self.client.send_message(self.chat_id, message, *args, **kwargs)
+
+    async def answer(self, *args, **kwargs):
+        self.client.calls["answer"] += 1
+
+    @property
+    def route(self) -> str:
+        if self.kind == "callback":
+            return "callback " + self.data.decode().split(":")[0]
+        if self.kind == "album":
+            return "album"
+        if self.text and self.text.startswith("/"):
+            return "message " + self.text.split(" ")[0].split(":")[0]
+        return "message text"
+
+
+class FakeAlbumEvent(FakeEvent, events.Album.Event):
+    # Обработчики проверяют isinstance(event, events.Album.Event); свойства Telethon
+    # заменены обычными атрибутами, чтобы FakeEvent мог их заполнить
+    client = None
+    sender_id = None
+    chat_id = None
+    text = None
+    raw_text = None
+
+
+def _flatten_buttons(buttons) -> List:
+    if not buttons:
+        return []
+    result = []
+    for row in buttons:
+        if isinstance(row, (list, tuple)):
+            result.extend(row)
+        else:
+            result.append(row)
+    return result
+
+
+class FakeTelegramClient:
+    """Клиент Telethon в памяти: хранит обработчики, записывает вызовы API и
+    разбирает события так же, как Telethon - все подходящие обработчики по порядку регистрации.
+    """
+
+    def __init__(self, recorder: Optional[LatencyRecorder] = None):
+        self.recorder = recorder if recorder is not None else LatencyRecorder()
+        self.handlers = []
+        self.calls: Counter = Counter()
+        self.handler_errors: Counter = Counter()
+        self.last_message: Dict[int, FakeMessage] = {}
+        self.messages_by_user: Dict[int, int] = defaultdict(int)
+        self.sent_messages: List[Tuple[int, str]] = []
+        self.sent_files: List[Tuple[int, List]] = []
+        self._failures: List[Tuple[str, Exception, Optional[Callable]]] = []
+        self._ids = itertools.count(1)
+
+    def fail_once(self, method: str, error: Exception, when: Optional[Callable] = None):
+        """Следующий вызов method, для аргументов которого when вернет True, выбросит error:
+        FloodWaitError, устаревшая ссылка на файл и т.п.
+        """
+        self._failures.append((method, error, when))
+
+    def _maybe_fail(self, method: str, *args):
+        for index, (name, error, when) in enumerate(self._failures):
+            if name == method and (when is None or when(*args)):
+                del self._failures[index]
+                raise error
+
+    # ----------------- Telethon API -----------------
+
+    def add_event_handler(self, callback, event=None):
+        self.handlers.append((callback, event))
+
+    async def send_message(self, entity, message="", *args, buttons=None, **kwargs):
+        self._maybe_fail("send_message", entity, message)
+        self.calls["send_message"] += 1
+        self.sent_messages.append((entity, message))
+        sent = FakeMessage(next(self._ids), message, buttons)
+        self.last_message[entity] = sent
+        self.messages_by_user[entity] += 1
+        return sent
+
+    async def edit_message(self, entity, message=None, text=None, *args, **kwargs):
+        self.calls["edit_message"] += 1
+        return message
+
+    async def send_file(self, entity, file, *args, **kwargs):
+        files = file if isinstance(file, (list, tuple)) else [file]
+        self._maybe_fail("send_file", entity, files)
+        self.calls["send_file"] += 1
+        self.sent_files.append((entity, list(files)))
+        self.calls["send_file_items"] += len(files)
+        sent = []
+        for _ in files:
+            message_id = next(self._ids)
+            photo = Photo(
+                id=message_id, access_hash=message_id, file_reference=b"ref",
+                date=datetime.datetime.now(), sizes=[], dc_id=2,
+            )
+            sent.append(FakeMessage(message_id, photo=photo))
+        self.messages_by_user[entity] += len(sent)
+        return sent if isinstance(file, (list, tuple)) else sent[0]
+
+    async def upload_file(self, file, file_name=None, **kwargs):
+        self._maybe_fail("upload_file", file)
+        self.calls["upload_file"] += 1
+        self.calls["upload_bytes"] += len(file) if isinstance(file, (bytes, bytearray)) else 0
+        return InputFile(id=next(self._ids), parts=1, name=file_name or "file", md5_checksum="")
+
+    async def download_media(self, media, file=None, **kwargs):
+        self.calls["download_media"] += 1
+        return b"\xff\xd8\xff\xe0" + b"\x00" * 2048
+
+    async def get_entity(self, entity):
+        self.calls["get_entity"] += 1
+        return entity
+
+    # ----------------- Dispatch -----------------
+
+    def _matches(self, builder, event: FakeEvent) -> bool:
+        if isinstance(builder, events.NewMessage):
+            if event.kind != "message":
+                return False
+            if builder.pattern is None:
+                return True
+            event.pattern_match = builder.pattern(event.text or "")
+            return bool(event.pattern_match)
+        if isinstance(builder, events.CallbackQuery):
+            if event.kind != "callback":
+                return False
+            if builder.match is None:
+                return True
+            if isinstance(builder.match, bytes):
+                return builder.match == event.data
+            event.data_match = builder.match(event.data)
+            return bool(event.data_match)
+        if isinstance(builder, events.Album):
+            return event.kind == "album"
+        return False
+
+    async def dispatch(self, event: FakeEvent):
+        start = time.perf_counter()
+        for callback, builder in self.handlers:
+            if not self._matches(builder, event):
+                continue
+            try:
+                await callback(event)
+            except events.StopPropagation:
+                break
+            except Exception as e:
+                # Telethon логирует исключение обработчика и продолжает
+                self.handler_errors[f"{event.route}: {type(e).__name__}"] += 1
+        self.recorder.record(event.route, time.perf_counter() - start)
+
+    async def message(self, user_id: int, text: str):
+        await self.dispatch(FakeEvent(self, "message", user_id, text=text))
+
+    async def callback(self, user_id: int, data: str):
+        await self.dispatch(FakeEvent(self, "callback", user_id, data=data.encode()))
+
+    async def album(self, user_id: int, photos: int):
+        messages = [FakeMessage(next(self._ids), media=MessageMediaPhoto(photo=None)) for _ in range(photos)]
+        await self.dispatch(FakeAlbumEvent(self, "album", user_id, messages=messages))
+
+    def buttons_of(self, user_id: int) -> List[str]:
+        message = self.last_message.get(user_id)
+        if message is None:
+            return []
+        result = []
+        for button in _flatten_buttons(message.buttons):
+            data = getattr(button, "data", None)
+            if data is None:
+                # В новых версиях Telethon данные лежат в button.type
+                data = getattr(getattr(button, "type", None), "data", None)
+            if data is not None:
+                result.append(data.decode())
+        return result
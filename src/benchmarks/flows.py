@@ -0,0 +1,108 @@
+import os
+import random
+from typing import Awaitable, Callable, Dict
+
+from src.benchmarks.fake_database_service import FakeDatabase
+from src.benchmarks.fake_telegram import FakeTelegramClient
+
+# Ответы на шаги мастера фильтра в порядке property_states
+FILTER_WIZARD_STEPS = (
+    ("message", "Бенчмарк"),
+    ("callback", "property_type:квартира"),
+    ("callback", "deal_type:аренда"),
+    ("message", "Москва"),
+    ("message", "-"),
+    ("message", "10000"),
+    ("message", "100000"),
+    ("message", "-"),
+    ("message", "-"),
+    ("message", "-"),
+    ("message", "-"),
+    ("callback", "balcony:-"),
+    ("callback", "renovated:-"),
+    ("message", "-"),
+    ("message", "-"),
+    ("message", "-"),
+    ("callback", "is_active:true"),
+    ("message", "-"),
+    ("callback", "property_filter_confirmation:yes"),
+)
+
+# Ответы на шаги добавления объекта в порядке add_property_states
+ADD_PROPERTY_STEPS = (
+    ("callback", "квартира"),
+    ("callback", "creating_property_deal_type:аренда"),
+    ("message", "45000"),
+    ("message", "Москва"),
+    ("message", "Центр"),
+    ("message", "Тверская"),
+    ("message", "1"),
+    ("message", "10"),
+    ("message", "2"),
+    ("callback", "creating_property_balcony:true"),
+    ("callback", "creating_property_renovated:Да"),
+    ("message", "50"),
+    ("message", "3"),
+    ("message", "9"),
+    ("message", "45000"),
+    ("message", "Бенчмарк объявление"),
+)
+
+
+async def _send(client: FakeTelegramClient, user_id: int, kind: str, value: str):
+    if kind == "message":
+        await client.message(user_id, value)
+    else:
+        await client.callback(user_id, value)
+
+
+async def filter_wizard_flow(client: FakeTelegramClient, database: FakeDatabase, user_id: int, pages: int):
+    await client.callback(user_id, "/start")
+    await client.callback(user_id, "/new_filter")
+    for kind, value in FILTER_WIZARD_STEPS:
+        await _send(client, user_id, kind, value)
+
+
+async def search_flow(client: FakeTelegramClient, database: FakeDatabase, user_id: int, pages: int):
+    database.add_filter({
+        "telegram_id": user_id, "name": "Поиск", "property_type": "квартира", "deal_type": "аренда",
+        "city": "Москва", "is_active": True,
+    })
+    await client.callback(user_id, "/search")
+    search_buttons = [data for data in client.buttons_of(user_id) if data.startswith("search:")]
+    if not search_buttons:
+        return
+    data = search_buttons[0]
+    for _ in range(pages):
+        await client.callback(user_id, data)
+        buttons = client.buttons_of(user_id)
+        next_buttons = [button for button in buttons if button.startswith("search")]
+        if not next_buttons:
+            break
+        data = next_buttons[0]
+
+
+async def favorites_flow(client: FakeTelegramClient, database: FakeDatabase, user_id: int, pages: int):
+    property_ids = random.sample(database.property_ids, min(pages, len(database.property_ids)))
+    for property_id in property_ids:
+        await client.callback(user_id, f"to_favorites:{property_id}")
+    await client.callback(user_id, "/favorites_list:")
+    buttons = [data for data in client.buttons_of(user_id) if data.startswith("show_favorites_property:")]
+    for data in buttons[:pages]:
+        await client.callback(user_id, data)
+
+
+async def add_property_flow(client: FakeTelegramClient, database: FakeDatabase, user_id: int, pages: int):
+    await client.message(user_id, f"/register_admin {os.getenv('ADMIN_PASSWORD', 'VerySecretPassword')}")
+    await client.callback(user_id, "/new_property")
+    for kind, value in ADD_PROPERTY_STEPS:
+        await _send(client, user_id, kind, value)
+    await client.album(user_id, photos=3)
+
+
+FLOWS: Dict[str, Callable[[FakeTelegramClient, FakeDatabase, int, int], Awaitable[None]]] = {
+    "filter_wizard": filter_wizard_flow,
+    "search": search_flow,
+    "favorites": favorites_flow,
+    "add_property": add_property_flow,
+}
@@ -0,0 +1,113 @@
+import asyncio
+import os
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+import httpx
+
+from src.benchmarks.fake_database_service import FakeDatabase, create_app
+from src.benchmarks.fake_telegram import FakeTelegramClient
+from src.benchmarks.flows import FLOWS
+from src.benchmarks.stats import LatencyRecorder
+from src.logging_config import setup_logging
+
+
+def _handler_classes():
+    # Тот же набор и порядок, что и в src/bot_logic/main.py
+    from src.bot_logic.handlers.user_scenario_handlers.property_filters import NewPropertyFilterHandler
+    from src.bot_logic.handlers.start_handler import StartCommandHandler
+    from src.bot_logic.handlers.user_scenario_handlers.help_handler import HelpCommandHandler
+    from src.bot_logic.handlers.user_scenario_handlers.list_handler import ListCommandHandler
+    from src.bot_logic.handlers.user_scenario_handlers.search_handler import SearchCommandHandler
+    from src.bot_logic.handlers.user_scenario_handlers.delete_handler import DeleteCommandHandler
+    from src.bot_logic.handlers.admin_scenario_handlers.ad_description_handler import AdDescriptionCommandHandler
+    from src.bot_logic.handlers.admin_scenario_handlers.register_admin_handler import RegisterAdminCommandHandler
+    from src.bot_logic.handlers.admin_scenario_handlers.add_property_handler import AddPropertyHandler
+    from src.bot_logic.handlers.admin_scenario_handlers.add_property_file import AddPropertyFileHandler
+    from src.bot_logic.handlers.user_scenario_handlers.update_handler import UpdateCommandHandler
+    from src.bot_logic.handlers.admin_scenario_handlers.show_properties import ShowPropertiesHandler
+    from src.bot_logic.handlers.admin_scenario_handlers.unregister_admin_handler import UnregisterAdminCommandHandler
+    from src.bot_logic.handlers.admin_scenario_handlers.delete_property_handler import DeletePropertyHandler
+    from src.bot_logic.handlers.admin_scenario_handlers.sold_rented_free_property_handler import SoldRentedFreePropertyHandler
+    from src.bot_logic.handlers.admin_scenario_handlers.get_property_statistics_handler import GetPropertyStatisticsHandler
+    from src.bot_logic.handlers.admin_scenario_handlers.get_statistics_handler import GetStatisticsHandler
+    from src.bot_logic.handlers.admin_scenario_handlers.perf_handler import PerfCommandHandler
+    from src.bot_logic.handlers.user_scenario_handlers.favorites_list import FavoritesListHandler
+    from src.bot_logic.handlers.user_scenario_handlers.remove_from_favorites import DeleteFromFavoritesCommandHandler
+    from src.bot_logic.handlers.user_scenario_handlers.to_favorites import ToFavoritesCommandHandler
+    from src.bot_logic.handlers.default_handler import DefaultHandler
+
+    return [
+        NewPropertyFilterHandler, StartCommandHandler, HelpCommandHandler, ListCommandHandler,
+        SearchCommandHandler, DeleteCommandHandler, AdDescriptionCommandHandler, RegisterAdminCommandHandler,
+        AddPropertyHandler, AddPropertyFileHandler, UpdateCommandHandler, ShowPropertiesHandler,
+        UnregisterAdminCommandHandler, DeletePropertyHandler, SoldRentedFreePropertyHandler,
+        GetPropertyStatisticsHandler, GetStatisticsHandler, PerfCommandHandler, FavoritesListHandler,
+        DeleteFromFavoritesCommandHandler, ToFavoritesCommandHandler, DefaultHandler,
+    ]
+
+
+class BenchmarkHarness:
+    """Реальные обработчики бота поверх фейкового Telegram и фейкового database_service"""
+
+    def __init__(self, db_latency: float = 0.0, properties: int = 200, work_dir: Optional[str] = None):
+        # Логи пишутся так же, как в боте: цена логирования входит в замеры
+        setup_logging("benchmark")
+
+        from src.bot_logic import database_service_client, media_cache
+        from src.bot_logic.bot_metrics import install_error_counter
+        from src.bot_logic.router import UpdateRouter
+
+        install_error_counter()
+        self.work_dir = work_dir or tempfile.mkdtemp(prefix="bot_bench_")
+        self.database = FakeDatabase()
+        self.database.seed_properties(properties)
+        self.recorder = LatencyRecorder()
+        self.client = FakeTelegramClient(self.recorder)
+
+        self.database_service = database_service_client.DatabaseServiceClient(
+            base_url=database_service_client.DATABASE_SERVICE_URL,
+            transport=httpx.ASGITransport(app=create_app(self.database, db_latency)),
+        )
+        database_service_client._database_service_clients[database_service_client.DATABASE_SERVICE_URL] = self.database_service
+        media_cache._media_cache = media_cache.MediaCache(os.path.join(self.work_dir, "media_cache.sqlite3"))
+
+        self.router = UpdateRouter()
+        for handler_class in _handler_classes():
+            handler_class(self.client).register_handlers(self.router)
+        self.router.attach(self.client)
+
+    async def close(self):
+        from src.bot_logic import database_service_client, media_cache
+
+        await self.database_service.close()
+        database_service_client._database_service_clients.pop(database_service_client.DATABASE_SERVICE_URL, None)
+        if media_cache._media_cache is not None:
+            media_cache._media_cache.close()
+            media_cache._media_cache = None
+
+    async def run(self, flows: List[str], users: int, concurrency: int, pages: int = 5) -> Dict:
+        from src.bot_logic.bot_metrics import handler_summary
+
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def run_user(number: int):
+            flow = flows[number % len(flows)]
+            async with semaphore:
+                await FLOWS[flow](self.client, self.database, 10_000_000 + number, pages)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(run_user(number) for number in range(users)))
+        # Рассылки о новых объявлениях идут в фоне
+        from src.bot_logic.notifications import wait_property_fanouts
+        await wait_property_fanouts()
+        elapsed = time.perf_counter() - start
+
+        summary = self.recorder.summary(elapsed)
+        summary["config"] = {"flows": flows, "users": users, "concurrency": concurrency, "pages": pages}
+        summary["telegram_calls"] = dict(self.client.calls)
+        summary["handler_errors"] = dict(self.client.handler_errors)
+        summary["router"] = self.router.statistics()
+        summary["handlers"] = handler_summary()
+        return summary
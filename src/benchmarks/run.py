@@ -0,0 +1,51 @@
+import argparse
+import asyncio
+
+from src.benchmarks.flows import FLOWS
+from src.benchmarks.stats import format_report, load_summary, save_summary
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Нагрузочный прогон обработчиков бота")
+    parser.add_argument("--flows", default=",".join(FLOWS), help=f"сценарии через запятую: {', '.join(FLOWS)}")
+    parser.add_argument("--users", type=int, default=200, help="количество виртуальных пользователей")
+    parser.add_argument("--concurrency", type=int, default=50, help="сколько пользователей работает одновременно")
+    parser.add_argument("--pages", type=int, default=5, help="страниц поиска/избранного на пользователя")
+    parser.add_argument("--properties", type=int, default=200, help="объявлений в фейковой базе")
+    parser.add_argument("--db-latency-ms", type=float, default=1.0, help="задержка ответа database_service")
+    parser.add_argument("--json", help="сохранить результат в JSON")
+    parser.add_argument("--baseline", help="сравнить с сохраненным JSON")
+    return parser.parse_args(argv)
+
+
+async def run(args):
+    from src.benchmarks.harness import BenchmarkHarness
+
+    flows = [flow.strip() for flow in args.flows.split(",") if flow.strip()]
+    unknown = [flow for flow in flows if flow not in FLOWS]
+    if unknown:
+        raise SystemExit(f"Unknown flows: {', '.join(unknown)}")
+
+    harness = BenchmarkHarness(db_latency=args.db_latency_ms / 1000, properties=args.properties)
+    try:
+        return await harness.run(flows, args.users, args.concurrency, args.pages)
+    finally:
+        await harness.close()
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    summary = asyncio.run(run(args))
+
+    baseline = load_summary(args.baseline) if args.baseline else None
+    print(format_report(summary, baseline))
+    print(f"telegram calls: {summary['telegram_calls']}")
+    if summary["handler_errors"]:
+        print(f"handler errors: {summary['handler_errors']}")
+
+    if args.json:
+        save_summary(args.json, summary)
+
+
+if __name__ == "__main__":
+    main()
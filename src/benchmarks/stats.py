@@ -0,0 +1,80 @@
+import json
+import math
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = max(0, math.ceil(fraction * len(sorted_values)) - 1)
+    return sorted_values[index]
+
+
+class LatencyRecorder:
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = defaultdict(list)
+
+    def record(self, route: str, seconds: float):
+        self.samples[route].append(seconds)
+
+    def total(self) -> int:
+        return sum(len(values) for values in self.samples.values())
+
+    def summary(self, elapsed: float) -> Dict:
+        routes = {}
+        everything = []
+        for route, values in self.samples.items():
+            everything.extend(values)
+            routes[route] = _describe(sorted(values), elapsed)
+        return {
+            "elapsed": elapsed,
+            "total": _describe(sorted(everything), elapsed),
+            "routes": dict(sorted(routes.items())),
+        }
+
+
+def _describe(values: List[float], elapsed: float) -> Dict:
+    return {
+        "count": len(values),
+        "throughput": len(values) / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(values, 0.50) * 1000,
+        "p95_ms": percentile(values, 0.95) * 1000,
+        "p99_ms": percentile(values, 0.99) * 1000,
+        "max_ms": (values[-1] if values else 0.0) * 1000,
+    }
+
+
+def _delta(value: float, baseline: Optional[float]) -> str:
+    if not baseline:
+        return ""
+    return f" ({(value - baseline) / baseline * 100:+.0f}%)"
+
+
+def format_report(summary: Dict, baseline: Optional[Dict] = None) -> str:
+    baseline_routes = (baseline or {}).get("routes", {})
+    lines = [
+        f"{'route':<40} {'count':>7} {'ev/s':>9} {'p50 ms':>16} {'p95 ms':>16} {'p99 ms':>16}",
+    ]
+    rows = list(summary["routes"].items()) + [("TOTAL", summary["total"])]
+    for route, row in rows:
+        base = baseline_routes.get(route) if route != "TOTAL" else (baseline or {}).get("total")
+        base = base or {}
+        lines.append(
+            f"{route:<40} {row['count']:>7} {row['throughput']:>9.1f}"
+            f" {row['p50_ms']:>8.2f}{_delta(row['p50_ms'], base.get('p50_ms')):>8}"
+            f" {row['p95_ms']:>8.2f}{_delta(row['p95_ms'], base.get('p95_ms')):>8}"
+            f" {row['p99_ms']:>8.2f}{_delta(row['p99_ms'], base.get('p99_ms')):>8}"
+        )
+    lines.append(f"elapsed: {summary['elapsed']:.2f}s")
+    return "\n".join(lines)
+
+
+def load_summary(path: str) -> Dict:
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_summary(path: str, summary: Dict):
+    with open(path, "w") as f:
+        json.dump(summary, f, indent=2, ensure_ascii=False)
@@ -0,0 +1,87 @@
+import asyncio
+import logging
+import os
+import time
+from typing import FrozenSet, Optional
+
+import httpx
+
+from src.bot_logic.database_service_client import DatabaseServiceClient, get_database_service_client
+
+logger = logging.getLogger(__name__)
+
+ADMIN_CACHE_TTL = float(os.getenv("ADMIN_CACHE_TTL", "60"))
+ADMIN_VERSION_HEADER = "X-Admin-Version"
+
+
+class AdminCache:
+    """Множество администраторов с TTL.
+
+    Сбрасывается сразу после регистрации/отмены администратора в этом процессе,
+    а также когда database_service присылает в заголовке X-Admin-Version версию
+    новее закэшированной - так изменения, сделанные другими процессами бота,
+    видны на следующем же запросе к сервису.
+
+    Положительный ответ из кэша перед возвратом сверяется с текущей версией:
+    администратор, снятый в другом процессе, не сохраняет права до истечения TTL.
+    """
+
+    def __init__(self, database_service: DatabaseServiceClient, ttl: float = ADMIN_CACHE_TTL):
+        self.database_service = database_service
+        self.ttl = ttl
+        self.admins: Optional[FrozenSet[int]] = None
+        self.version = -1
+        self.expires_at = 0.0
+        self._lock = asyncio.Lock()
+        database_service.response_hooks.append(self.observe_response)
+
+    def observe_response(self, response: httpx.Response):
+        value = response.headers.get(ADMIN_VERSION_HEADER)
+        if value is None:
+            return
+        try:
+            version = int(value)
+        except ValueError:
+            return
+        if self.admins is not None and version > self.version:
+            logger.info("Admin version changed %s -> %s, cache invalidated", self.version, version)
+            self.invalidate()
+
+    def invalidate(self):
+        self.admins = None
+
+    def _is_fresh(self) -> bool:
+        return self.admins is not None and time.monotonic() < self.expires_at
+
+    async def _refresh(self) -> FrozenSet[int]:
+        async with self._lock:
+            if self._is_fresh():
+                return self.admins
+            result = await self.database_service.get_admins()
+            self.admins = frozenset(result["admins"])
+            self.version = result["version"]
+            self.expires_at = time.monotonic() + self.ttl
+            return self.admins
+
+    async def is_admin(self, user_id: int) -> bool:
+        if not self._is_fresh():
+            return user_id in await self._refresh()
+        if user_id not in self.admins:
+            return False
+        version = await self.database_service.get_admin_version()
+        if self.admins is None or version > self.version:
+            logger.info("Admin version changed %s -> %s, cache invalidated", self.version, version)
+            self.invalidate()
+            return user_id in await self._refresh()
+        return True
+
+
+_admin_cache: Optional[AdminCache] = None
+
+
+def get_admin_cache() -> AdminCache:
+    global _admin_cache
+    database_service = get_database_service_client()
+    if _admin_cache is None or _admin_cache.database_service is not database_service:
+        _admin_cache = AdminCache(database_service)
+    return _admin_cache
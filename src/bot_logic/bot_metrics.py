@@ -0,0 +1,208 @@
+import asyncio
+import contextvars
+import functools
+import logging
+import math
+import os
+import time
+from typing import Dict, List, Optional
+
+from src.metrics import REGISTRY, start_metrics_server
+
+logger = logging.getLogger(__name__)
+
+# Локальный порт /metrics бота. 0 - не поднимать
+BOT_METRICS_HOST = os.getenv("BOT_METRICS_HOST", "127.0.0.1")
+BOT_METRICS_PORT = int(os.getenv("BOT_METRICS_PORT", "9105"))
+
+HANDLER_SECONDS = REGISTRY.histogram(
+    "bot_handler_duration_seconds", "Update handling latency by handler", ("handler",),
+)
+HANDLER_ERRORS = REGISTRY.counter(
+    "bot_handler_errors_total", "Exceptions raised by handlers", ("handler", "error"),
+)
+HANDLER_TELEGRAM_SECONDS = REGISTRY.counter(
+    "bot_handler_telegram_seconds_total", "Time handlers spent waiting for Telegram API calls", ("handler",),
+)
+HANDLER_DATABASE_SECONDS = REGISTRY.counter(
+    "bot_handler_database_seconds_total", "Time handlers spent waiting for database_service", ("handler",),
+)
+FUNCTION_SECONDS = REGISTRY.histogram(
+    "bot_function_duration_seconds", "Latency of shared bot coroutines", ("function",),
+)
+FUNCTION_ERRORS = REGISTRY.counter(
+    "bot_function_errors_total", "Exceptions raised by shared bot coroutines", ("function", "error"),
+)
+TELEGRAM_SECONDS = REGISTRY.histogram(
+    "bot_telegram_request_duration_seconds", "Telegram API request latency", ("request",),
+)
+DATABASE_SECONDS = REGISTRY.histogram(
+    "bot_database_service_request_duration_seconds", "database_service request latency", ("method", "status"),
+)
+
+
+class HandlerSpan:
+    """Одна обработка обновления: общее время и доли Telegram и database_service.
+
+    Вызовы API внутри блока (и в созданных в нем задачах) прибавляют свое время к span.
+    """
+
+    __slots__ = ("handler", "telegram", "database", "error", "_start", "_token")
+
+    def __init__(self, handler: str):
+        self.handler = handler
+        self.telegram = 0.0
+        self.database = 0.0
+        # Тип первой ошибки: обновление засчитывается как неудачное один раз
+        self.error: Optional[str] = None
+
+    def __enter__(self):
+        self._token = current_span.set(self)
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self._start
+        current_span.reset(self._token)
+        HANDLER_SECONDS.labels(self.handler).observe(elapsed)
+        if self.telegram:
+            HANDLER_TELEGRAM_SECONDS.labels(self.handler).inc(self.telegram)
+        if self.database:
+            HANDLER_DATABASE_SECONDS.labels(self.handler).inc(self.database)
+        if exc_type is not None and issubclass(exc_type, Exception):
+            self.error = exc_type.__name__
+        if self.error is not None:
+            HANDLER_ERRORS.labels(self.handler, self.error).inc()
+        return False
+
+
+current_span: contextvars.ContextVar[Optional[HandlerSpan]] = contextvars.ContextVar("handler_span", default=None)
+
+
+LOGGED_ERROR = "logged_error"
+
+
+class SpanErrorHandler(logging.Handler):
+    """Засчитывает записи уровня ERROR текущему обработчику.
+
+    Большинство обработчиков ловят исключения, пишут logger.exception и отвечают
+    пользователю - без этого такие ошибки не попали бы в bot_handler_errors_total.
+    """
+
+    def __init__(self):
+        super().__init__(logging.ERROR)
+
+    def emit(self, record: logging.LogRecord):
+        span = current_span.get()
+        if span is None:
+            return
+        if record.exc_info and record.exc_info[0] is not None:
+            if span.error is None or span.error == LOGGED_ERROR:
+                span.error = record.exc_info[0].__name__
+        elif span.error is None:
+            span.error = LOGGED_ERROR
+
+
+_error_handler: Optional[SpanErrorHandler] = None
+
+
+def install_error_counter() -> SpanErrorHandler:
+    global _error_handler
+    if _error_handler is None:
+        _error_handler = SpanErrorHandler()
+        logging.getLogger().addHandler(_error_handler)
+    return _error_handler
+
+
+def uninstall_error_counter():
+    global _error_handler
+    if _error_handler is not None:
+        logging.getLogger().removeHandler(_error_handler)
+        _error_handler = None
+
+
+def handler_name(handler) -> str:
+    """SearchCommandHandler.execute_announcement для метода, имя класса для вызываемого объекта"""
+    return getattr(handler, "__qualname__", None) or type(handler).__qualname__
+
+
+def record_telegram(seconds: float, request: str):
+    TELEGRAM_SECONDS.labels(request).observe(seconds)
+    span = current_span.get()
+    if span is not None:
+        span.telegram += seconds
+
+
+def record_database(seconds: float, method: str, status: str):
+    DATABASE_SECONDS.labels(method, status).observe(seconds)
+    span = current_span.get()
+    if span is not None:
+        span.database += seconds
+
+
+def instrumented(function):
+    """Время и ошибки общей корутины, которую вызывают несколько обработчиков"""
+    name = function.__qualname__
+
+    @functools.wraps(function)
+    async def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await function(*args, **kwargs)
+        except Exception as e:
+            FUNCTION_ERRORS.labels(name, type(e).__name__).inc()
+            raise
+        finally:
+            FUNCTION_SECONDS.labels(name).observe(time.perf_counter() - start)
+
+    return wrapper
+
+
+def _quantile(child, buckets, q: float) -> float:
+    """Верхняя граница корзины, в которую попадает квантиль q"""
+    total = sum(child.counts)
+    if not total:
+        return 0.0
+    rank = q * total
+    seen = 0
+    for bound, count in zip(buckets + (math.inf,), child.counts):
+        seen += count
+        if seen >= rank:
+            return bound
+    return math.inf
+
+
+def handler_summary(limit: Optional[int] = None) -> List[Dict]:
+    """Обработчики по убыванию среднего времени: число вызовов, среднее, p95, ошибки и доли API"""
+    errors: Dict[str, int] = {}
+    for (handler, _), child in HANDLER_ERRORS.children():
+        errors[handler] = errors.get(handler, 0) + int(child.value)
+
+    telegram = {handler: child.value for (handler,), child in HANDLER_TELEGRAM_SECONDS.children()}
+    database = {handler: child.value for (handler,), child in HANDLER_DATABASE_SECONDS.children()}
+
+    rows = []
+    for (handler,), child in HANDLER_SECONDS.children():
+        count = sum(child.counts)
+        if not count:
+            continue
+        rows.append({
+            "handler": handler,
+            "count": count,
+            "total_ms": round(child.sum * 1000, 3),
+            "avg_ms": round(child.sum / count * 1000, 3),
+            "p95_ms": round(_quantile(child, HANDLER_SECONDS.buckets, 0.95) * 1000, 3),
+            "errors": errors.get(handler, 0),
+            "telegram_ms": round(telegram.get(handler, 0.0) * 1000, 3),
+            "database_ms": round(database.get(handler, 0.0) * 1000, 3),
+        })
+    rows.sort(key=lambda row: row["avg_ms"], reverse=True)
+    return rows[:limit] if limit is not None else rows
+
+
+async def start_bot_metrics_server(host: str = BOT_METRICS_HOST, port: int = BOT_METRICS_PORT) -> Optional[asyncio.AbstractServer]:
+    if not port:
+        return None
+    server = await start_metrics_server(host, port)
+    logger.info("Метрики бота доступны на http://%s:%s/metrics", host, port)
+    return server
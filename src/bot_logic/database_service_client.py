@@ -1,79 +1,138 @@
-import requests
-from requests.exceptions import RequestException
+import asyncio
 import logging
 import os
-from io import BytesIO
-from fastapi import UploadFile
-import io
-import aiohttp
-
-LOG_FILE = os.path.join("logs", "bot.log")
-
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    filename=LOG_FILE,
-)
+import time
+from typing import Callable, Dict, List, Optional
+
+import httpx
+
+from src.bot_logic.bot_metrics import record_database
+from src.logging_config import request_id_var
+
 logger = logging.getLogger(__name__)
 
+DATABASE_SERVICE_URL = os.getenv("DATABASE_SERVICE_URL", "http://db_service:8005")
+
+HTTP_MAX_CONNECTIONS = int(os.getenv("DATABASE_SERVICE_MAX_CONNECTIONS", "50"))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("DATABASE_SERVICE_MAX_KEEPALIVE", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("DATABASE_SERVICE_KEEPALIVE_EXPIRY", "30"))
+HTTP_TIMEOUT = float(os.getenv("DATABASE_SERVICE_TIMEOUT", "10"))
+HTTP_RETRIES = int(os.getenv("DATABASE_SERVICE_RETRIES", "3"))
+HTTP_BACKOFF = float(os.getenv("DATABASE_SERVICE_BACKOFF", "0.2"))
+
+RETRY_STATUS_CODES = {502, 503, 504}
+IDEMPOTENT_METHODS = {"GET", "PUT", "DELETE"}
+
 
 class BaseHTTPClient:
-    def __init__(self, base_url: str):
+    def __init__(
+        self,
+        base_url: str,
+        timeout: float = HTTP_TIMEOUT,
+        retries: int = HTTP_RETRIES,
+        backoff: float = HTTP_BACKOFF,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
         self.base_url = base_url
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.transport = transport
+        self._client: Optional[httpx.AsyncClient] = None
+        self.response_hooks: List[Callable[[httpx.Response], None]] = []
 
     def _build_url(self, path: str) -> str:
         return f"{self.base_url}{path}"
 
-    def _handle_response(self, response: requests.Response) -> dict:
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=HTTP_MAX_CONNECTIONS,
+                    max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+                    keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+                ),
+                transport=self.transport,
+            )
+        return self._client
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def _should_retry(self, method: str, error: Exception) -> bool:
+        if isinstance(error, httpx.ConnectError):
+            # Запрос не дошел до сервера, повтор безопасен для любого метода
+            return True
+        if method not in IDEMPOTENT_METHODS:
+            return False
+        if isinstance(error, httpx.TransportError):
+            return True
+        if isinstance(error, httpx.HTTPStatusError):
+            return error.response.status_code in RETRY_STATUS_CODES
+        return False
+
+    async def _request(self, method: str, path: str, timeout: Optional[float] = None, **kwargs) -> httpx.Response:
+        client = self._get_client()
+        request_timeout = timeout if timeout is not None else self.timeout
+        request_id = request_id_var.get()
+        headers = {"X-Request-ID": request_id} if request_id else None
+
+        attempt = 0
+        start = time.perf_counter()
+        while True:
+            try:
+                response = await client.request(method, path, timeout=request_timeout, headers=headers, **kwargs)
+                for hook in self.response_hooks:
+                    hook(response)
+                response.raise_for_status()
+                # Вместе с повторами: столько обработчик ждал ответа
+                record_database(time.perf_counter() - start, method, str(response.status_code))
+                return response
+            except httpx.HTTPError as err:
+                if attempt >= self.retries or not self._should_retry(method, err):
+                    status = err.response.status_code if isinstance(err, httpx.HTTPStatusError) else type(err).__name__
+                    record_database(time.perf_counter() - start, method, str(status))
+                    logger.error("%s request exception: %s", method.lower(), err)
+                    raise
+                delay = self.backoff * (2 ** attempt)
+                attempt += 1
+                logger.warning("%s %s failed (%s), retry %s/%s in %.2fs", method, path, err, attempt, self.retries, delay)
+                await asyncio.sleep(delay)
+
+    def _handle_response(self, response: httpx.Response) -> dict:
         try:
-            response.raise_for_status()
             return response.json()
-        except requests.exceptions.HTTPError as err:
-            logger.error(f"HTTP error: {err}")
-            raise
-        except requests.exceptions.JSONDecodeError as err:
-            logger.error(f"Json decode error: {err}")
+        except ValueError as err:
+            logger.error("Json decode error: %s", err)
             raise
 
-    def get(self, path: str, params: dict = None) -> dict:
-        url = self._build_url(path)
-        try:
-            response = requests.get(url, params=params)
-            return self._handle_response(response)
-        except RequestException as err:
-            logger.error(f"get request exception: {err}")
-            raise
+    async def get(self, path: str, params: dict = None, timeout: float = None) -> dict:
+        response = await self._request("GET", path, params=params, timeout=timeout)
+        return self._handle_response(response)
 
-    def post(self, path: str, json: dict = None) -> dict:
-        url = self._build_url(path)
-        try:
-            response = requests.post(url, json=json)
-            return self._handle_response(response)
-        except RequestException as err:
-            logger.error(f"post request exception: {err}")
-            raise
+    async def get_bytes(self, path: str, params: dict = None, timeout: float = None) -> bytes:
+        response = await self._request("GET", path, params=params, timeout=timeout)
+        return response.content
 
-    def put(self, path: str, json: dict) -> dict:
-        url = self._build_url(path)
-        try:
-            response = requests.put(url, json=json)
-            return self._handle_response(response)
-        except RequestException as err:
-            logger.error(f"put request exception: {err}")
-            raise
+    async def post(self, path: str, json: dict = None, files: dict = None, timeout: float = None) -> dict:
+        response = await self._request("POST", path, json=json, files=files, timeout=timeout)
+        return self._handle_response(response)
 
-    def delete(self, path: str, params: dict) -> dict:
-        url = self._build_url(path)
-        try:
-            response = requests.delete(url, params=params)
-            return self._handle_response(response)
-        except RequestException as err:
-            logger.error(f"delete request exception: {err}")
-            raise
+    async def put(self, path: str, json: dict, timeout: float = None) -> dict:
+        response = await self._request("PUT", path, json=json, timeout=timeout)
+        return self._handle_response(response)
+
+    async def delete(self, path: str, params: dict, timeout: float = None) -> dict:
+        response = await self._request("DELETE", path, params=params, timeout=timeout)
+        return self._handle_response(response)
 
 class DatabaseServiceClient(BaseHTTPClient):
-    def __init__(self, base_url: str = "http://db_service:8005"):
-        super().__init__(base_url)
+    def __init__(self, base_url: str = DATABASE_SERVICE_URL, **kwargs):
+        super().__init__(base_url, **kwargs)
 
     # ----------------- User methods -----------------
 
@@ -81,9 +140,9 @@ class DatabaseServiceClient(BaseHTTPClient):
         path="/create_filter"
         payload = filter.copy()
         payload["telegram_id"] = user_id
-        logger.info(f"Create new filter for user {user_id}: {filter}")
-        logger.info(f"Payload: {payload}")
-        return self.post(path, json=payload)
+        logger.info("Create new filter for user %s: %s", user_id, filter)
+        logger.debug("Payload: %s", payload)
+        return await self.post(path, json=payload)
 
     async def update_property_filter(self, user_id: int, filter_id: int, update_param: str, new_value: str, type: str):
         path="/update_filter"
@@ -94,23 +153,23 @@ class DatabaseServiceClient(BaseHTTPClient):
             "value": new_value,
             "type": type
         }
-        logger.info(f"Update filter {filter_id} for user {user_id}: {update_param} = {new_value}")
-        logger.info(f"Payload: {payload}")
-        return self.post(path, json=payload)
+        logger.info("Update filter %s for user %s: %s = %s", filter_id, user_id, update_param, new_value)
+        logger.debug("Payload: %s", payload)
+        return await self.post(path, json=payload)
 
     async def get_property_filters_list(self, user_id):
         path="/get_filters"
         payload = {
             "telegram_id": user_id
         }
-        return self.get(path, params=payload)
+        return await self.get(path, params=payload)
     
     async def get_property_filter(self, filter_id: int):
         path="/get_filter"
         payload = {
             "filter_id": filter_id
         }
-        return self.get(path, params=payload)
+        return await self.get(path, params=payload)
 
     async def delete_property_filter(self, user_id, filter_id: int):
         path="/delete_filter"
@@ -118,45 +177,65 @@ class DatabaseServiceClient(BaseHTTPClient):
             "telegram_id": user_id,
             "filter_id": filter_id
         }
-        return self.delete(path, params=payload)
+        return await self.delete(path, params=payload)
 
     async def get_favorites_list(self, user_id: int, offset: int, limit: int = 10):
         path=f"/get_favorites/{user_id}/{offset}/{limit}"
-        logger.info(f"Get favorites list for user {user_id}")
-        return self.get(path)
+        logger.info("Get favorites list for user %s", user_id)
+        return await self.get(path)
     
+    async def get_favorites_page(self, user_id: int, cursor: Optional[str] = None, limit: int = 10):
+        """Страница избранного и курсор следующей (None, если страница последняя)"""
+        path=f"/favorites/{user_id}"
+        params = {"limit": limit}
+        if cursor:
+            params["cursor"] = cursor
+        return await self.get(path, params=params)
+
     async def delete_from_favorites(self, favorites_id: int):
         path="/delete_from_favorites"
         payload = {
             "favorites_id": favorites_id
         }
-        logger.info(f"Delete from favorites {favorites_id}")
-        logger.info(f"Payload: {payload}")
-        return self.delete(path, params=payload)
+        logger.info("Delete from favorites %s", favorites_id)
+        logger.debug("Payload: %s", payload)
+        return await self.delete(path, params=payload)
 
-    async def get_next_announcement(self, filter_id: int):
+    async def get_next_announcement(self, filter_id: int, user_id: int = None):
         path="/get_property_for_filter"
         payload = {
             "filter_id": filter_id
         }
-        logger.info(f"Get next announcement for filter {filter_id}")
-        logger.info(f"Payload: {payload}")
-        return self.get(path, params=payload)
+        if user_id is not None:
+            payload["telegram_id"] = user_id
+        logger.info("Get next announcement for filter %s", filter_id)
+        logger.debug("Payload: %s", payload)
+        return await self.get(path, params=payload)
+
+    async def reset_search_feed(self, user_id: int, filter_id: int):
+        path="/search_session"
+        payload = {
+            "telegram_id": user_id,
+            "filter_id": filter_id
+        }
+        logger.info("Reset search feed for filter %s", filter_id)
+        return await self.delete(path, params=payload)
 
     async def add_to_favorites(self, user_id: int, property_id: int):
         path = f"/add_to_favorites/{user_id}/{property_id}"
 
-        self.post(path=path)
+        return await self.post(path=path)
 
-    async def increase_statistics(self, property_id: int, param_name: str):
+    async def increase_statistics(self, property_id: int, param_name: str, count: int = 1):
         path="/increase_statistics"
 
         payload={
             "property_id":property_id,
-            "param_name":param_name
+            "param_name":param_name,
+            "count":count
         }
 
-        self.post(path, json=payload)
+        return await self.post(path, json=payload)
 
     # ----------------- Admin methods -----------------
 
@@ -165,82 +244,107 @@ class DatabaseServiceClient(BaseHTTPClient):
         payload = {
             "telegram_id": user_id
         }
-        return self.get(path, params=payload)["is_admin"]
+        respond = await self.get(path, params=payload)
+        return respond["is_admin"]
+
+    async def get_admins(self):
+        path="/admins"
+        return await self.get(path)
+
+    async def get_admin_version(self) -> int:
+        path="/admins/version"
+        respond = await self.get(path)
+        return respond["version"]
 
     async def register_admin(self, user_id: int):
         path="/register_admin"+f"/{user_id}"
         payload = {
             "telegram_id": user_id,
         }
-        logger.info(f"Register admin {user_id}")
-        logger.info(f"Payload: {payload}")
-        return self.post(path, json=payload)
+        logger.info("Register admin %s", user_id)
+        logger.debug("Payload: %s", payload)
+        return await self.post(path, json=payload)
 
     async def unregister_admin(self, user_id: int):
         path=f"/unregister_admin/{user_id}"
-        logger.info(f"Unregister admin {user_id}")
-        return self.post(path)
+        logger.info("Unregister admin %s", user_id)
+        return await self.post(path)
 
     async def new_property(self, user_id: int, property: dict):
         path="/add_property"
         payload = property.copy()
         payload["telegram_id"] = user_id
-        return self.post(path, json=payload)
+        return await self.post(path, json=payload)
+
+    async def new_properties(self, user_id: int, properties: List[dict]):
+        """Пачка объявлений одним запросом: для каждого property_id или error и подписчики"""
+        path="/add_properties"
+        logger.info("Add %s properties for user %s", len(properties), user_id)
+        return await self.post(path, json={"properties": properties}, timeout=120)
 
     async def upload_image(self, property_id: int, number: int, image_bytes: bytes):
         path=f"/upload_image"
-        logger.info(f"Upload image for property {property_id}")
+        logger.info("Upload image for property %s", property_id)
         try:
             file = { "image": (f"{property_id}_{number}.jpeg", image_bytes, "image/jpeg") }
-            """
-            file = io.BytesIO(image_bytes)
-            file.seek(0)
-            file.name = f"{property_id}_{number}.jpeg"
-
-            files = { "image"}
-            """
-            response = requests.post(self._build_url(path), files=file)
+            return await self.post(path, files=file, timeout=60)
         except Exception as e:
-            logger.error(f"Ошибка при отправке изображения в FastAPI: {e}")
+            logger.error("Ошибка при отправке изображения в FastAPI: %s", e)
             return None
 
+    async def upload_images(self, property_id: int, images: List[bytes]):
+        """Все фотографии объявления одним запросом. В отличие от upload_image ошибка пробрасывается"""
+        path=f"/upload_images/{property_id}"
+        logger.info("Upload %s images for property %s", len(images), property_id)
+        files = [
+            ("images", (f"{property_id}_{number}.jpeg", image_bytes, "image/jpeg"))
+            for number, image_bytes in enumerate(images)
+        ]
+        try:
+            return await self.post(path, files=files, timeout=60)
+        except Exception as e:
+            logger.error("Ошибка при отправке изображений в FastAPI: %s", e)
+            raise
+
     async def get_property_description(self, property_id: int):
         path = f"/get_property_info/{property_id}"
-        return self.get(path)
+        return await self.get(path)
 
-    async def get_property_photo(self, property_id: int, photo_num: int = 0):
+    async def get_property_card(self, property_id: int, viewer: Optional[int] = None):
+        path = f"/property_card/{property_id}"
+        params = {"viewer": viewer} if viewer is not None else {}
+        return await self.get(path, params=params)
+
+    async def get_property_photo(self, property_id: int, photo_num: int = 0, size: str = "original"):
+        """size: thumb (320px), card (1280px) или original"""
         path = f"/properties/{property_id}/photo/{photo_num}"
+        params = {"size": size} if size != "original" else None
 
         try:
-            response = requests.get(self._build_url(path))
-            response.raise_for_status()
-            return response.content
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Error fetching photo {photo_num} for property {property_id}: {e}")
-            return None
-        except requests.exceptions.HTTPError as e:
-            logger.error(f"HTTP error fetching photo {photo_num} for property {property_id}: {e}")
-            return None
-        except requests.exceptions.JSONDecodeError as e:
-            logger.error(f"JSON decode error fetching photo {photo_num} for property {property_id}: {e}")
+            return await self.get_bytes(path, params=params)
+        except httpx.HTTPError as e:
+            logger.error("Error fetching photo %s for property %s: %s", photo_num, property_id, e)
             return None
         except Exception as e:
-            logger.error(f"Unexpected error fetching photo {photo_num} for property {property_id}: {e}")
+            logger.error("Unexpected error fetching photo %s for property %s: %s", photo_num, property_id, e)
             return None
 
-    async def get_property_photos(self, property_id: int):
+    async def get_property_photos_count(self, property_id: int) -> int:
         path = f"/get_property_photos_count/{property_id}"
-        count = self.get(path)
+        count = await self.get(path)
 
         if count is None:
-            logger.error(f"Failed to get photo count for property {property_id}")
-            return []
-        
-        count = count.get("photos_count", 0)
+            logger.error("Failed to get photo count for property %s", property_id)
+            return 0
+
+        return count.get("photos_count", 0)
+
+    async def get_property_photos(self, property_id: int):
+        count = await self.get_property_photos_count(property_id)
         if count == 0:
-            logger.info(f"No photos found for property {property_id}")
+            logger.info("No photos found for property %s", property_id)
             return []
-        logger.info(f"Found {count} photos for property {property_id}")
+        logger.info("Found %s photos for property %s", count, property_id)
 
         photos = []
 
@@ -249,10 +353,10 @@ class DatabaseServiceClient(BaseHTTPClient):
             photo_bytes = await self.get_property_photo(property_id, photo_num)
 
             if photo_bytes is None:
-                logger.error(f"Failed to get photo {photo_num} for property {property_id}")
+                logger.error("Failed to get photo %s for property %s", photo_num, property_id)
                 continue
 
-            logger.info(f"Got photo {photo_num} for property {property_id}")
+            logger.debug("Got photo %s for property %s", photo_num, property_id)
 
             photos.append(photo_bytes) 
 
@@ -261,30 +365,48 @@ class DatabaseServiceClient(BaseHTTPClient):
     async def get_property_list(self, offset: int, limit: int):
         path = f"/get_properties/{offset}/{limit}"
 
-        return self.get(path)
+        return await self.get(path)
+
+    async def get_properties_page(self, cursor: Optional[str] = None, limit: int = 10):
+        path = "/properties"
+        params = {"limit": limit}
+        if cursor:
+            params["cursor"] = cursor
+        return await self.get(path, params=params)
 
     async def delete_property(self, property_id: int):
         path = f"/delete_property/{property_id}"
-        logger.info(f"Delete property {property_id}")
-        return self.delete(path, params={})
+        logger.info("Delete property %s", property_id)
+        return await self.delete(path, params={})
 
     async def change_property_state(self, property_id: int, new_state: str):
         path = f"/change_property_state/{property_id}/{new_state}"
-        logger.info(f"Change property state {property_id}")
+        logger.info("Change property state %s", property_id)
         payload = {
             "new_state": new_state
         }
-        return self.post(path, json=payload)
+        return await self.post(path, json=payload)
 
     async def get_property_statistics(self, property_id: int):
         path = f"/get_property_statistics/{property_id}"
 
-        return self.get(path)
+        return await self.get(path)
     
     async def get_statistics(self):
         path = f"/get_statistics"
 
-        return self.get(path)
+        return await self.get(path)
+
+_database_service_clients: Dict[str, DatabaseServiceClient] = {}
+
+def get_database_service_client(base_url: str = DATABASE_SERVICE_URL) -> DatabaseServiceClient:
+    client = _database_service_clients.get(base_url)
+    if client is None:
+        client = DatabaseServiceClient(base_url=base_url)
+        _database_service_clients[base_url] = client
+    return client
 
-def get_database_service_client(base_url: str = "http://db_service:8005") -> DatabaseServiceClient:
-    return DatabaseServiceClient(base_url=base_url)
+async def close_database_service_clients():
+    for client in _database_service_clients.values():
+        await client.close()
+    _database_service_clients.clear()
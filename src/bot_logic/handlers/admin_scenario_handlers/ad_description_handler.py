@@ -4,6 +4,7 @@ from telethon import TelegramClient, events, Button
 import re
 
 from src.bot_logic.utils import go_to_neutral_state, send_property_info
+from src.bot_logic.router import UpdateRouter
 
 class AdDescriptionCommandHandler:
     def __init__(self, client: TelegramClient):
@@ -21,8 +22,5 @@ class AdDescriptionCommandHandler:
 
         await send_property_info(self.client, event.chat_id, announcement_id, message, buttons)
 
-    def register_handlers(self):
-        self.client.add_event_handler(
-            self.execute,
-            events.CallbackQuery(data=re.compile(r"^ad_description:(.*)$")),
-        )
\ No newline at end of file
+    def register_handlers(self, router: UpdateRouter):
+        router.add_callback("ad_description:", self.execute)
\ No newline at end of file
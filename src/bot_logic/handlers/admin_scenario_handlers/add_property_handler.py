@@ -1,6 +1,5 @@
 import logging
 import re
-import os
 from typing import Optional, List
 from dotenv import load_dotenv
 from io import BytesIO
@@ -14,48 +13,23 @@ from fastapi import UploadFile
 from src.bot_logic.state_machine import get_state_machine
 from src.bot_logic.utils import is_admin, media_to_upload_file, send_property_info
 from src.bot_logic.database_service_client import get_database_service_client
+from src.bot_logic.media_cache import get_media_cache
+from src.bot_logic.notifications import start_property_fanout
+from src.bot_logic.router import UpdateRouter
 
 load_dotenv()
 
-LOG_FILE = os.path.join("logs", "add_property.log")
-
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    filename=LOG_FILE,
-)
 logger = logging.getLogger(__name__)
 
 class AddPropertyHandler:
     def __init__(self, client: TelegramClient):
         self.client = client
-        self.property_params = {}
-
-    def register_handlers(self):
-        self.client.add_event_handler(
-            self.execute_param,
-            events.NewMessage(),
-        )
-        self.client.add_event_handler(
-            self.execute_param,
-            events.CallbackQuery(),
-        )
-        self.client.add_event_handler(
-            self.execute_images,
-            events.NewMessage(pattern="(?i)upload_images"),
-        )
-        self.client.add_event_handler(
-            self.execute_images,
-            events.Album(),
-        )
-        self.client.add_event_handler(
-            self.execute_start,
-            events.NewMessage(pattern="/new_property"),
-        )
-        self.client.add_event_handler(
-            self.execute_start,
-            events.CallbackQuery(data="/new_property"),
-        )
+
+    def register_handlers(self, router: UpdateRouter):
+        router.add_state("CREATING_PROPERTY", self.execute_param)
+        router.add_message("upload_images", self.execute_images)
+        router.add_album(self.execute_images)
+        router.add_command("/new_property", self.execute_start)
 
     async def execute_start(self, event):
         user_id = event.sender_id
@@ -64,12 +38,12 @@ class AddPropertyHandler:
             await self.client.send_message(user_id, "У вас нет прав на эту команду.")
             return
 
-        logger.info(f"User {user_id} started property process")
+        logger.info("User %s started property process", user_id)
         state_machine = get_state_machine()
 
         state_machine.starting_add_property(user_id)
 
-        self.property_params["return_contact"] = str(user_id)
+        state_machine.save_property_param(user_id, "return_contact", str(user_id))
 
         state_machine.next_creating_property_pram(user_id)
         await state_machine.send_creating_property_message(self.client, user_id)
@@ -98,7 +72,7 @@ class AddPropertyHandler:
         if state_machine.get_creating_property_param(user_id) == "IMAGES":
             message = "Полученое описание:\n"
 
-            for key, value in self.property_params.items():
+            for key, value in state_machine.get_property_params(user_id).items():
                 if key != "return_contact":
                     message += f"{key}: {value}\n"
             message += "\nОтправьте фотографии, которые хотите загрузить. Чтобы завершить загрузку, отправьте сообщение 'Завершить загрузку'."
@@ -129,14 +103,14 @@ class AddPropertyHandler:
         if type(value) == str and len(value.split(":")) > 1:
             value = value.split(":")[1]
             
-        self.property_params[name] = value
-        logger.info(f"User {user_id}: сохранен параметр {name} = {value}")
+        state_machine.save_property_param(user_id, name, value)
+        logger.info("User %s: сохранен параметр %s = %s", user_id, name, value)
 
         state_machine.next_creating_property_pram(user_id)
         await state_machine.send_creating_property_message(self.client, user_id)
 
     async def handle_image(self, event: events.NewMessage.Event):
-        logger.info(f"User {event.sender_id} started one image upload process")
+        logger.info("User %s started one image upload process", event.sender_id)
 
         if event.media and (isinstance(event.media, MessageMediaPhoto) or isinstance(event.media, MessageMediaDocument)):
             try:
@@ -149,12 +123,12 @@ class AddPropertyHandler:
                     return None
 
             except Exception as e:
-                logger.error(f"Ошибка при обработке изображения: {e}")
+                logger.error("Ошибка при обработке изображения: %s", e)
                 await event.respond("Произошла ошибка при обработке изображения.")
                 return None
 
     async def handle_album(self, event: events.Album.Event):
-        logger.info(f"User {event.sender_id} started album upload process")
+        logger.info("User %s started album upload process", event.sender_id)
         try:
             upload_files: List[bytes] = []
             for media in event.messages:
@@ -164,24 +138,24 @@ class AddPropertyHandler:
                     if upload_file:
                         upload_files.append(upload_file)
                     else:
-                        logger.warning(f"Не удалось обработать одно из изображений в альбоме от user_id {event.sender_id}")
-                logger.info(f"User {event.sender_id} обработал изображение в альбоме")
+                        logger.warning("Не удалось обработать одно из изображений в альбоме от user_id %s", event.sender_id)
+                logger.info("User %s обработал изображение в альбоме", event.sender_id)
             if upload_files:
                 return upload_files
             else:
-                logger.warning(f"Не удалось обработать альбом от user_id {event.sender_id}")
+                logger.warning("Не удалось обработать альбом от user_id %s", event.sender_id)
                 await event.respond("Не удалось обработать альбом.")
                 return None
 
         except Exception as e:
-            logger.error(f"Ошибка при обработке альбома: {e}")
+            logger.error("Ошибка при обработке альбома: %s", e)
             await event.respond("Произошла ошибка при обработке альбома.")
 
     async def execute_images(self, event):
         user_id = event.sender_id
         state_machine = get_state_machine()
 
-        logger.info(f"User {user_id} started image upload process")
+        logger.info("User %s started image upload process", user_id)
 
         if state_machine.get_creating_property_param(user_id) != "CONFIRMATION":
             return
@@ -201,7 +175,7 @@ class AddPropertyHandler:
                     return
 
         except Exception as e:
-            logger.error(f"Ошибка при получении фотографий из чата {event.chat_id}: {e}")
+            logger.error("Ошибка при получении фотографий из чата %s: %s", event.chat_id, e)
             images = None
             return
         
@@ -209,39 +183,30 @@ class AddPropertyHandler:
             await self.client.send_message(user_id, "Не удалось обработать изображения.", buttons=buttons)
             return
         
-        logger.info(f"images saved")
+        logger.info("images saved")
         
         property_id = 0
         try:
-            logger.info(f"property_params: {self.property_params}")
+            property_params = state_machine.get_property_params(user_id)
+            logger.debug("property_params: %s", property_params)
             database_client = get_database_service_client()
-            respond = await database_client.new_property(user_id, self.property_params)
+            respond = await database_client.new_property(user_id, property_params)
             property_id = respond["property_id"]
 
-            count = 0
-            for image in images:
-                logger.info(f"Uploading image for property {property_id}")
-                await database_client.upload_image(property_id, count, image)
-                count += 1
+            logger.info("Uploading %s images for property %s", len(images), property_id)
+            await database_client.upload_images(property_id, images)
 
             await self.client.send_message(user_id, "Объект успешно загружен.", buttons=buttons)
 
-            for user in respond["users_id"]:
-                message = "Посмотрите на новое объявление, подъодящее под ваши фильтры!"
-                buttons = [ 
-                    [Button.inline("Связаться с риелтором 🤝", f"like:-:{property_id}")],
-                    [Button.inline("В избранное ❤️", f"to_favorites:{property_id}")],
-                    [Button.inline("В меню", "/start")]
-                ]
-
-                await send_property_info(self.client, user["telegram_id"], property_id, message=message, buttons=buttons)
-                await database_client.increase_statistics(property_id, "views")
+            if respond["users_id"]:
+                start_property_fanout(self.client, property_id, respond["users_id"], admin_id=user_id)
 
             state_machine.end_creating_property(user_id)
         except Exception as e:
-            logger.info(f"Error sending images to database for user {user_id}: {e}")
+            logger.info("Error sending images to database for user %s: %s", user_id, e)
             database_client = get_database_service_client()
             respond = await database_client.delete_property(property_id)
+            await get_media_cache().invalidate(property_id)
             await self.client.send_message(user_id, "Произошла ошибка при загрузке фотографий", buttons=buttons)
             await state_machine.send_creating_property_message(self.client, user_id)
 
@@ -1,33 +1,23 @@
 import logging
 import re
-import os
 from dotenv import load_dotenv
 
 from telethon import TelegramClient, events, Button
 
 from src.bot_logic.utils import is_admin, send_property_info
 from src.bot_logic.database_service_client import get_database_service_client
+from src.bot_logic.router import UpdateRouter
 
 load_dotenv()
 
-LOG_FILE = os.path.join("logs", "add_property.log")
-
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    filename=LOG_FILE,
-)
 logger = logging.getLogger(__name__)
 
 class GetPropertyStatisticsHandler:
     def __init__(self, client: TelegramClient):
         self.client = client
 
-    def register_handlers(self):
-        self.client.add_event_handler(
-            self.execute,
-            events.CallbackQuery(data=re.compile(r"^get_property_statistics:(.*)$")),
-        )
+    def register_handlers(self, router: UpdateRouter):
+        router.add_callback("get_property_statistics:", self.execute)
 
     async def execute(self, event):
         user_id = event.sender_id
@@ -52,14 +42,14 @@ class GetPropertyStatisticsHandler:
             ]   
 
             await self.client.send_message(user_id, message=message, buttons=buttons)
-            logger.info(f"Statistics sent to {user_id}")
+            logger.info("Statistics sent to %s", user_id)
         except Exception as e:
             buttons=[
                 [Button.inline("Назад", f"show_property:{property_id}")],
                 [Button.inline("В меню", "/start")]
             ]   
             await self.client.send_message(user_id, message="Произошла ошибка, попробуйте снова!", buttons=buttons)
-            logger.info(f"Fail to send statistic to {user_id}")
+            logger.info("Fail to send statistic to %s", user_id)
 
 
         
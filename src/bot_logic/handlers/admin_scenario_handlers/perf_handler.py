@@ -0,0 +1,52 @@
+import logging
+import os
+
+from telethon import TelegramClient, Button
+
+from src.bot_logic.bot_metrics import handler_summary
+from src.bot_logic.router import UpdateRouter
+from src.bot_logic.state_machine import get_state_machine
+from src.bot_logic.utils import is_admin
+
+logger = logging.getLogger(__name__)
+
+PERF_TOP = int(os.getenv("PERF_TOP", "10"))
+
+
+def format_perf_report(rows, memory) -> str:
+    if not rows:
+        return "Обработчики еще не вызывались."
+    lines = [f"Самые медленные обработчики (топ {len(rows)}):"]
+    for row in rows:
+        lines.append(
+            f"\n{row['handler']}\n"
+            f"  вызовов: {row['count']}, ошибок: {row['errors']}\n"
+            f"  среднее: {row['avg_ms']:.1f} мс, p95: ≤{row['p95_ms']:.0f} мс\n"
+            f"  Telegram: {row['telegram_ms'] / row['count']:.1f} мс, "
+            f"database_service: {row['database_ms'] / row['count']:.1f} мс в среднем"
+        )
+    lines.append(f"\nСессий в памяти: {memory['sessions']}, ~{memory['bytes'] // 1024} КБ")
+    return "\n".join(lines)
+
+
+class PerfCommandHandler:
+    def __init__(self, client: TelegramClient):
+        self.client = client
+
+    def register_handlers(self, router: UpdateRouter):
+        router.add_command("/perf", self.execute)
+
+    async def execute(self, event):
+        user_id = event.sender_id
+
+        if not await is_admin(self.client, user_id):
+            await self.client.send_message(user_id, "У вас нет прав на эту команду.")
+            return
+
+        message = format_perf_report(handler_summary(PERF_TOP), get_state_machine().memory_stats())
+        buttons = [
+            [Button.inline("Обновить", "/perf")],
+            [Button.inline("В меню", "/start")]
+        ]
+        await self.client.send_message(user_id, message, buttons=buttons)
+        logger.info("Perf report sent to %s", user_id)
@@ -9,14 +9,9 @@ load_dotenv()
 
 from src.bot_logic.utils import go_to_neutral_state
 from src.bot_logic.database_service_client import get_database_service_client
+from src.bot_logic.admin_cache import get_admin_cache
+from src.bot_logic.router import UpdateRouter
 
-LOG_FILE = os.path.join("logs", "bot.log")
-
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    filename=LOG_FILE,
-)
 logger = logging.getLogger(__name__)
 
 class RegisterAdminCommandHandler:
@@ -34,15 +29,13 @@ class RegisterAdminCommandHandler:
         try:
             database_client = get_database_service_client()
             await database_client.register_admin(user_id)
+            get_admin_cache().invalidate()
 
             await self.client.send_message(event.chat_id, "Вы успешно зарегистрированы как администратор.")
             await go_to_neutral_state(event.chat_id, self.client)
         except Exception as e:
             await self.client.send_message(event.chat_id, "Произошла ошибка, попробуйте еще раз.")
-            logger.exception(f"Register admin error: {e}")
+            logger.exception("Register admin error: %s", e)
 
-    def register_handlers(self):
-        self.client.add_event_handler(
-            self.execute,
-            events.NewMessage(pattern="/register_admin"),
-        )
\ No newline at end of file
+    def register_handlers(self, router: UpdateRouter):
+        router.add_message("/register_admin", self.execute)
\ No newline at end of file
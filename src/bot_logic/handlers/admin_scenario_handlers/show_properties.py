@@ -1,6 +1,5 @@
 import logging
 import re
-import os
 from typing import Optional, List
 from dotenv import load_dotenv
 from io import BytesIO
@@ -11,53 +10,38 @@ from telethon.types import MessageMediaPhoto
 from telethon.types import MessageMediaDocument
 
 from src.bot_logic.state_machine import get_state_machine
-from src.bot_logic.utils import is_admin, send_property_info
+from src.bot_logic.utils import is_admin, send_property_info, page_cursor, load_page
 from src.bot_logic.database_service_client import get_database_service_client
+from src.bot_logic.media_cache import PHOTO_THUMB, send_cached_photos
+from src.bot_logic.router import UpdateRouter
 
 load_dotenv()
 
-LOG_FILE = os.path.join("logs", "add_property.log")
-
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    filename=LOG_FILE,
-)
 logger = logging.getLogger(__name__)
 
 class ShowPropertiesHandler:
     def __init__(self, client: TelegramClient):
         self.client = client
 
-    def register_handlers(self):
-        self.client.add_event_handler(
-            self.execute_start,
-            events.NewMessage(pattern=re.compile(r"^show_properties:(.*)$")),
-        )
-        self.client.add_event_handler(
-            self.execute_start,
-            events.CallbackQuery(data=re.compile(r"^show_properties:(.*)$")),
-        )
-        self.client.add_event_handler(
-            self.show_property,
-            events.CallbackQuery(data=re.compile(r"^show_property:(.*)$")),
-        )
+    def register_handlers(self, router: UpdateRouter):
+        router.add_command("show_properties:", self.execute_start)
+        router.add_callback("show_property:", self.show_property)
 
     async def execute_start(self, event):
         user_id = event.sender_id
-        offset = int(event.data.decode().split(":")[1].strip())
+        cursor = page_cursor(event.data.decode())
 
         if not await is_admin(self.client, user_id):
             await self.client.send_message(user_id, "У вас нет прав на эту команду.")
             return
 
-        logger.info(f"User {user_id} started show properties process")
+        logger.info("User %s started show properties process", user_id)
         database_client = get_database_service_client()
-        properties_id = await database_client.get_property_list(offset, limit=10)
+        page = await load_page(lambda cursor: database_client.get_properties_page(cursor, limit=10), cursor)
 
-        logger.info(f"Properties list for user {user_id}: {properties_id}")
+        logger.info("Properties list for user %s: %s", user_id, page)
 
-        properties_id = properties_id["properties"]
+        properties_id = page["properties"]
 
         photos = []
         buttons = []
@@ -68,25 +52,19 @@ class ShowPropertiesHandler:
 
         for property_id in properties_id:
             property_id = property_id["id"]
-            photo_bytes = await database_client.get_property_photo(property_id)
-
-            photo = await self.client.upload_file(
-                file=photo_bytes,
-                file_name="photo.jpg",
-            )
-
-            photos.append(photo)
+            photos.append((property_id, 0))
             buttons.append([Button.inline(f"Объект {property_id}", f"show_property:{property_id}")])
 
-        buttons.append([Button.inline("Следующие 👉", f"show_properties:{offset+10}")])
+        if page["next_cursor"]:
+            buttons.append([Button.inline("Следующие 👉", f"show_properties:{page['next_cursor']}")])
         buttons.append([Button.inline("В меню", "/start")])
 
-        logger.info(f"Sending message with buttons {buttons}")
+        logger.info("Sending message with buttons %s", buttons)
         
-        await self.client.send_file(user_id, photos)
+        await send_cached_photos(self.client, user_id, photos, size=PHOTO_THUMB)
 
         await self.client.send_message(user_id, message=" . ", buttons=buttons)
-        logger.info(f"Message with photos sent to {user_id}")
+        logger.info("Message with photos sent to %s", user_id)
 
     async def show_property(self, event):
         user_id = event.sender_id
@@ -99,6 +77,6 @@ class ShowPropertiesHandler:
             [Button.inline("Удалить", f"delete_property:{property_id}"),
             Button.inline("В меню", "/start")]
         ]
-        logger.info(f"User {user_id} requested property {property_id}")
+        logger.info("User %s requested property %s", user_id, property_id)
         await send_property_info(self.client, user_id, property_id, is_admin=True, buttons=buttons)
 
@@ -1,6 +1,5 @@
 import logging
 import re
-import os
 from typing import Optional, List
 from dotenv import load_dotenv
 from io import BytesIO
@@ -13,35 +12,20 @@ from telethon.types import MessageMediaDocument
 from src.bot_logic.state_machine import get_state_machine
 from src.bot_logic.utils import is_admin, send_property_info
 from src.bot_logic.database_service_client import get_database_service_client
+from src.bot_logic.router import UpdateRouter
 
 load_dotenv()
 
-LOG_FILE = os.path.join("logs", "add_property.log")
-
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    filename=LOG_FILE,
-)
 logger = logging.getLogger(__name__)
 
 class SoldRentedFreePropertyHandler:
     def __init__(self, client: TelegramClient):
         self.client = client
 
-    def register_handlers(self):
-        self.client.add_event_handler(
-            self.execute,
-            events.CallbackQuery(data=re.compile(r"^become_rented_property:(.*)$")),
-        )
-        self.client.add_event_handler(
-            self.execute,
-            events.CallbackQuery(data=re.compile(r"^sold_property:(.*)$")),
-        )        
-        self.client.add_event_handler(
-            self.execute,
-            events.CallbackQuery(data=re.compile(r"^property_back_active:(.*)$")),
-        )
+    def register_handlers(self, router: UpdateRouter):
+        router.add_callback("become_rented_property:", self.execute)
+        router.add_callback("sold_property:", self.execute)
+        router.add_callback("property_back_active:", self.execute)
 
     async def execute(self, event):
         user_id = event.sender_id
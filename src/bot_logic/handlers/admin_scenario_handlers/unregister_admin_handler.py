@@ -2,21 +2,15 @@ from telethon import TelegramClient
 from telethon.events import NewMessage
 from telethon import TelegramClient, events, Button
 import logging
-import os
 
 from dotenv import load_dotenv
 load_dotenv()
 
 from src.bot_logic.utils import go_to_neutral_state
 from src.bot_logic.database_service_client import get_database_service_client
+from src.bot_logic.admin_cache import get_admin_cache
+from src.bot_logic.router import UpdateRouter
 
-LOG_FILE = os.path.join("logs", "bot.log")
-
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    filename=LOG_FILE,
-)
 logger = logging.getLogger(__name__)
 
 class UnregisterAdminCommandHandler:
@@ -29,15 +23,13 @@ class UnregisterAdminCommandHandler:
         try:
             database_client = get_database_service_client()
             await database_client.unregister_admin(user_id)
+            get_admin_cache().invalidate()
 
             await self.client.send_message(event.chat_id, "Вы больше не администратор.")
             await go_to_neutral_state(event.chat_id, self.client)
         except Exception as e:
             await self.client.send_message(event.chat_id, "Произошла ошибка, попробуйте еще раз.")
-            logger.exception(f"Unregister admin error: {e}")
+            logger.exception("Unregister admin error: %s", e)
 
-    def register_handlers(self):
-        self.client.add_event_handler(
-            self.execute,
-            events.CallbackQuery(data="/unregister_admin"),
-        )
\ No newline at end of file
+    def register_handlers(self, router: UpdateRouter):
+        router.add_callback("/unregister_admin", self.execute)
\ No newline at end of file
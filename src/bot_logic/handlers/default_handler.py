@@ -1,19 +1,12 @@
 from telethon import TelegramClient, events
 import logging
-import os
 
 from src.bot_logic.state_machine import get_state_machine
 from src.bot_logic.utils import go_to_neutral_state
 from src.bot_logic.handlers.user_scenario_handlers.property_filters import NewPropertyFilterHandler
 from src.bot_logic.handlers.user_scenario_handlers.update_handler import UpdateCommandHandler
+from src.bot_logic.router import UpdateRouter
 
-LOG_FILE = os.path.join("logs", "bot.log")
-
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    filename=LOG_FILE,
-)
 logger = logging.getLogger(__name__)
 
 class DefaultHandler:
@@ -22,8 +15,8 @@ class DefaultHandler:
         self.property_filter_handler = NewPropertyFilterHandler(self.client)
         self.update_handler = UpdateCommandHandler(self.client)
 
-    def register_handlers(self):
-        self.client.add_event_handler(self.handle_default, events.NewMessage())
+    def register_handlers(self, router: UpdateRouter):
+        router.set_default_message(self.handle_default)
 
     async def handle_default(self, event):
         user_id = event.sender_id
@@ -31,7 +24,7 @@ class DefaultHandler:
         state = state_machine.get_property_state(user_id)
         update_param = state_machine.get_user_update_param(user_id)
 
-        logger.info(f"User {user_id}: обработка события, state: {state}, update_param: {update_param}")
+        logger.info("User %s: обработка события, state: %s, update_param: %s", user_id, state, update_param)
 
         if state == "NAME":
             event.text = "name:"+event.text
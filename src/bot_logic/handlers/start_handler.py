@@ -3,6 +3,7 @@ from telethon.events import NewMessage
 from telethon import TelegramClient, events, Button
 
 from src.bot_logic.utils import go_to_neutral_state
+from src.bot_logic.router import UpdateRouter
 
 class StartCommandHandler:
     def __init__(self, client: TelegramClient):
@@ -11,12 +12,5 @@ class StartCommandHandler:
     async def execute(self, event):
         await go_to_neutral_state(event.chat_id, self.client)
 
-    def register_handlers(self):
-        self.client.add_event_handler(
-            self.execute,
-            events.NewMessage(pattern="/start"),
-        )
-        self.client.add_event_handler(
-            self.execute,
-            events.CallbackQuery(data="/start"),
-        )
\ No newline at end of file
+    def register_handlers(self, router: UpdateRouter):
+        router.add_command("/start", self.execute)
\ No newline at end of file
@@ -2,19 +2,12 @@ from telethon import TelegramClient
 from telethon.events import NewMessage
 from telethon import TelegramClient, events, Button
 import logging
-import os
 import re
 
 from src.bot_logic.utils import go_to_neutral_state
 from src.bot_logic.database_service_client import get_database_service_client
+from src.bot_logic.router import UpdateRouter
 
-LOG_FILE = os.path.join("logs", "bot.log")
-
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    filename=LOG_FILE,
-)
 logger = logging.getLogger(__name__)
 
 class DeleteCommandHandler:
@@ -27,7 +20,7 @@ class DeleteCommandHandler:
         try:
             database_client = get_database_service_client()
             filter_list = await database_client.get_property_filters_list(user_id)
-            logger.info(f"User {user_id}: получен список фильтров для удаления: {filter_list}")
+            logger.info("User %s: получен список фильтров для удаления: %s", user_id, filter_list)
 
             message = "Выберите фильтр для удаления:"
             
@@ -43,7 +36,7 @@ class DeleteCommandHandler:
             await self.client.send_message(event.chat_id, message, buttons=buttons)
         except Exception as e:
             await self.client.send_message(event.chat_id, "Произошла ошибка, попробуйте еще раз.")
-            logger.exception(f"Delete filters from database error: {e}")
+            logger.exception("Delete filters from database error: %s", e)
 
     async def execute_delete(self, event):
         user_id = event.chat_id
@@ -59,18 +52,8 @@ class DeleteCommandHandler:
             await go_to_neutral_state(event.chat_id, self.client)
         except Exception as e:
             await self.client.send_message(event.chat_id, "Произошла ошибка, попробуйте еще раз.")
-            logger.exception(f"Delete filters from database error: {e}")
+            logger.exception("Delete filters from database error: %s", e)
 
-    def register_handlers(self):
-        self.client.add_event_handler(
-            self.execute_choice,
-            events.NewMessage(pattern="/delete_filter"),
-        )
-        self.client.add_event_handler(
-            self.execute_choice,
-            events.CallbackQuery(data="/delete_filter"),
-        )
-        self.client.add_event_handler(
-            self.execute_delete,
-            events.CallbackQuery(data=re.compile(r"^delete:(.*)$")),
-        )
\ No newline at end of file
+    def register_handlers(self, router: UpdateRouter):
+        router.add_command("/delete_filter", self.execute_choice)
+        router.add_callback("delete:", self.execute_delete)
\ No newline at end of file
@@ -1,6 +1,5 @@
 import logging
 import re
-import os
 from typing import Optional, List
 from dotenv import load_dotenv
 from io import BytesIO
@@ -11,45 +10,31 @@ from telethon.types import MessageMediaPhoto
 from telethon.types import MessageMediaDocument
 
 from src.bot_logic.state_machine import get_state_machine
-from src.bot_logic.utils import is_admin, send_property_info
+from src.bot_logic.utils import is_admin, send_property_info, page_cursor, load_page
 from src.bot_logic.database_service_client import get_database_service_client
+from src.bot_logic.media_cache import PHOTO_THUMB, send_cached_photos
+from src.bot_logic.router import UpdateRouter
 
 load_dotenv()
 
-LOG_FILE = os.path.join("logs", "bot.log")
-
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    filename=LOG_FILE,
-)
 logger = logging.getLogger(__name__)
 
 class FavoritesListHandler:
     def __init__(self, client: TelegramClient):
         self.client = client
 
-    def register_handlers(self):
-        self.client.add_event_handler(
-            self.execute_start,
-            events.NewMessage(pattern=re.compile(r"^/favorites_list:(.*)$")),
-        )
-        self.client.add_event_handler(
-            self.execute_start,
-            events.CallbackQuery(data=re.compile(r"^/favorites_list:(.*)$")),
-        )
-        self.client.add_event_handler(
-            self.show_property,
-            events.CallbackQuery(data=re.compile(r"^show_favorites_property:(.*)$")),
-        )
+    def register_handlers(self, router: UpdateRouter):
+        router.add_command("/favorites_list:", self.execute_start)
+        router.add_callback("show_favorites_property:", self.show_property)
 
     async def execute_start(self, event):
         user_id = event.sender_id
-        offset = int(event.data.decode().split(":")[1].strip())
+        cursor = page_cursor(event.data.decode())
 
-        logger.info(f"User {user_id} started show favorites process")
+        logger.info("User %s started show favorites process", user_id)
         database_client = get_database_service_client()
-        properties = await database_client.get_favorites_list(user_id, offset, limit=10)
+        page = await load_page(lambda cursor: database_client.get_favorites_page(user_id, cursor, limit=10), cursor)
+        properties = page["favorites"]
 
         photos = []
         buttons = []
@@ -61,20 +46,14 @@ class FavoritesListHandler:
         for property in properties:
             property_id = property["property_id"]
             favorite_id = property["id"]
-            photo_bytes = await database_client.get_property_photo(property_id)
-
-            photo = await self.client.upload_file(
-                file=photo_bytes,
-                file_name="photo.jpg",
-            )
-
-            photos.append(photo)
+            photos.append((property_id, 0))
             buttons.append([Button.inline(f"Объект {property_id}", f"show_favorites_property:{property_id}:{favorite_id}")])
 
-        buttons.append([Button.inline("Следующие 👉", f"favorites_list:{offset+10}")])
+        if page["next_cursor"]:
+            buttons.append([Button.inline("Следующие 👉", f"/favorites_list:{page['next_cursor']}")])
         buttons.append([Button.inline("В меню", "/start")])
         
-        await self.client.send_file(user_id, photos)
+        await send_cached_photos(self.client, user_id, photos, size=PHOTO_THUMB)
 
         await self.client.send_message(user_id, message=" . ", buttons=buttons)
 
@@ -88,6 +67,6 @@ class FavoritesListHandler:
             [Button.inline("Удалить из избранного", f"delete_from_favorites:{favorite_id}")],
             [Button.inline("В меню", "/start")]
         ]
-        logger.info(f"User {user_id} requested property {property_id}")
+        logger.info("User %s requested property %s", user_id, property_id)
         await send_property_info(self.client, user_id, property_id, is_admin=True, buttons=buttons)
 
@@ -1,6 +1,5 @@
 import logging
 import re
-import os
 
 from telethon import TelegramClient, events, Button
 
@@ -8,33 +7,17 @@ from src.bot_logic.state_machine import get_state_machine
 from src.bot_logic.utils import go_to_neutral_state, send_filter_info
 from src.bot_logic.database_service_client import get_database_service_client
 from src.bot_logic.messages import MESSAGES
+from src.bot_logic.router import UpdateRouter
 
-LOG_FILE = os.path.join("logs", "bot.log")
-
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    filename=LOG_FILE,
-)
 logger = logging.getLogger(__name__)
 
 class FavoritesListCommandHandler:
     def __init__(self, client: TelegramClient):
         self.client = client
 
-    def register_handlers(self):
-        self.client.add_event_handler(
-            self.execute_start,
-            events.NewMessage(pattern="/favorites_list"),
-        )
-        self.client.add_event_handler(
-            self.execute_start,
-            events.CallbackQuery(data="/favorites_list"),
-        )
-        self.client.add_event_handler(
-            self.execute_choice_param,
-            events.CallbackQuery(data=re.compile(r"^update:(.*)$")),
-        )
+    def register_handlers(self, router: UpdateRouter):
+        router.add_command("/favorites_list", self.execute_start)
+        router.add_callback("update:", self.execute_choice_param)
 
     async def execute_start(self, event):
         user_id = event.chat_id
@@ -55,7 +38,7 @@ class FavoritesListCommandHandler:
             await self.client.send_message(event.chat_id, message, buttons=buttons)
         except Exception as e:
             await self.client.send_message(event.chat_id, "Произошла ошибка, попробуйте еще раз.")
-            logger.exception(f"Update filters from database error: {e}")
+            logger.exception("Update filters from database error: %s", e)
 
     async def execute_choice_param(self, event):
         user_id = event.sender_id
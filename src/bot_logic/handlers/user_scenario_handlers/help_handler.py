@@ -3,6 +3,7 @@ from telethon.events import NewMessage
 from telethon import TelegramClient, events, Button
 from src.bot_logic.utils import go_to_neutral_state
 import re
+from src.bot_logic.router import UpdateRouter
 
 class HelpCommandHandler:
     def __init__(self, client: TelegramClient):
@@ -22,12 +23,5 @@ class HelpCommandHandler:
         await self.client.send_message(event.chat_id, instruction)
         await go_to_neutral_state(event.chat_id, self.client)
 
-    def register_handlers(self):
-        self.client.add_event_handler(
-            self.execute,
-            events.NewMessage(pattern="/help"),
-        )
-        self.client.add_event_handler(
-            self.execute,
-            events.CallbackQuery(data="/help"),
-        )
\ No newline at end of file
+    def register_handlers(self, router: UpdateRouter):
+        router.add_command("/help", self.execute)
\ No newline at end of file
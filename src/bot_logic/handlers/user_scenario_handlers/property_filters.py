@@ -10,111 +10,41 @@ from telethon import TelegramClient, events, Button
 from src.bot_logic.state_machine import get_state_machine
 from src.bot_logic.utils import go_to_neutral_state, send_current_state_message, format_filter_message
 from src.bot_logic.database_service_client import get_database_service_client
+from src.bot_logic.router import UpdateRouter
 
 load_dotenv()
 
-LOG_FILE = os.path.join("logs", "property_filter.log")
-
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    filename=LOG_FILE,
-)
 logger = logging.getLogger(__name__)
 
 class NewPropertyFilterHandler:
     def __init__(self, client: TelegramClient):
         self.client = client
 
-    def register_handlers(self):
-        self.client.add_event_handler(
-            self.execute_start,
-            events.NewMessage(pattern="/new_filter"),
-        )
-        self.client.add_event_handler(
-            self.execute_start,
-            events.CallbackQuery(data="/new_filter"),
-        )
-        self.client.add_event_handler(
-            self.execute_param,
-            events.NewMessage(pattern=re.compile(r"^name:(.*)$")),
-        )
-        self.client.add_event_handler(
-            self.execute_param,
-            events.CallbackQuery(data=re.compile(r"^property_type:(.*)$")),
-        )
-        self.client.add_event_handler(
-            self.execute_param,
-            events.CallbackQuery(data=re.compile(r"^deal_type:(.*)$")),
-        )
-        self.client.add_event_handler(
-            self.execute_param,
-            events.NewMessage(pattern=re.compile(r"^city:(.*)$")),
-        )
-        self.client.add_event_handler(
-            self.execute_param,
-            events.NewMessage(pattern=re.compile(r"^area:(.*)$")),
-        )
-        self.client.add_event_handler(
-            self.execute_param,
-            events.NewMessage(pattern=re.compile(r"^min_price:(.*)$")),
-        )
-        self.client.add_event_handler(
-            self.execute_param,
-            events.NewMessage(pattern=re.compile(r"^max_price:(.*)$")),
-        )
-        self.client.add_event_handler(
-            self.execute_param,
-            events.NewMessage(pattern=re.compile(r"^min_rooms:(.*)$")),
-        )
-        self.client.add_event_handler(
-            self.execute_param,
-            events.NewMessage(pattern=re.compile(r"^max_rooms:(.*)$")),
-        )
-        self.client.add_event_handler(
-            self.execute_param,
-            events.NewMessage(pattern=re.compile(r"^min_total_area:(.*)$")),
-        )
-        self.client.add_event_handler(
-            self.execute_param,
-            events.NewMessage(pattern=re.compile(r"^max_total_area:(.*)$")),
-        )
-        self.client.add_event_handler(
-            self.execute_param,
-            events.CallbackQuery(data=re.compile(r"^balcony:(.*)$")),
-        )
-        self.client.add_event_handler(
-            self.execute_param,
-            events.CallbackQuery(data=re.compile(r"^renovated:(.*)$")),
-        )
-        self.client.add_event_handler(
-            self.execute_param,
-            events.NewMessage(pattern=re.compile(r"^min_deposit:(.*)$")),
-        )
-        self.client.add_event_handler(
-            self.execute_param,
-            events.NewMessage(pattern=re.compile(r"^max_deposit:(.*)$")),
-        )
-        self.client.add_event_handler(
-            self.execute_param,
-            events.NewMessage(pattern=re.compile(r"^floor:(.*)$")),
-        )
-        self.client.add_event_handler(
-            self.execute_param,
-            events.CallbackQuery(data=re.compile(r"^is_active:(.*)$")),
-        )
-        self.client.add_event_handler(
-            self.execute_total_floors,
-            events.NewMessage(pattern=re.compile(r"^total_floors:(.*)$")),
-        )
-        self.client.add_event_handler(
-            self.execute_confirmation,
-            events.CallbackQuery(data=re.compile(r"^property_filter_confirmation:(.*)$")),
-        )
+    def register_handlers(self, router: UpdateRouter):
+        router.add_command("/new_filter", self.execute_start)
+        router.add_message("name:", self.execute_param)
+        router.add_message("city:", self.execute_param)
+        router.add_message("area:", self.execute_param)
+        router.add_message("min_price:", self.execute_param)
+        router.add_message("max_price:", self.execute_param)
+        router.add_message("min_rooms:", self.execute_param)
+        router.add_message("max_rooms:", self.execute_param)
+        router.add_message("min_total_area:", self.execute_param)
+        router.add_message("max_total_area:", self.execute_param)
+        router.add_message("min_deposit:", self.execute_param)
+        router.add_message("max_deposit:", self.execute_param)
+        router.add_message("floor:", self.execute_param)
+        router.add_callback("property_type:", self.execute_param)
+        router.add_callback("deal_type:", self.execute_param)
+        router.add_callback("balcony:", self.execute_param)
+        router.add_callback("renovated:", self.execute_param)
+        router.add_callback("is_active:", self.execute_param)
+        router.add_message("total_floors:", self.execute_total_floors)
+        router.add_callback("property_filter_confirmation:", self.execute_confirmation)
 
     async def execute_start(self, event):
         user_id = event.sender_id
-        logger.info(f"User {user_id} started new filter process")
+        logger.info("User %s started new filter process", user_id)
         state_machine = get_state_machine()
 
         if not state_machine.is_valid_transition(user_id, "NEUTRAL"):
@@ -136,7 +66,7 @@ class NewPropertyFilterHandler:
         except Exception:
             text = event.data.decode().split(':')[1].strip()
 
-        logger.info(f"on state text: {text}")
+        logger.info("on state text: %s", text)
         if text == "-":
             value = None
         else:
@@ -147,16 +77,16 @@ class NewPropertyFilterHandler:
                     await event.respond("Неправильный ввод, требуется число, попробуйте снова")
                     await send_current_state_message(user_id, self.client)
                     return
-                logger.info(f"int value: {value}")
+                logger.info("int value: %s", value)
             elif state_machine.is_state_bool(user_id):
                 value = bool(text.lower() == "true")
-                logger.info(f"bool value: {value}")
+                logger.info("bool value: %s", value)
             elif state_machine.is_state_list(user_id):
                 value = text
-                logger.info(f"list value: {value}")
+                logger.info("list value: %s", value)
             else:
                 value = str(text)
-                logger.info(f"str value: {value}")
+                logger.info("str value: %s", value)
 
         state = state_machine.get_property_state(user_id)
         state_machine.save_filter_info(user_id, state, value)
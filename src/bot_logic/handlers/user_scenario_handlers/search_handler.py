@@ -2,19 +2,13 @@ from telethon import TelegramClient
 from telethon.events import NewMessage
 from telethon import TelegramClient, events, Button
 import logging
-import os
 import re
 
+from src.bot_logic.bot_metrics import instrumented
 from src.bot_logic.utils import go_to_neutral_state, send_property_info, get_user_link
 from src.bot_logic.database_service_client import get_database_service_client
+from src.bot_logic.router import UpdateRouter
 
-LOG_FILE = os.path.join("logs", "bot.log")
-
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    filename=LOG_FILE,
-)
 logger = logging.getLogger(__name__)
 
 class SearchCommandHandler:
@@ -41,22 +35,28 @@ class SearchCommandHandler:
         except Exception as e:
             await self.client.send_message(event.chat_id, "Произошла ошибка, попробуйте еще раз.")
             await go_to_neutral_state(event.chat_id, self.client)
-            logger.exception(f"Delete filters from database error: {e}")
+            logger.exception("Delete filters from database error: %s", e)
 
+    # Вызывается и маршрутом search:, и из execute_reset
+    @instrumented
     async def execute_announcement(self, event):
         user_id = event.chat_id
         filter_id = int(event.data.decode().split(':')[1].strip())
 
         try:
             database_client = get_database_service_client()
-            property_id = await database_client.get_next_announcement(filter_id)
-            database_client.increase_statistics(property_id, "views")
+            property_id = await database_client.get_next_announcement(filter_id, user_id)
 
             if not property_id:
-                await self.client.send_message(event.chat_id, "Не найдено объявлений подходящих под параметры")
-                await go_to_neutral_state(event.chat_id, self.client)
+                buttons = [
+                    [Button.inline("Смотреть заново 🔄", f"search_reset:{filter_id}")],
+                    [Button.inline("В меню", "/start")]
+                ]
+                await self.client.send_message(event.chat_id, "Не найдено новых объявлений подходящих под параметры", buttons=buttons)
                 return
 
+            await database_client.increase_statistics(property_id, "views")
+
             message = " . "
 
             buttons = [ 
@@ -70,7 +70,22 @@ class SearchCommandHandler:
         except Exception as e:
             await self.client.send_message(event.chat_id, "Произошла ошибка, попробуйте еще раз.")
             await go_to_neutral_state(event.chat_id, self.client)
-            logger.exception(f"Delete filters from database error: {e}")
+            logger.exception("Delete filters from database error: %s", e)
+
+    async def execute_reset(self, event):
+        user_id = event.chat_id
+        filter_id = int(event.data.decode().split(':')[1].strip())
+
+        try:
+            database_client = get_database_service_client()
+            await database_client.reset_search_feed(user_id, filter_id)
+        except Exception as e:
+            await self.client.send_message(event.chat_id, "Произошла ошибка, попробуйте еще раз.")
+            await go_to_neutral_state(event.chat_id, self.client)
+            logger.exception("Reset search feed error: %s", e)
+            return
+
+        await self.execute_announcement(event)
 
     async def execute_like(self, event):
         user_id = event.chat_id
@@ -95,7 +110,7 @@ class SearchCommandHandler:
                 [Button.inline("получить описание объявления", f"ad_description:{announcement_id}:{user_link}")]
             ]
 
-            logger.info(f"sending notification contact: {announcement_author}")
+            logger.info("sending notification contact: %s", announcement_author)
             await self.client.send_message(announcement_author, message=rieltor_message, buttons=rieltor_buttons)
 
             user_message = "Уведомление отправлено, с вами свяжутся в ближайшее время!"
@@ -111,7 +126,7 @@ class SearchCommandHandler:
         except Exception as e:
             await self.client.send_message(event.chat_id, "Произошла ошибка, попробуйте еще раз.")
             await go_to_neutral_state(event.chat_id, self.client)
-            logger.exception(f"Like error: {e}")
+            logger.exception("Like error: %s", e)
 
     async def execute_add_to_favorites(self, event):
         user_id = event.chat_id
@@ -132,22 +147,10 @@ class SearchCommandHandler:
         except Exception as e:
             await self.client.send_message(event.chat_id, "Произошла ошибка, попробуйте еще раз.")
             await go_to_neutral_state(event.chat_id, self.client)
-            logger.exception(f"Add to favorites error: {e}")
-
-    def register_handlers(self):
-        self.client.add_event_handler(
-            self.execute_choice,
-            events.NewMessage(pattern="/search"),
-        )
-        self.client.add_event_handler(
-            self.execute_choice,
-            events.CallbackQuery(data="/search"),
-        )
-        self.client.add_event_handler(
-            self.execute_announcement,
-            events.CallbackQuery(data=re.compile(r"^search:(.*)$")),
-        )
-        self.client.add_event_handler(
-            self.execute_like,
-            events.CallbackQuery(data=re.compile(r"^like:(.*)$")),
-        )
\ No newline at end of file
+            logger.exception("Add to favorites error: %s", e)
+
+    def register_handlers(self, router: UpdateRouter):
+        router.add_command("/search", self.execute_choice)
+        router.add_callback("search:", self.execute_announcement)
+        router.add_callback("search_reset:", self.execute_reset)
+        router.add_callback("like:", self.execute_like)
\ No newline at end of file
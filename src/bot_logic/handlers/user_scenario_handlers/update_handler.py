@@ -1,6 +1,5 @@
 import logging
 import re
-import os
 
 from telethon import TelegramClient, events, Button
 
@@ -8,110 +7,36 @@ from src.bot_logic.state_machine import get_state_machine
 from src.bot_logic.utils import go_to_neutral_state, send_filter_info
 from src.bot_logic.database_service_client import get_database_service_client
 from src.bot_logic.messages import MESSAGES
+from src.bot_logic.router import UpdateRouter
 
-LOG_FILE = os.path.join("logs", "update_handler.log")
-
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    filename=LOG_FILE,
-)
 logger = logging.getLogger(__name__)
 
 class UpdateCommandHandler:
     def __init__(self, client: TelegramClient):
         self.client = client
 
-    def register_handlers(self):
-        self.client.add_event_handler(
-            self.execute_start,
-            events.NewMessage(pattern="/update_filter"),
-        )
-        self.client.add_event_handler(
-            self.execute_start,
-            events.CallbackQuery(data="/update_filter"),
-        )
-        self.client.add_event_handler(
-            self.execute_choice_param,
-            events.CallbackQuery(data=re.compile(r"^update:(.*)$")),
-        )
-        self.client.add_event_handler(
-            self.execute_param_update,
-            events.CallbackQuery(data=re.compile(r"^update_filter_choice:(.*)$")),
-        )
-        # ------------------
-        self.client.add_event_handler(
-            self.execute_param_change,
-            events.NewMessage(pattern=re.compile(r"^upd_name:(.*)$")),
-        )
-        self.client.add_event_handler(
-            self.execute_param_change,
-            events.CallbackQuery(data=re.compile(r"^upd_property_type:(.*)$")),
-        )
-        self.client.add_event_handler(
-            self.execute_param_change,
-            events.CallbackQuery(data=re.compile(r"^upd_deal_type:(.*)$")),
-        )
-        self.client.add_event_handler(
-            self.execute_param_change,
-            events.NewMessage(pattern=re.compile(r"^upd_city:(.*)$")),
-        )
-        self.client.add_event_handler(
-            self.execute_param_change,
-            events.NewMessage(pattern=re.compile(r"^upd_areas:(.*)$")),
-        )
-        self.client.add_event_handler(
-            self.execute_param_change,
-            events.NewMessage(pattern=re.compile(r"^upd_min_price:(.*)$")),
-        )
-        self.client.add_event_handler(
-            self.execute_param_change,
-            events.NewMessage(pattern=re.compile(r"^upd_max_price:(.*)$")),
-        )
-        self.client.add_event_handler(
-            self.execute_param_change,
-            events.NewMessage(pattern=re.compile(r"^upd_min_rooms:(.*)$")),
-        )
-        self.client.add_event_handler(
-            self.execute_param_change,
-            events.NewMessage(pattern=re.compile(r"^upd_max_rooms:(.*)$")),
-        )
-        self.client.add_event_handler(
-            self.execute_param_change,
-            events.NewMessage(pattern=re.compile(r"^upd_min_total_area:(.*)$")),
-        )
-        self.client.add_event_handler(
-            self.execute_param_change,
-            events.NewMessage(pattern=re.compile(r"^upd_max_total_area:(.*)$")),
-        )
-        self.client.add_event_handler(
-            self.execute_param_change,
-            events.CallbackQuery(data=re.compile(r"^upd_balcony:(.*)$")),
-        )
-        self.client.add_event_handler(
-            self.execute_param_change,
-            events.CallbackQuery(data=re.compile(r"^upd_renovated:(.*)$")),
-        )
-        self.client.add_event_handler(
-            self.execute_param_change,
-            events.NewMessage(pattern=re.compile(r"^upd_min_deposit:(.*)$")),
-        )
-        self.client.add_event_handler(
-            self.execute_param_change,
-            events.NewMessage(pattern=re.compile(r"^upd_max_deposit:(.*)$")),
-        )
-        self.client.add_event_handler(
-            self.execute_param_change,
-            events.NewMessage(pattern=re.compile(r"^upd_floor:(.*)$")),
-        )
-        self.client.add_event_handler(
-            self.execute_param_change,
-            events.CallbackQuery(data=re.compile(r"^upd_is_active:(.*)$")),
-        )
-        self.client.add_event_handler(
-            self.execute_param_change,
-            events.NewMessage(pattern=re.compile(r"^upd_total_floors:(.*)$")),
-        )
+    def register_handlers(self, router: UpdateRouter):
+        router.add_command("/update_filter", self.execute_start)
+        router.add_callback("update:", self.execute_choice_param)
+        router.add_callback("update_filter_choice:", self.execute_param_update)
+        router.add_message("upd_name:", self.execute_param_change)
+        router.add_message("upd_city:", self.execute_param_change)
+        router.add_message("upd_areas:", self.execute_param_change)
+        router.add_message("upd_min_price:", self.execute_param_change)
+        router.add_message("upd_max_price:", self.execute_param_change)
+        router.add_message("upd_min_rooms:", self.execute_param_change)
+        router.add_message("upd_max_rooms:", self.execute_param_change)
+        router.add_message("upd_min_total_area:", self.execute_param_change)
+        router.add_message("upd_max_total_area:", self.execute_param_change)
+        router.add_message("upd_min_deposit:", self.execute_param_change)
+        router.add_message("upd_max_deposit:", self.execute_param_change)
+        router.add_message("upd_floor:", self.execute_param_change)
+        router.add_message("upd_total_floors:", self.execute_param_change)
+        router.add_callback("upd_property_type:", self.execute_param_change)
+        router.add_callback("upd_deal_type:", self.execute_param_change)
+        router.add_callback("upd_balcony:", self.execute_param_change)
+        router.add_callback("upd_renovated:", self.execute_param_change)
+        router.add_callback("upd_is_active:", self.execute_param_change)
 
     async def execute_start(self, event):
         user_id = event.chat_id
@@ -132,7 +57,7 @@ class UpdateCommandHandler:
             await self.client.send_message(event.chat_id, message, buttons=buttons)
         except Exception as e:
             await self.client.send_message(event.chat_id, "Произошла ошибка, попробуйте еще раз.")
-            logger.exception(f"Update filters from database error: {e}")
+            logger.exception("Update filters from database error: %s", e)
 
     async def execute_choice_param(self, event):
         user_id = event.sender_id
@@ -5,10 +5,16 @@ from telethon import TelegramClient, events
 from fastapi import Request
 import uvicorn
 from dotenv import load_dotenv
-import os
 import requests
 
 from src.settings import TGBotSettings
+from src.logging_config import setup_logging
+from src.bot_logic.bot_metrics import install_error_counter, start_bot_metrics_server
+from src.bot_logic.database_service_client import close_database_service_clients
+from src.bot_logic.router import UpdateRouter
+from src.bot_logic.state_machine import get_state_machine
+from src.bot_logic.state_storage import create_state_storage
+from src.bot_logic.telegram_client import InstrumentedTelegramClient
 
 from src.bot_logic.handlers.user_scenario_handlers.property_filters import NewPropertyFilterHandler
 from src.bot_logic.handlers.user_scenario_handlers.help_handler import HelpCommandHandler
@@ -35,6 +41,7 @@ from src.bot_logic.handlers.admin_scenario_handlers.delete_property_handler impo
 from src.bot_logic.handlers.admin_scenario_handlers.sold_rented_free_property_handler import SoldRentedFreePropertyHandler
 from src.bot_logic.handlers.admin_scenario_handlers.get_property_statistics_handler import GetPropertyStatisticsHandler
 from src.bot_logic.handlers.admin_scenario_handlers.get_statistics_handler import GetStatisticsHandler
+from src.bot_logic.handlers.admin_scenario_handlers.perf_handler import PerfCommandHandler
 
 
 
@@ -43,93 +50,110 @@ from src.bot_logic.handlers.admin_scenario_handlers.get_statistics_handler impor
 
 load_dotenv()
 
-LOG_FILE = os.path.join("logs", "bot.log")
-
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    filename=LOG_FILE,
-)
+setup_logging("bot")
+install_error_counter()
 logger = logging.getLogger(__name__)
 
 settings = TGBotSettings()
 
-client = TelegramClient("bot_session", settings.api_id, settings.api_hash).start(
+client = InstrumentedTelegramClient("bot_session", settings.api_id, settings.api_hash).start(
     bot_token=settings.token,
 )
 
-async def register_handlers(client: TelegramClient):
+async def register_handlers(client: TelegramClient) -> UpdateRouter:
+    router = UpdateRouter()
+
     new_property_filter_handler = NewPropertyFilterHandler(client)
-    new_property_filter_handler.register_handlers()
+    new_property_filter_handler.register_handlers(router)
 
     start_handler = StartCommandHandler(client)
-    start_handler.register_handlers()
+    start_handler.register_handlers(router)
 
     help_handler = HelpCommandHandler(client)
-    help_handler.register_handlers()
+    help_handler.register_handlers(router)
 
     list_handler = ListCommandHandler(client)
-    list_handler.register_handlers()
+    list_handler.register_handlers(router)
 
     search_handler = SearchCommandHandler(client)
-    search_handler.register_handlers()
+    search_handler.register_handlers(router)
 
     delete_handler = DeleteCommandHandler(client)
-    delete_handler.register_handlers()
+    delete_handler.register_handlers(router)
 
     ad_description_handler = AdDescriptionCommandHandler(client)
-    ad_description_handler.register_handlers()
+    ad_description_handler.register_handlers(router)
 
     register_admin_handler = RegisterAdminCommandHandler(client)
-    register_admin_handler.register_handlers()
+    register_admin_handler.register_handlers(router)
 
     add_property_handler = AddPropertyHandler(client)
-    add_property_handler.register_handlers()
+    add_property_handler.register_handlers(router)
 
     add_property_file_handler = AddPropertyFileHandler(client)
-    add_property_file_handler.register_handlers()
+    add_property_file_handler.register_handlers(router)
 
     update_handler = UpdateCommandHandler(client)
-    update_handler.register_handlers()
+    update_handler.register_handlers(router)
 
     show_properties_handler = ShowPropertiesHandler(client)
-    show_properties_handler.register_handlers()
+    show_properties_handler.register_handlers(router)
 
     unregister_admin_handler = UnregisterAdminCommandHandler(client)
-    unregister_admin_handler.register_handlers()
+    unregister_admin_handler.register_handlers(router)
 
     delete_property_handler = DeletePropertyHandler(client)
-    delete_property_handler.register_handlers()
+    delete_property_handler.register_handlers(router)
 
     change_property_status_handler = SoldRentedFreePropertyHandler(client)
-    change_property_status_handler.register_handlers()
+    change_property_status_handler.register_handlers(router)
 
     get_property_statistics = GetPropertyStatisticsHandler(client)
-    get_property_statistics.register_handlers()
+    get_property_statistics.register_handlers(router)
 
     get_statistics = GetStatisticsHandler(client)
-    get_statistics.register_handlers()
+    get_statistics.register_handlers(router)
+
+    perf_handler = PerfCommandHandler(client)
+    perf_handler.register_handlers(router)
 
     favorites_list = FavoritesListHandler(client)
-    favorites_list.register_handlers()
+    favorites_list.register_handlers(router)
 
     delete_from_favorites = DeleteFromFavoritesCommandHandler(client)
-    delete_from_favorites.register_handlers()
+    delete_from_favorites.register_handlers(router)
 
     to_favorites = ToFavoritesCommandHandler(client)
-    to_favorites.register_handlers()
+    to_favorites.register_handlers(router)
 
     default_handler = DefaultHandler(client)
-    default_handler.register_handlers()
+    default_handler.register_handlers(router)
+
+    # Один обработчик Telethon на тип события вместо десятков regex фильтров
+    router.attach(client)
+    return router
 
 async def main() -> None:
+    # Диалоги переживают перезапуск: состояние читается и пишется через STATE_STORAGE
+    state_machine = get_state_machine()
+    state_machine.use_storage(create_state_storage())
+    state_machine.start_flusher()
+
     await register_handlers(client)
-    while True:
-        try:
-            await asyncio.sleep(60)
-        except Exception as e:
-            logger.exception(f"Error in main loop: {e}")
-            await asyncio.sleep(60)
+    metrics_server = await start_bot_metrics_server()
+    try:
+        while True:
+            try:
+                await asyncio.sleep(60)
+            except Exception as e:
+                logger.exception("Error in main loop: %s", e)
+                await asyncio.sleep(60)
+    finally:
+        if metrics_server is not None:
+            metrics_server.close()
+        await state_machine.stop_flusher()
+        await state_machine.storage.close()
+        await close_database_service_clients()
 
 logger.info("Run the event loop to start receiving messages")
 
@@ -0,0 +1,251 @@
+import asyncio
+import logging
+import os
+import sqlite3
+from typing import Dict, List, Optional, Tuple
+
+from telethon import TelegramClient, utils
+from telethon.errors import FileReferenceExpiredError, MediaEmptyError
+from telethon.tl.types import InputPhoto
+
+from src.bot_logic.database_service_client import get_database_service_client
+
+logger = logging.getLogger(__name__)
+
+MEDIA_CACHE_PATH = os.getenv("MEDIA_CACHE_PATH", os.path.join("bot_data", "media_cache.sqlite3"))
+
+PhotoKey = Tuple[int, int]
+
+# Размеры, которые отдает database_service: миниатюры для списков, card для карточки объявления
+PHOTO_THUMB = "thumb"
+PHOTO_CARD = "card"
+PHOTO_ORIGINAL = "original"
+
+
+class MediaCache:
+    """Постоянный кэш ссылок Telegram на уже загруженные фотографии объявлений.
+
+    Ключ - (property_id, photo_num) и размер фотографии, значение - InputPhoto,
+    полученный из отправленного сообщения. Хранится в SQLite, поэтому переживает перезапуск
+    бота и общий для бота и сервера уведомлений. Запросы выполняются в отдельном потоке,
+    чтобы не блокировать цикл событий.
+    """
+
+    def __init__(self, path: str = MEDIA_CACHE_PATH):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self._migrate_photos()
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS photos (
+                property_id INTEGER NOT NULL,
+                photo_num INTEGER NOT NULL,
+                size TEXT NOT NULL DEFAULT 'original',
+                photo_id INTEGER NOT NULL,
+                access_hash INTEGER NOT NULL,
+                file_reference BLOB NOT NULL,
+                PRIMARY KEY (property_id, photo_num, size)
+            )
+        """)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS photos_count (
+                property_id INTEGER PRIMARY KEY,
+                count INTEGER NOT NULL
+            )
+        """)
+        self.lock = asyncio.Lock()
+
+    def _migrate_photos(self):
+        # Кэш до появления размеров хранил только исходные фотографии
+        columns = [row[1] for row in self.conn.execute("PRAGMA table_info(photos)")]
+        if not columns or "size" in columns:
+            return
+        with self.conn:
+            self.conn.execute("BEGIN")
+            self.conn.execute("ALTER TABLE photos RENAME TO photos_unsized")
+            self.conn.execute("""
+                CREATE TABLE photos (
+                    property_id INTEGER NOT NULL,
+                    photo_num INTEGER NOT NULL,
+                    size TEXT NOT NULL DEFAULT 'original',
+                    photo_id INTEGER NOT NULL,
+                    access_hash INTEGER NOT NULL,
+                    file_reference BLOB NOT NULL,
+                    PRIMARY KEY (property_id, photo_num, size)
+                )
+            """)
+            self.conn.execute("""
+                INSERT INTO photos (property_id, photo_num, photo_id, access_hash, file_reference)
+                SELECT property_id, photo_num, photo_id, access_hash, file_reference FROM photos_unsized
+            """)
+            self.conn.execute("DROP TABLE photos_unsized")
+        logger.info("Media cache migrated to sized photos")
+
+    def close(self):
+        self.conn.close()
+
+    def _get_many(self, keys: List[PhotoKey], size: str) -> Dict[PhotoKey, InputPhoto]:
+        result = {}
+        for property_id in {key[0] for key in keys}:
+            rows = self.conn.execute(
+                "SELECT photo_num, photo_id, access_hash, file_reference FROM photos WHERE property_id = ? AND size = ?",
+                (property_id, size),
+            )
+            for photo_num, photo_id, access_hash, file_reference in rows:
+                key = (property_id, photo_num)
+                result[key] = InputPhoto(id=photo_id, access_hash=access_hash, file_reference=file_reference)
+        return {key: result[key] for key in keys if key in result}
+
+    def _put_many(self, photos: Dict[PhotoKey, InputPhoto], size: str):
+        # Одна транзакция на отправленный альбом, а не коммит на каждую фотографию
+        with self.conn:
+            self.conn.execute("BEGIN")
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO photos VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (key[0], key[1], size, photo.id, photo.access_hash, photo.file_reference)
+                    for key, photo in photos.items()
+                ],
+            )
+
+    def _get_photos_count(self, property_id: int) -> Optional[int]:
+        row = self.conn.execute("SELECT count FROM photos_count WHERE property_id = ?", (property_id,)).fetchone()
+        return row[0] if row else None
+
+    def _set_photos_count(self, property_id: int, count: int):
+        self.conn.execute("INSERT OR REPLACE INTO photos_count VALUES (?, ?)", (property_id, count))
+
+    def _invalidate(self, property_ids: List[int], photo_num: Optional[int]):
+        with self.conn:
+            self.conn.execute("BEGIN")
+            for property_id in property_ids:
+                if photo_num is None:
+                    self.conn.execute("DELETE FROM photos WHERE property_id = ?", (property_id,))
+                else:
+                    self.conn.execute(
+                        "DELETE FROM photos WHERE property_id = ? AND photo_num = ?", (property_id, photo_num)
+                    )
+                self.conn.execute("DELETE FROM photos_count WHERE property_id = ?", (property_id,))
+
+    async def get_many(self, keys: List[PhotoKey], size: str = PHOTO_ORIGINAL) -> Dict[PhotoKey, InputPhoto]:
+        async with self.lock:
+            return await asyncio.to_thread(self._get_many, keys, size)
+
+    async def put_many(self, photos: Dict[PhotoKey, InputPhoto], size: str = PHOTO_ORIGINAL):
+        if not photos:
+            return
+        async with self.lock:
+            await asyncio.to_thread(self._put_many, photos, size)
+
+    async def put(self, key: PhotoKey, photo: InputPhoto, size: str = PHOTO_ORIGINAL):
+        await self.put_many({key: photo}, size)
+
+    async def get_photos_count(self, property_id: int) -> Optional[int]:
+        async with self.lock:
+            return await asyncio.to_thread(self._get_photos_count, property_id)
+
+    async def set_photos_count(self, property_id: int, count: int):
+        async with self.lock:
+            await asyncio.to_thread(self._set_photos_count, property_id, count)
+
+    async def invalidate(self, property_id: int, photo_num: Optional[int] = None):
+        await self.invalidate_many([property_id], photo_num)
+
+    async def invalidate_many(self, property_ids: List[int], photo_num: Optional[int] = None):
+        async with self.lock:
+            await asyncio.to_thread(self._invalidate, list(property_ids), photo_num)
+        logger.info("Media cache invalidated for properties %s, photo %s", property_ids, photo_num)
+
+
+_media_cache: Optional[MediaCache] = None
+
+
+def get_media_cache() -> MediaCache:
+    global _media_cache
+    if _media_cache is None:
+        _media_cache = MediaCache()
+    return _media_cache
+
+
+async def _upload_photo(client: TelegramClient, key: PhotoKey, size: str):
+    database_service = get_database_service_client()
+    photo_bytes = await database_service.get_property_photo(key[0], key[1], size=size)
+    if photo_bytes is None:
+        return None
+    return await client.upload_file(file=photo_bytes, file_name="photo.jpg")
+
+
+async def send_cached_photos(client: TelegramClient, user_id: int, keys: List[PhotoKey],
+                             size: str = PHOTO_ORIGINAL) -> int:
+    """Отправляет фотографии, по возможности без скачивания и повторной загрузки.
+
+    Списки объявлений отправляют миниатюры (PHOTO_THUMB) - килобайты вместо мегабайт.
+    Возвращает количество отправленных фотографий.
+    """
+    cache = get_media_cache()
+
+    for attempt in range(2):
+        cached = await cache.get_many(keys, size) if attempt == 0 else {}
+
+        files = []
+        sent_keys = []
+        for key in keys:
+            media = cached.get(key)
+            if media is None:
+                media = await _upload_photo(client, key, size)
+                if media is None:
+                    logger.error("Failed to get photo %s for property %s", key[1], key[0])
+                    continue
+            files.append(media)
+            sent_keys.append(key)
+
+        if not files:
+            return 0
+
+        try:
+            messages = await client.send_file(user_id, files)
+        except (FileReferenceExpiredError, MediaEmptyError) as e:
+            # Ссылка устарела - сбрасываем кэш этих объявлений и загружаем заново
+            logger.warning("Cached media rejected for user %s: %s", user_id, e)
+            await cache.invalidate_many({key[0] for key in cached})
+            continue
+
+        if not isinstance(messages, list):
+            messages = [messages]
+        await cache.put_many({
+            key: utils.get_input_photo(message.photo)
+            for key, message in zip(sent_keys, messages)
+            if key not in cached and message is not None and message.photo
+        }, size)
+
+        logger.info("Sent %s photos to %s, %s from cache", len(files), user_id, len(cached))
+        return len(files)
+
+    return 0
+
+
+async def send_property_photos(client: TelegramClient, user_id: int, property_id: int, count: Optional[int] = None,
+                                size: str = PHOTO_CARD) -> int:
+    cache = get_media_cache()
+    cached_count = await cache.get_photos_count(property_id)
+    if count is not None:
+        # Количество фотографий изменилось - старые ссылки могли указывать не на те фото
+        if cached_count is not None and cached_count != count:
+            await cache.invalidate(property_id)
+        if count and cached_count != count:
+            await cache.set_photos_count(property_id, count)
+    elif cached_count is not None:
+        count = cached_count
+    else:
+        database_service = get_database_service_client()
+        count = await database_service.get_property_photos_count(property_id)
+        if count:
+            await cache.set_photos_count(property_id, count)
+
+    if not count:
+        return 0
+
+    return await send_cached_photos(client, user_id, [(property_id, photo_num) for photo_num in range(count)], size)
@@ -0,0 +1,246 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Dict, Iterable, List, Optional, Set
+
+from telethon import TelegramClient, Button
+from telethon.errors import FileReferenceExpiredError, FloodWaitError, MediaEmptyError
+
+from src.bot_logic.database_service_client import get_database_service_client
+from src.bot_logic.media_cache import PHOTO_CARD, get_media_cache, send_property_photos
+from src.bot_logic.utils import format_property_message
+
+logger = logging.getLogger(__name__)
+
+# Telegram ограничивает бота примерно 30 сообщениями в секунду на все чаты
+NOTIFY_RATE = float(os.getenv("NOTIFY_RATE", "25"))
+NOTIFY_CONCURRENCY = int(os.getenv("NOTIFY_CONCURRENCY", "8"))
+NOTIFY_MAX_ATTEMPTS = int(os.getenv("NOTIFY_MAX_ATTEMPTS", "3"))
+NOTIFY_PROGRESS_INTERVAL = float(os.getenv("NOTIFY_PROGRESS_INTERVAL", "5"))
+
+NEW_PROPERTY_MESSAGE = "Посмотрите на новое объявление, подъодящее под ваши фильтры!"
+
+
+class RateLimiter:
+    """Общий на все рассылки интервал между запросами к Telegram.
+
+    FloodWaitError от любого получателя ставит на паузу все рассылки сразу.
+    """
+
+    def __init__(self, rate: float = NOTIFY_RATE):
+        self.interval = 1 / rate
+        self._next = 0.0
+
+    async def acquire(self):
+        now = time.monotonic()
+        wait = self._next - now
+        self._next = max(now, self._next) + self.interval
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def pause(self, seconds: float):
+        self._next = max(self._next, time.monotonic() + seconds)
+
+
+_notification_limiter: Optional[RateLimiter] = None
+
+
+def get_notification_limiter() -> RateLimiter:
+    global _notification_limiter
+    if _notification_limiter is None:
+        _notification_limiter = RateLimiter()
+    return _notification_limiter
+
+
+def new_property_buttons(property_id: int):
+    return [
+        [Button.inline("Связаться с риелтором 🤝", f"like:-:{property_id}")],
+        [Button.inline("В избранное ❤️", f"to_favorites:{property_id}")],
+        [Button.inline("В меню", "/start")]
+    ]
+
+
+class PropertyFanout:
+    """Рассылка нового объявления всем, чьи фильтры под него подходят.
+
+    Карточка и фотографии готовятся один раз: первый получатель загружает фото,
+    остальным уходят уже сохраненные в Telegram ссылки. Получатели
+    обрабатываются пулом воркеров с общим ограничением частоты, просмотры
+    записываются одним запросом в конце.
+    """
+
+    def __init__(self, client: TelegramClient, property_id: int, recipients: Iterable[int],
+                 admin_id: Optional[int] = None, limiter: Optional[RateLimiter] = None,
+                 concurrency: int = NOTIFY_CONCURRENCY):
+        self.client = client
+        self.property_id = property_id
+        # Один пользователь может попасть в рассылку несколькими фильтрами
+        self.recipients: List[int] = list(dict.fromkeys(recipients))
+        self.admin_id = admin_id
+        self.limiter = limiter or get_notification_limiter()
+        self.concurrency = concurrency
+
+        self.text = ""
+        self.buttons = new_property_buttons(property_id)
+        self.photos_count = 0
+        self.media = None
+        self._media_lock = asyncio.Lock()
+
+        self.delivered = 0
+        self.failed = 0
+        self.aborted = False
+        self._progress_message = None
+
+    async def prepare(self) -> bool:
+        database_service = get_database_service_client()
+        card = await database_service.get_property_card(self.property_id)
+        if not card or not card.get("property"):
+            logger.error("Property %s not found for notification", self.property_id)
+            return False
+        self.text = format_property_message(card["property"], NEW_PROPERTY_MESSAGE)
+        self.photos_count = len(card.get("photos", []))
+        return True
+
+    async def _send_photos(self, user_id: int) -> bool:
+        """Возвращает True, если фотографии отправлены или их нет"""
+        if not self.photos_count:
+            return True
+        if self.media is not None:
+            await self.limiter.acquire()
+            try:
+                await self.client.send_file(user_id, self.media)
+                return True
+            except (FileReferenceExpiredError, MediaEmptyError) as e:
+                logger.warning("Shared media for property %s rejected: %s", self.property_id, e)
+                self.media = None
+
+        async with self._media_lock:
+            if self.media is not None:
+                await self.limiter.acquire()
+                await self.client.send_file(user_id, self.media)
+                return True
+            await self.limiter.acquire()
+            sent = await send_property_photos(self.client, user_id, self.property_id, count=self.photos_count, size=PHOTO_CARD)
+            keys = [(self.property_id, photo_num) for photo_num in range(self.photos_count)]
+            cached = await get_media_cache().get_many(keys, PHOTO_CARD)
+            if len(cached) == len(keys):
+                self.media = [cached[key] for key in keys]
+            return sent > 0
+
+    async def _deliver(self, user_id: int) -> bool:
+        photos_sent = False
+        for attempt in range(NOTIFY_MAX_ATTEMPTS):
+            try:
+                if not photos_sent:
+                    photos_sent = await self._send_photos(user_id)
+                    if not photos_sent:
+                        logger.warning("Photos of property %s were not sent to %s", self.property_id, user_id)
+                await self.limiter.acquire()
+                await self.client.send_message(user_id, self.text, buttons=self.buttons)
+                return True
+            except FloodWaitError as e:
+                logger.warning("Flood wait %ss while notifying %s, attempt %s", e.seconds, user_id, attempt + 1)
+                self.limiter.pause(e.seconds)
+            except Exception as e:
+                logger.error("Failed to notify user %s about property %s: %s", user_id, self.property_id, e)
+                return False
+        return False
+
+    async def _worker(self, queue: asyncio.Queue):
+        while True:
+            try:
+                user_id = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            if await self._deliver(user_id):
+                self.delivered += 1
+            else:
+                self.failed += 1
+
+    def _progress_text(self, done: bool = False) -> str:
+        status = "прервана" if self.aborted else "завершена" if done else "идет"
+        return (
+            f"Рассылка объявления {self.property_id} {status}: "
+            f"отправлено {self.delivered} из {len(self.recipients)}, ошибок {self.failed}"
+        )
+
+    async def _report_progress(self, done: bool = False):
+        if self.admin_id is None:
+            return
+        try:
+            await self.limiter.acquire()
+            if self._progress_message is None:
+                self._progress_message = await self.client.send_message(self.admin_id, self._progress_text(done))
+            else:
+                await self.client.edit_message(self.admin_id, self._progress_message, self._progress_text(done))
+        except Exception as e:
+            logger.warning("Failed to report notification progress to %s: %s", self.admin_id, e)
+
+    async def _progress_loop(self):
+        while True:
+            await asyncio.sleep(NOTIFY_PROGRESS_INTERVAL)
+            await self._report_progress()
+
+    async def _run(self):
+        if not await self.prepare():
+            self.aborted = True
+            return
+        await self._report_progress()
+        queue: asyncio.Queue = asyncio.Queue()
+        for user_id in self.recipients:
+            queue.put_nowait(user_id)
+
+        progress = asyncio.create_task(self._progress_loop())
+        try:
+            workers = min(self.concurrency, len(self.recipients))
+            await asyncio.gather(*(self._worker(queue) for _ in range(workers)))
+        finally:
+            progress.cancel()
+
+        if self.delivered:
+            try:
+                database_service = get_database_service_client()
+                await database_service.increase_statistics(self.property_id, "views", self.delivered)
+            except Exception as e:
+                logger.error("Failed to record %s views for property %s: %s", self.delivered, self.property_id, e)
+
+    async def run(self) -> Dict:
+        """Не выбрасывает исключений: задача запускается в фоне, и администратор всегда получает итог"""
+        start = time.perf_counter()
+        if self.recipients:
+            try:
+                await self._run()
+            except Exception as e:
+                self.aborted = True
+                logger.exception("Notification fan-out for property %s failed: %s", self.property_id, e)
+            await self._report_progress(done=True)
+
+        result = {
+            "property_id": self.property_id,
+            "recipients": len(self.recipients),
+            "delivered": self.delivered,
+            "failed": self.failed,
+            "aborted": self.aborted,
+            "seconds": round(time.perf_counter() - start, 3),
+        }
+        logger.info("Notification fan-out finished: %s", result)
+        return result
+
+
+_fanout_tasks: Set[asyncio.Task] = set()
+
+
+def start_property_fanout(client: TelegramClient, property_id: int, users: List[Dict],
+                          admin_id: Optional[int] = None) -> asyncio.Task:
+    """Запускает рассылку в фоне, чтобы не блокировать диалог администратора"""
+    recipients = [user["telegram_id"] for user in users]
+    task = asyncio.create_task(PropertyFanout(client, property_id, recipients, admin_id=admin_id).run())
+    _fanout_tasks.add(task)
+    task.add_done_callback(_fanout_tasks.discard)
+    return task
+
+
+async def wait_property_fanouts():
+    if _fanout_tasks:
+        await asyncio.gather(*list(_fanout_tasks), return_exceptions=True)
@@ -0,0 +1,302 @@
+import asyncio
+import logging
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlencode
+
+import aiohttp
+from telethon import TelegramClient
+
+from src.bot_logic.database_service_client import get_database_service_client
+from src.bot_logic.media_cache import get_media_cache
+from src.bot_logic.notifications import start_property_fanout
+
+logger = logging.getLogger(__name__)
+
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "50"))
+IMPORT_IMAGE_CONCURRENCY = int(os.getenv("IMPORT_IMAGE_CONCURRENCY", "16"))
+IMPORT_IMAGE_TIMEOUT = float(os.getenv("IMPORT_IMAGE_TIMEOUT", "30"))
+IMPORT_PROGRESS_INTERVAL = float(os.getenv("IMPORT_PROGRESS_INTERVAL", "3"))
+MAX_IMAGES_PER_PROPERTY = 10
+
+YANDEX_DISK_DOWNLOAD_URL = "https://cloud-api.yandex.net/v1/disk/public/resources/download?"
+
+
+def get_property_type(pr_type: str):
+    if pr_type == "Квартиры":
+        return "квартира"
+    if pr_type == "Дома, дачи, коттеджи":
+        return "дом"
+    if pr_type == "Комнаты":
+        return "комната"
+    if pr_type == "Земельные участки":
+        return "участок"
+    if pr_type == "Коммерческая недвижимость":
+        return "коммерческая"
+    raise ValueError("Не задан параметр Category")
+
+def get_rooms(rooms: str):
+    if rooms == "Студия":
+        return 1
+    if rooms == "10 и более":
+        return 10
+    if rooms == "Своб. планировка":
+        return 0
+    try:
+        return int(rooms)
+    except:
+        raise ValueError("Неправильно задано кол-во комнат: допускается 1-9, Студия, 10 и более, Своб. планировка")
+
+
+# ----------------- Parsing (worker process) -----------------
+
+def read_feed(file_path: str) -> List[Dict]:
+    """Читает лист объявлений шаблона Авито. Выполняется в отдельном процессе"""
+    import pandas as pd
+
+    xls = pd.ExcelFile(file_path)
+    sheet_name = xls.sheet_names[1]
+    df = pd.read_excel(xls, sheet_name=sheet_name, header=1, skiprows=[2, 3])
+    df.dropna(how='all', inplace=True)
+    # Пустые ячейки - None, чтобы строки можно было передать между процессами и проверить
+    df = df.astype(object).where(pd.notna(df), None)
+    return df.to_dict("records")
+
+
+_import_executor: Optional[ProcessPoolExecutor] = None
+
+
+def get_import_executor() -> ProcessPoolExecutor:
+    global _import_executor
+    if _import_executor is None:
+        _import_executor = ProcessPoolExecutor(max_workers=1)
+    return _import_executor
+
+
+async def parse_feed(file_path: str) -> List[Dict]:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_import_executor(), read_feed, file_path)
+
+
+# ----------------- Validation -----------------
+
+def _cell(row: Dict, key: str, default=None):
+    value = row.get(key)
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return default
+    return value
+
+
+def row_to_payload(row: Dict, user_id: int) -> Tuple[Dict, List[str]]:
+    """Объявление для database_service и ссылки на фотографии. ValueError - строку пропускаем"""
+    payload = {}
+    payload["return_contact"] = str(user_id)
+    payload["property_type"] = get_property_type(_cell(row, "Category", "Квартиры"))
+    payload["deal_type"] = ("продажа" if _cell(row, "OperationType", "Продам") == "Продам" else "аренда")
+    payload["price"] = int(_cell(row, "Price", 10))
+    try:
+        payload["city"] = _cell(row, "Address", "o, Не указано").split(",")[1].strip()
+    except Exception:
+        raise ValueError("не найден город: задайте город вторым в адресе(область, город)")
+    payload["area"] = None
+    payload["street"] = ""
+    payload["house_number"] = ""
+    payload["apartment_numder"] = ""
+    payload["rooms"] = get_rooms(str(_cell(row, "Rooms", "1")))
+    payload["balcony"] = bool(len(str(_cell(row, "BalconyOrLoggiaMulti", ""))) > 0)
+    payload["renovated"] = "Да" if _cell(row, "MarketType", "Вторичка") == "Вторичка" else "Нет"
+    payload["total_area"] = int(float(_cell(row, "Square", "0")))
+    payload["floor"] = int(_cell(row, "Floor", "1"))
+    payload["total_floors"] = int(_cell(row, "Floors", "1"))
+    payload["deposit"] = int(_cell(row, "DepositAmount", "0"))
+    payload["description"] = _cell(row, "Description", "")
+
+    image_urls = [url.strip() for url in str(_cell(row, "ImageUrls", "")).split('|') if url.strip()]
+    if not image_urls:
+        raise ValueError("нет ни одной ссылки в ImageUrls")
+    return payload, image_urls[:MAX_IMAGES_PER_PROPERTY]
+
+
+def validate_batch(rows: List[Dict], user_id: int) -> Tuple[List[Tuple[str, Dict, List[str]]], List[str]]:
+    valid = []
+    errors = []
+    for row in rows:
+        row_id = _cell(row, "Id", "id не найдено")
+        try:
+            payload, image_urls = row_to_payload(row, user_id)
+        except (ValueError, TypeError) as e:
+            errors.append(f"Не удалось обработать объявление с id: {row_id}, {e}")
+            continue
+        valid.append((row_id, payload, image_urls))
+    return valid, errors
+
+
+# ----------------- Images -----------------
+
+class ImageDownloader:
+    """Скачивание фотографий одной общей сессией с ограничением одновременных запросов"""
+
+    def __init__(self, session: aiohttp.ClientSession, concurrency: int = IMPORT_IMAGE_CONCURRENCY):
+        self.session = session
+        self.semaphore = asyncio.Semaphore(concurrency)
+
+    async def _read(self, url: str) -> bytes:
+        async with self.session.get(url) as resp:
+            if resp.status != 200:
+                raise Exception(f"Failed to download image: {resp.status}")
+            return await resp.read()
+
+    async def download(self, image_url: str) -> bytes:
+        async with self.semaphore:
+            url_type = image_url.removeprefix("https://").removeprefix("http://")
+            if url_type.startswith("disk.yandex.ru"):
+                final_url = YANDEX_DISK_DOWNLOAD_URL + urlencode(dict(public_key=image_url))
+                async with self.session.get(final_url) as resp:
+                    download_url = (await resp.json())["href"]
+                return await self._read(download_url)
+            return await self._read(image_url)
+
+    async def download_many(self, image_urls: List[str]) -> List[bytes]:
+        results = await asyncio.gather(*(self.download(url) for url in image_urls), return_exceptions=True)
+        images = []
+        for url, result in zip(image_urls, results):
+            if isinstance(result, Exception):
+                logger.warning("Не удалось скачать %s: %s", url, result)
+            else:
+                images.append(result)
+        return images
+
+
+# ----------------- Pipeline -----------------
+
+class FeedImport:
+    """Загрузка фида объявлений: разбор в отдельном процессе, проверка пачками и вставка
+    пачки одним запросом к /add_properties, параллельное скачивание фотографий
+    и сообщение о ходе загрузки, обновляемое на месте.
+    """
+
+    def __init__(self, client: TelegramClient, user_id: int, batch_size: int = IMPORT_BATCH_SIZE):
+        self.client = client
+        self.user_id = user_id
+        self.batch_size = batch_size
+        self.total = 0
+        self.processed = 0
+        self.imported = 0
+        self.errors: List[str] = []
+        self._progress_message = None
+        self._progress_sent_at = 0.0
+
+    def _progress_text(self, done: bool = False) -> str:
+        status = "завершена" if done else "идет"
+        return (
+            f"Загрузка файла {status}: обработано {self.processed} из {self.total}, "
+            f"загружено {self.imported}, ошибок {len(self.errors)}"
+        )
+
+    async def _report_progress(self, done: bool = False):
+        now = time.monotonic()
+        if not done and now - self._progress_sent_at < IMPORT_PROGRESS_INTERVAL:
+            return
+        self._progress_sent_at = now
+        try:
+            if self._progress_message is None:
+                self._progress_message = await self.client.send_message(self.user_id, self._progress_text(done))
+            else:
+                await self.client.edit_message(self.user_id, self._progress_message, self._progress_text(done))
+        except Exception as e:
+            logger.warning("Failed to report import progress to %s: %s", self.user_id, e)
+
+    async def _rollback(self, property_id: int):
+        # database_service может быть недоступен: ошибка отката не должна прерывать загрузку файла
+        try:
+            await get_database_service_client().delete_property(property_id)
+            await get_media_cache().invalidate(property_id)
+        except Exception as e:
+            logger.error("Failed to roll back property %s: %s", property_id, e)
+
+    async def _finish_listing(self, row_id, inserted: Dict, downloads: asyncio.Task):
+        property_id = inserted.get("property_id")
+        if property_id is None:
+            downloads.cancel()
+            logger.info("Property %s rejected by database service: %s", row_id, inserted.get('error'))
+            self.errors.append(f"Не удалось обработать объявление с id: {row_id}")
+            return
+        try:
+            images = await downloads
+            if not images:
+                raise ValueError("не удалось скачать ни одной фотографии")
+            await get_database_service_client().upload_images(property_id, images)
+        except Exception as e:
+            logger.info("Error loading property by file: %s", e)
+            await self._rollback(property_id)
+            self.errors.append(f"Не удалось обработать объявление с id: {row_id}")
+            return
+
+        self.imported += 1
+        if inserted.get("users_id"):
+            start_property_fanout(self.client, property_id, inserted["users_id"], admin_id=self.user_id)
+
+    async def _import_batch(self, downloader: ImageDownloader, valid: List[Tuple[str, Dict, List[str]]]):
+        if not valid:
+            return
+        # Фотографии качаются, пока пачка объявлений вставляется в базу
+        downloads = [asyncio.create_task(downloader.download_many(image_urls)) for _, _, image_urls in valid]
+        try:
+            respond = await get_database_service_client().new_properties(
+                self.user_id, [payload for _, payload, _ in valid]
+            )
+            results = respond["results"]
+        except Exception as e:
+            logger.error("Failed to insert batch of %s properties: %s", len(valid), e)
+            for task in downloads:
+                task.cancel()
+            self.errors.extend(f"Не удалось обработать объявление с id: {row_id}" for row_id, _, _ in valid)
+            return
+
+        finished = await asyncio.gather(*(
+            self._finish_listing(row_id, inserted, task)
+            for (row_id, _, _), inserted, task in zip(valid, results, downloads)
+        ), return_exceptions=True)
+        for (row_id, _, _), result in zip(valid, finished):
+            if isinstance(result, Exception):
+                logger.error("Failed to finish property %s: %s", row_id, result)
+                self.errors.append(f"Не удалось обработать объявление с id: {row_id}")
+
+    async def run(self, file_path: str) -> Dict:
+        start = time.perf_counter()
+        try:
+            rows = await parse_feed(file_path)
+        except Exception as e:
+            logger.exception("Failed to parse feed %s: %s", file_path, e)
+            await self.client.send_message(self.user_id, "Не удалось прочитать файл: проверьте, что он соответствует шаблону.")
+            return {"total": 0, "imported": 0, "errors": 1}
+
+        self.total = len(rows)
+        await self._report_progress()
+
+        timeout = aiohttp.ClientTimeout(total=IMPORT_IMAGE_TIMEOUT)
+        async with aiohttp.ClientSession(timeout=timeout) as session:
+            downloader = ImageDownloader(session)
+            for offset in range(0, len(rows), self.batch_size):
+                batch = rows[offset:offset + self.batch_size]
+                valid, errors = validate_batch(batch, self.user_id)
+                self.errors.extend(errors)
+                await self._import_batch(downloader, valid)
+                self.processed += len(batch)
+                await self._report_progress()
+
+        await self._report_progress(done=True)
+        if self.errors:
+            await self.client.send_message(self.user_id, "\n".join(self.errors[:50]))
+
+        result = {
+            "total": self.total,
+            "imported": self.imported,
+            "errors": len(self.errors),
+            "seconds": round(time.perf_counter() - start, 3),
+        }
+        logger.info("Feed import for %s finished: %s", self.user_id, result)
+        return result
@@ -0,0 +1,146 @@
+import logging
+import time
+from collections import Counter, defaultdict
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from telethon import TelegramClient, events
+
+from src.bot_logic.bot_metrics import HandlerSpan, handler_name
+from src.bot_logic.state_machine import get_state_machine
+from src.logging_config import log_context
+
+logger = logging.getLogger(__name__)
+
+Handler = Callable[[object], Awaitable[None]]
+
+MESSAGE = "message"
+CALLBACK = "callback"
+
+
+class UpdateRouter:
+    """Единственный обработчик Telethon на каждый тип события.
+
+    Команда ищется в таблице точных команд, затем в таблице префиксов
+    (`search:`, `like:` ...), и только если ничего не нашлось - по состоянию
+    пользователя. На каждое событие принимается ровно одно решение.
+    """
+
+    def __init__(self):
+        self.commands: Dict[str, Dict[str, Handler]] = {MESSAGE: {}, CALLBACK: {}}
+        self.prefixes: Dict[str, Dict[str, Handler]] = {MESSAGE: {}, CALLBACK: {}}
+        self.states: Dict[str, Dict[str, Handler]] = {MESSAGE: {}, CALLBACK: {}}
+        self.defaults: Dict[str, Optional[Handler]] = {MESSAGE: None, CALLBACK: None}
+        self.album: Optional[Handler] = None
+
+        self.route_counts: Counter = Counter()
+        self.route_seconds: Dict[str, float] = defaultdict(float)
+        self.route_max_seconds: Dict[str, float] = defaultdict(float)
+
+    # ----------------- Registration -----------------
+
+    def _add(self, kind: str, key: str, handler: Handler):
+        # Ключ с ':' на конце - префикс, иначе точная команда
+        if key.endswith(":"):
+            table, key = self.prefixes[kind], key[:-1]
+        else:
+            table, key = self.commands[kind], key.lower()
+        if key in table:
+            raise ValueError(f"Route {kind} {key} is already registered")
+        table[key] = handler
+
+    def add_message(self, key: str, handler: Handler):
+        self._add(MESSAGE, key, handler)
+
+    def add_callback(self, key: str, handler: Handler):
+        self._add(CALLBACK, key, handler)
+
+    def add_command(self, key: str, handler: Handler):
+        """Команда, которую можно и написать, и нажать кнопкой"""
+        self.add_message(key, handler)
+        self.add_callback(key, handler)
+
+    def add_state(self, state: str, handler: Handler, message: bool = True, callback: bool = True):
+        """Обработчик для событий без команды, пока пользователь в состоянии state"""
+        for kind, enabled in ((MESSAGE, message), (CALLBACK, callback)):
+            if not enabled:
+                continue
+            if state in self.states[kind]:
+                raise ValueError(f"State {kind} {state} is already registered")
+            self.states[kind][state] = handler
+
+    def set_default_message(self, handler: Handler):
+        self.defaults[MESSAGE] = handler
+
+    def add_album(self, handler: Handler):
+        self.album = handler
+
+    def attach(self, client: TelegramClient):
+        client.add_event_handler(self.on_message, events.NewMessage())
+        client.add_event_handler(self.on_callback, events.CallbackQuery())
+        client.add_event_handler(self.on_album, events.Album())
+
+    # ----------------- Routing -----------------
+
+    def resolve(self, kind: str, text: str, user_id: int) -> Tuple[str, Optional[Handler]]:
+        """Возвращает имя маршрута и обработчик для текста сообщения или данных кнопки"""
+        text = text or ""
+        words = text.split(maxsplit=1)
+        command = words[0].lower() if words else ""
+        handler = self.commands[kind].get(command)
+        if handler is not None:
+            return command, handler
+
+        if ":" in text:
+            prefix = text.split(":", 1)[0]
+            handler = self.prefixes[kind].get(prefix)
+            if handler is not None:
+                return prefix + ":", handler
+
+        state = get_state_machine().get_state(user_id)
+        handler = self.states[kind].get(state)
+        if handler is not None:
+            return f"state:{state}", handler
+
+        handler = self.defaults[kind]
+        return ("default", handler) if handler is not None else ("unrouted", None)
+
+    async def _dispatch(self, route: str, handler: Optional[Handler], event):
+        start = time.perf_counter()
+        try:
+            with log_context(user_id=event.sender_id):
+                if handler is None:
+                    logger.info("User %s: нет обработчика для %s", event.sender_id, route)
+                    return
+                # Время, ошибки и доли Telegram/database_service по каждому обработчику
+                with HandlerSpan(handler_name(handler)):
+                    await handler(event)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.route_counts[route] += 1
+            self.route_seconds[route] += elapsed
+            if elapsed > self.route_max_seconds[route]:
+                self.route_max_seconds[route] = elapsed
+
+    async def on_message(self, event):
+        await get_state_machine().ensure_loaded(event.sender_id)
+        route, handler = self.resolve(MESSAGE, event.text, event.sender_id)
+        await self._dispatch(f"{MESSAGE} {route}", handler, event)
+
+    async def on_callback(self, event):
+        await get_state_machine().ensure_loaded(event.sender_id)
+        route, handler = self.resolve(CALLBACK, event.data.decode(), event.sender_id)
+        await self._dispatch(f"{CALLBACK} {route}", handler, event)
+
+    async def on_album(self, event):
+        await get_state_machine().ensure_loaded(event.sender_id)
+        await self._dispatch("album", self.album, event)
+
+    def statistics(self) -> Dict[str, Dict]:
+        return {
+            route: {
+                "count": count,
+                "avg_ms": round(self.route_seconds[route] / count * 1000, 3),
+                "max_ms": round(self.route_max_seconds[route] * 1000, 3),
+            }
+            for route, count in self.route_counts.most_common()
+        }
@@ -6,6 +6,7 @@ from fastapi import FastAPI, HTTPException, Depends
 from pydantic import BaseModel
 import uvicorn
 import asyncio
+from src.logging_config import setup_logging
 from src.bot_logic.telegram_client import TelegramClientManager
 from src.bot_logic.utils import send_property_info
 from collections.abc import AsyncIterator
@@ -15,12 +16,7 @@ from telethon import Button
 
 load_dotenv()
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    filename='server.log',
-)
-
+setup_logging("server")
 logger = logging.getLogger(__name__)
 
 @asynccontextmanager
@@ -60,10 +56,10 @@ async def send_new_property_notification(
         await send_property_info(telegram_client, user_id, property_id, message="", buttons=buttons)
 
         await telegram_client.send_message(user_id, message, buttons=buttons)
-        logger.info(f"Sent notification to user {user_id}")
+        logger.info("Sent notification to user %s", user_id)
         return {"status": "ok"}
     except Exception as e:
-        logger.exception(f"Error sending message to user {user_id}: {e}")
+        logger.exception("Error sending message to user %s: %s", user_id, e)
         raise HTTPException(status_code=500, detail=str(e))
 
 if __name__ == "__main__":
@@ -1,17 +1,26 @@
+import asyncio
 import logging
+import math
 import os
+import sys
+import time
+from typing import Dict, List, Optional, Set
 
 from src.bot_logic.messages import MESSAGES
+from src.bot_logic.state_storage import MemoryStateStorage, StateStorage
 
-LOG_FILE = os.path.join("logs", "state_machine.log")
-
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    filename=LOG_FILE,
-)
 logger = logging.getLogger(__name__)
 
+STATE_FLUSH_INTERVAL = float(os.getenv("STATE_FLUSH_INTERVAL", "0.5"))
+STATE_FLUSH_BATCH = int(os.getenv("STATE_FLUSH_BATCH", "100"))
+# Через сколько секунд закэшированная сессия перечитывается из хранилища,
+# чтобы увидеть изменения других процессов бота
+STATE_CACHE_TTL = float(os.getenv("STATE_CACHE_TTL", "5"))
+# Сессия без событий дольше STATE_IDLE_TIMEOUT секунд выгружается из памяти.
+# Таймеры хранятся в колесе с шагом STATE_WHEEL_TICK секунд
+STATE_IDLE_TIMEOUT = float(os.getenv("STATE_IDLE_TIMEOUT", "3600"))
+STATE_WHEEL_TICK = float(os.getenv("STATE_WHEEL_TICK", "60"))
+
 property_states = [
     "NEUTRAL", "NAME", "PROPERTY_TYPE", "DEAL_TYPE", "CITY", "AREAS", "MIN_PRICE",
     "MAX_PRICE", "MIN_ROOMS", "MAX_ROOMS", "MIN_TOTAL_AREA", "MAX_TOTAL_AREA", "BALCONY",
@@ -34,28 +43,233 @@ user_searching_states = [
     "NEUTRAL", "PROPERTY_FILTERS", "UPDATING", "CREATING_PROPERTY", "LOADING_FILE"
 ]
 
-class StateMachine:
+class UserSession:
+    """Весь диалог одного пользователя. Пустые коллекции не создаются, пока не нужны"""
+
+    __slots__ = ("state", "property_state", "property_filters", "update_param", "creating_property_param",
+                 "property_params", "loaded_at", "tick")
+
     def __init__(self):
-        self.user_state = {}
-        self.user_property_state = {}
-        self.user_property_filters = {}
-        self.user_update_param = {}
-        self.user_creating_property_param = {}
+        self.state = "NEUTRAL"
+        self.property_state = 0
+        self.property_filters: Optional[Dict] = None
+        self.update_param: Optional[List] = None
+        self.creating_property_param = 0
+        # Значения, введенные администратором в мастере добавления объекта
+        self.property_params: Optional[Dict] = None
+        self.loaded_at = 0.0
+        self.tick = 0
+
+    def is_neutral(self) -> bool:
+        return (self.state == "NEUTRAL" and self.property_state == 0 and self.creating_property_param == 0
+                and not self.property_filters and not self.update_param and not self.property_params)
+
+    def reset(self):
+        self.state = "NEUTRAL"
+        self.property_state = 0
+        self.property_filters = None
+        self.update_param = None
+        self.creating_property_param = 0
+        self.property_params = None
+
+
+class StateMachine:
+    def __init__(self, storage: Optional[StateStorage] = None,
+                 idle_timeout: float = STATE_IDLE_TIMEOUT, wheel_tick: float = STATE_WHEEL_TICK):
+        # Локальный кэш сессий; изменения пачками уходят в storage
+        self.sessions: Dict[int, UserSession] = {}
+        self.storage = storage or MemoryStateStorage()
+        self._dirty = set()
+        # Снимки, которые сейчас сохраняет flush: их нельзя перезаписывать загрузкой
+        self._saving: Set[int] = set()
+        self._flush_lock = asyncio.Lock()
+        self._flush_task = None
+        self._flusher = None
+
+        # Колесо таймеров: в слоте лежат пользователи, последний раз активные в этот тик
+        self.wheel_tick = wheel_tick
+        self._wheel: List[Set[int]] = [set() for _ in range(max(1, math.ceil(idle_timeout / wheel_tick)))]
+        self._tick = self._current_tick()
+        self.evicted = 0
+
+    # ----------------- Sessions -----------------
+
+    def _current_tick(self) -> int:
+        return int(time.monotonic() // self.wheel_tick)
+
+    def _schedule(self, user_id, session: UserSession):
+        tick = self._current_tick()
+        if session.tick == tick and user_id in self._wheel[tick % len(self._wheel)]:
+            return
+        self._wheel[session.tick % len(self._wheel)].discard(user_id)
+        self._wheel[tick % len(self._wheel)].add(user_id)
+        session.tick = tick
+
+    def _session(self, user_id) -> UserSession:
+        """Сессия для записи: создается, если ее еще нет"""
+        session = self.sessions.get(user_id)
+        if session is None:
+            session = self.sessions[user_id] = UserSession()
+        self._schedule(user_id, session)
+        return session
+
+    def expire_idle(self) -> int:
+        """Выгружает сессии, простаивающие дольше таймаута. Несохраненные ждут следующего прохода"""
+        now = self._current_tick()
+        slots = len(self._wheel)
+        start = max(self._tick + 1, now - slots + 1)
+        expired = []
+        for tick in range(start, now + 1):
+            slot = self._wheel[tick % slots]
+            for user_id in list(slot):
+                session = self.sessions.get(user_id)
+                if session is None:
+                    slot.discard(user_id)
+                elif session.tick <= tick - slots and user_id not in self._dirty:
+                    slot.discard(user_id)
+                    del self.sessions[user_id]
+                    expired.append(user_id)
+        self._tick = now
+        if expired:
+            self.storage.forget(expired)
+            self.evicted += len(expired)
+            logger.info("Выгружено %s неактивных сессий, осталось %s", len(expired), len(self.sessions))
+        return len(expired)
+
+    def memory_stats(self) -> Dict:
+        """Число живых сессий и примерный объем памяти под них в байтах"""
+        size = sys.getsizeof(self.sessions) + sum(sys.getsizeof(slot) for slot in self._wheel)
+        for session in self.sessions.values():
+            size += sys.getsizeof(session)
+            if session.property_filters is not None:
+                size += sys.getsizeof(session.property_filters)
+            if session.update_param is not None:
+                size += sys.getsizeof(session.update_param)
+            if session.property_params is not None:
+                size += sys.getsizeof(session.property_params)
+        return {
+            "sessions": len(self.sessions),
+            "dirty": len(self._dirty),
+            "evicted": self.evicted,
+            "bytes": size,
+        }
+
+    # ----------------- Storage methods -----------------
+
+    def use_storage(self, storage: StateStorage):
+        self.storage = storage
+        for session in self.sessions.values():
+            session.loaded_at = 0.0
+
+    def snapshot(self, user_id) -> Optional[Dict]:
+        """Снимок сессии для хранилища; None для нейтрального состояния"""
+        session = self.sessions.get(user_id)
+        if session is None or session.is_neutral():
+            return None
+        return {
+            "state": session.state,
+            "property_state": session.property_state,
+            "property_filters": session.property_filters or {},
+            "update_param": session.update_param or {},
+            "creating_property_param": session.creating_property_param,
+            "property_params": session.property_params or {},
+        }
+
+    def restore(self, user_id, data: Dict):
+        session = self._session(user_id)
+        session.state = data["state"]
+        session.property_state = data["property_state"]
+        session.property_filters = data["property_filters"] or None
+        session.update_param = data["update_param"] or None
+        session.creating_property_param = data["creating_property_param"]
+        # Снимки, сохраненные до появления поля, его не содержат
+        session.property_params = data.get("property_params") or None
+
+    async def ensure_loaded(self, user_id):
+        """Подгружает сессию из хранилища, если ее нет в кэше или она устарела"""
+        session = self.sessions.get(user_id)
+        if session is not None:
+            self._schedule(user_id, session)
+            if self._is_pending(user_id) or time.monotonic() - session.loaded_at < STATE_CACHE_TTL:
+                return
+        try:
+            data = await self.storage.load(user_id)
+        except Exception as e:
+            logger.exception("User %s: не удалось загрузить состояние: %s", user_id, e)
+            return
+        # Пока шла загрузка, обработчик мог изменить состояние - оно новее
+        if self._is_pending(user_id):
+            return
+        if data is not None:
+            self.restore(user_id, data)
+        elif session is not None and not session.is_neutral():
+            # Нейтральные сессии в хранилище не пишутся: другой процесс завершил диалог
+            session.reset()
+        self._session(user_id).loaded_at = time.monotonic()
+
+    def _is_pending(self, user_id) -> bool:
+        """Локальное состояние новее хранилища: изменено или еще сохраняется"""
+        return user_id in self._dirty or user_id in self._saving
+
+    def _touch(self, user_id):
+        self._dirty.add(user_id)
+        self._session(user_id).loaded_at = time.monotonic()
+        if len(self._dirty) >= STATE_FLUSH_BATCH:
+            self._schedule_flush()
+
+    def _schedule_flush(self):
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self.flush())
+
+    async def flush(self):
+        async with self._flush_lock:
+            if not self._dirty:
+                return
+            dirty, self._dirty = self._dirty, set()
+            sessions = {user_id: self.snapshot(user_id) for user_id in dirty}
+            self._saving = dirty
+            try:
+                await self.storage.save_many(sessions)
+            except Exception as e:
+                logger.exception("Не удалось сохранить состояния %s пользователей: %s", len(sessions), e)
+                self._dirty |= dirty
+            finally:
+                self._saving = set()
+
+    async def run_flusher(self, interval: float = STATE_FLUSH_INTERVAL):
+        while True:
+            await asyncio.sleep(interval)
+            await self.flush()
+            self.expire_idle()
+
+    def start_flusher(self):
+        if self._flusher is None:
+            self._flusher = asyncio.create_task(self.run_flusher())
+
+    async def stop_flusher(self):
+        if self._flusher is not None:
+            self._flusher.cancel()
+            try:
+                await self._flusher
+            except asyncio.CancelledError:
+                pass
+            self._flusher = None
+        await self.flush()
 
     # ----------------- Common methods -----------------
 
     def go_neutral(self, user_id):
-        logger.info(f"User {user_id}: перешли в состояние NEUTRAL")
-        self.user_state[user_id] = "NEUTRAL"
-        self.user_property_state[user_id] = 0
-        self.user_property_filters[user_id] = {}
-        self.user_update_param[user_id] = {}
-        self.user_creating_property_param[user_id] = 0
+        logger.info("User %s: перешли в состояние NEUTRAL", user_id)
+        self._session(user_id).reset()
+        self._touch(user_id)
 
     def get_state(self, user_id):
-        if not user_id in self.user_state:
-            self.go_neutral(user_id)
-        return self.user_state[user_id]
+        session = self.sessions.get(user_id)
+        return session.state if session is not None else "NEUTRAL"
     
     def get_filter_param_type(self, param_name: str):
         param_name = param_name.upper()
@@ -66,28 +280,33 @@ class StateMachine:
     # ----------------- Update filter methods -----------------
 
     def start_updating(self, user_id):
-        logger.info(f"User {user_id}: начали обновление фильтров")
+        logger.info("User %s: начали обновление фильтров", user_id)
         self.go_neutral(user_id)
-        self.user_state[user_id] = "UPDATING"
+        self._session(user_id).state = "UPDATING"
+        self._touch(user_id)
 
     def start_update(self, user_id, filter_id):
-        self.user_state[user_id] = "UPDATING"
-        self.user_update_param[user_id] = [ "", filter_id ]
+        session = self._session(user_id)
+        session.state = "UPDATING"
+        session.update_param = [ "", filter_id ]
+        self._touch(user_id)
 
     def set_update_param(self, user_id, param_name):
-        self.user_state[user_id] = "UPDATING"
-        self.user_update_param[user_id][0] = param_name
+        session = self._session(user_id)
+        session.state = "UPDATING"
+        session.update_param[0] = param_name
+        self._touch(user_id)
 
     def get_user_update_param(self, user_id):
         if self.get_state(user_id) != "UPDATING":
             return [ "NEUTRAL", "NEUTRAL" ]
-        return self.user_update_param[user_id][0]
+        return self.sessions[user_id].update_param[0]
 
     def get_user_update_filter(self, user_id):
-        if self.user_state[user_id] != "UPDATING":
-            logger.error(f"User {user_id}: попытка получить фильтр обновления вне процесса обновления")
+        if self.get_state(user_id) != "UPDATING":
+            logger.error("User %s: попытка получить фильтр обновления вне процесса обновления", user_id)
             raise ValueError("Trying to get update filter out of update process")
-        return int(self.user_update_param[user_id][1])
+        return int(self.sessions[user_id].update_param[1])
     
     def is_update_state_num(self, user_id):
         return (property_state_type[self.get_user_update_param(user_id)] == 'int')
@@ -104,74 +323,98 @@ class StateMachine:
     # ----------------- Create filter methods -----------------
 
     def starting_property_filter(self, user_id):
-        logger.info(f"User {user_id}: начали ввод фильтров")
-        self.user_state[user_id] = "PROPERTY_FILTERS"
-        self.user_property_state[user_id] = 1
+        logger.info("User %s: начали ввод фильтров", user_id)
+        session = self._session(user_id)
+        session.state = "PROPERTY_FILTERS"
+        session.property_state = 1
+        self._touch(user_id)
 
     def save_filter_info(self, user_id, filter_name: str, value):
         if not filter_name in property_states:
-            logger.error(f"User {user_id}: попытка сохранить неверный фильтр {filter_name}")
+            logger.error("User %s: попытка сохранить неверный фильтр %s", user_id, filter_name)
             raise ValueError("Wrong filter name")
-        self.user_property_filters[user_id][filter_name.lower()] = value
+        session = self._session(user_id)
+        if session.property_filters is None:
+            session.property_filters = {}
+        session.property_filters[filter_name.lower()] = value
+        self._touch(user_id)
 
     def next_property_filter(self, user_id):
-        if self.user_property_state[user_id] == len(property_states) - 1:
-            logger.error(f"User {user_id}: попытка перейти в следующее состояние после CONFIRMATION")
+        session = self._session(user_id)
+        if session.property_state == len(property_states) - 1:
+            logger.error("User %s: попытка перейти в следующее состояние после CONFIRMATION", user_id)
             self.go_neutral(user_id)
             raise ValueError("Trying to go to next state after CONFIRMATION state")
-        self.user_property_state[user_id] += 1
+        session.property_state += 1
+        self._touch(user_id)
+
+    def _property_state_index(self, user_id) -> int:
+        session = self.sessions.get(user_id)
+        return session.property_state if session is not None else 0
 
     def get_property_state(self, user_id):
-        if not user_id in self.user_property_state:
-            self.user_property_state[user_id] = 0
-        return property_states[self.user_property_state[user_id]]
+        return property_states[self._property_state_index(user_id)]
 
     def is_state_num(self, user_id):
-        if not user_id in self.user_property_state:
-            self.user_property_state[user_id] = 0
         return (property_state_type[self.get_property_state(user_id)] == 'int')
 
     def is_state_list(self, user_id):
-        if not user_id in self.user_property_state:
-            self.user_property_state[user_id] = 0
         return (property_state_type[self.get_property_state(user_id)] == 'list')
 
     def is_state_bool(self, user_id):
-        if not user_id in self.user_property_state:
-            self.user_property_state[user_id] = 0
         return (property_state_type[self.get_property_state(user_id)] == 'bool')
 
     def get_property_filter(self, user_id):
         if self.get_property_state(user_id) != "CONFIRMATION":
-            logger.error(f"User {user_id}: попытка получить фильтры до завершения ввода")
+            logger.error("User %s: попытка получить фильтры до завершения ввода", user_id)
             raise ValueError("Trying to get filter info until complete")
-        return self.user_property_filters[user_id]
+        return self.sessions[user_id].property_filters or {}
 
     def is_valid_transition(self, user_id, expected_state):
-        current_state = property_states[self.user_property_state.get(user_id)]
+        current_state = property_states[self._property_state_index(user_id)]
         return current_state == expected_state
 
     # ----------------- New property methods -----------------
 
     def starting_add_property(self, user_id):
-        logger.info(f"User {user_id}: начали ввод нового объекта")
-        self.user_state[user_id] = "CREATING_PROPERTY"
-        self.user_creating_property_param[user_id] = 0
+        logger.info("User %s: начали ввод нового объекта", user_id)
+        session = self._session(user_id)
+        session.state = "CREATING_PROPERTY"
+        session.creating_property_param = 0
+        session.property_params = None
+        self._touch(user_id)
 
     def starting_load_by_file_property(self, user_id):
-        logger.info(f"User {user_id}: начали загрузку объекта файлом")
-        self.user_state[user_id] = "LOADING_FILE"
+        logger.info("User %s: начали загрузку объекта файлом", user_id)
+        self._session(user_id).state = "LOADING_FILE"
+        self._touch(user_id)
 
     def next_creating_property_pram(self, user_id):
-        self.user_creating_property_param[user_id] += 1
+        self._session(user_id).creating_property_param += 1
+        self._touch(user_id)
+
+    def save_property_param(self, user_id, name: str, value):
+        session = self._session(user_id)
+        if session.property_params is None:
+            session.property_params = {}
+        session.property_params[name] = value
+        self._touch(user_id)
+
+    def get_property_params(self, user_id) -> Dict:
+        session = self.sessions.get(user_id)
+        return dict(session.property_params or {}) if session is not None else {}
+
+    def _creating_property_index(self, user_id) -> int:
+        session = self.sessions.get(user_id)
+        return session.creating_property_param if session is not None else 0
 
     def get_creating_property_param(self, user_id):
-        return add_property_states[self.user_creating_property_param[user_id]]
+        return add_property_states[self._creating_property_index(user_id)]
     
     async def send_creating_property_message(self, client, user_id):
         key = "CREATING_PROPERTY:"+self.get_creating_property_param(user_id)
-        if self.user_creating_property_param[user_id] >= len(add_property_states):
-            logger.error(f"User {user_id}: попытка перейти в следующее состояние после CONFIRMATION")
+        if self._creating_property_index(user_id) >= len(add_property_states):
+            logger.error("User %s: попытка перейти в следующее состояние после CONFIRMATION", user_id)
             self.go_neutral(user_id)
             raise ValueError("Trying to go to next state after CONFIRMATION state")
         message, buttons, name, type = MESSAGES[key]
@@ -179,8 +422,8 @@ class StateMachine:
 
     def get_cur_param_name_type(self, user_id):
         key = "CREATING_PROPERTY:"+self.get_creating_property_param(user_id)
-        if self.user_creating_property_param[user_id] >= len(add_property_states):
-            logger.error(f"User {user_id}: попытка перейти в следующее состояние после CONFIRMATION")
+        if self._creating_property_index(user_id) >= len(add_property_states):
+            logger.error("User %s: попытка перейти в следующее состояние после CONFIRMATION", user_id)
             self.go_neutral(user_id)
             raise ValueError("Trying to go to next state after CONFIRMATION state")
         message, buttons, name, type = MESSAGES[key]
@@ -0,0 +1,168 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+from typing import Dict, Optional
+
+import asyncpg
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+STATE_STORAGE = os.getenv("STATE_STORAGE", "memory")
+STATE_STORAGE_PATH = os.getenv("STATE_STORAGE_PATH", os.path.join("bot_data", "state.sqlite3"))
+STATE_STORAGE_DSN = os.getenv("STATE_STORAGE_DSN")
+
+Session = Dict
+
+
+class StateStorage:
+    """Хранилище диалогов пользователей: снимок сессии на пользователя.
+
+    В save_many значение None означает нейтральное состояние - запись удаляется.
+    """
+
+    async def load(self, user_id: int) -> Optional[Session]:
+        raise NotImplementedError
+
+    async def save_many(self, sessions: Dict[int, Optional[Session]]):
+        raise NotImplementedError
+
+    def forget(self, user_ids):
+        """Сессии выгружены из памяти бота. Постоянным хранилищам делать ничего не нужно"""
+        pass
+
+    async def close(self):
+        pass
+
+
+class MemoryStateStorage(StateStorage):
+    def __init__(self):
+        self.sessions: Dict[int, str] = {}
+
+    async def load(self, user_id: int) -> Optional[Session]:
+        data = self.sessions.get(user_id)
+        return json.loads(data) if data is not None else None
+
+    async def save_many(self, sessions: Dict[int, Optional[Session]]):
+        for user_id, session in sessions.items():
+            if session is None:
+                self.sessions.pop(user_id, None)
+            else:
+                self.sessions[user_id] = json.dumps(session, ensure_ascii=False)
+
+    def forget(self, user_ids):
+        # В памяти брошенный диалог просто освобождается
+        for user_id in user_ids:
+            self.sessions.pop(user_id, None)
+
+
+class SQLiteStateStorage(StateStorage):
+    """Локальное хранилище. Запросы выполняются в отдельном потоке, чтобы не блокировать цикл событий"""
+
+    def __init__(self, path: str = STATE_STORAGE_PATH):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS sessions (
+                user_id INTEGER PRIMARY KEY,
+                data TEXT NOT NULL
+            )
+        """)
+        self.lock = asyncio.Lock()
+
+    def _load(self, user_id: int) -> Optional[Session]:
+        row = self.conn.execute("SELECT data FROM sessions WHERE user_id = ?", (user_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _save_many(self, rows, deleted):
+        with self.conn:
+            self.conn.execute("BEGIN")
+            self.conn.executemany("INSERT OR REPLACE INTO sessions VALUES (?, ?)", rows)
+            self.conn.executemany("DELETE FROM sessions WHERE user_id = ?", deleted)
+
+    async def load(self, user_id: int) -> Optional[Session]:
+        async with self.lock:
+            return await asyncio.to_thread(self._load, user_id)
+
+    async def save_many(self, sessions: Dict[int, Optional[Session]]):
+        rows = [
+            (user_id, json.dumps(session, ensure_ascii=False))
+            for user_id, session in sessions.items() if session is not None
+        ]
+        deleted = [(user_id,) for user_id, session in sessions.items() if session is None]
+        async with self.lock:
+            await asyncio.to_thread(self._save_many, rows, deleted)
+
+    async def close(self):
+        async with self.lock:
+            self.conn.close()
+
+
+class PostgresStateStorage(StateStorage):
+    """Общее хранилище для нескольких процессов бота"""
+
+    def __init__(self, dsn: Optional[str] = STATE_STORAGE_DSN):
+        self.dsn = dsn or (
+            f"postgresql://{os.getenv('DB_USER')}:{os.getenv('DB_PASSWORD')}"
+            f"@{os.getenv('DB_HOST')}:{os.getenv('DB_PORT')}/{os.getenv('DB_NAME')}"
+        )
+        self.pool: Optional[asyncpg.Pool] = None
+        self.lock = asyncio.Lock()
+
+    async def _get_pool(self) -> asyncpg.Pool:
+        async with self.lock:
+            if self.pool is None:
+                self.pool = await asyncpg.create_pool(self.dsn, min_size=1, max_size=4)
+                await self.pool.execute("""
+                    CREATE TABLE IF NOT EXISTS bot_sessions (
+                        user_id BIGINT PRIMARY KEY,
+                        data JSONB NOT NULL,
+                        updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+                    )
+                """)
+                logger.info("Хранилище состояний Postgres подключено")
+        return self.pool
+
+    async def load(self, user_id: int) -> Optional[Session]:
+        pool = await self._get_pool()
+        data = await pool.fetchval("SELECT data FROM bot_sessions WHERE user_id = $1", user_id)
+        return json.loads(data) if data is not None else None
+
+    async def save_many(self, sessions: Dict[int, Optional[Session]]):
+        pool = await self._get_pool()
+        user_ids = [user_id for user_id, session in sessions.items() if session is not None]
+        data = [json.dumps(sessions[user_id], ensure_ascii=False) for user_id in user_ids]
+        deleted = [user_id for user_id, session in sessions.items() if session is None]
+        async with pool.acquire() as conn:
+            async with conn.transaction():
+                if user_ids:
+                    await conn.execute("""
+                        INSERT INTO bot_sessions (user_id, data, updated_at)
+                        SELECT user_id, data::jsonb, now() FROM unnest($1::bigint[], $2::text[]) AS s(user_id, data)
+                        ON CONFLICT (user_id) DO UPDATE SET data = EXCLUDED.data, updated_at = EXCLUDED.updated_at
+                    """, user_ids, data)
+                if deleted:
+                    await conn.execute("DELETE FROM bot_sessions WHERE user_id = ANY($1::bigint[])", deleted)
+
+    async def close(self):
+        if self.pool is not None:
+            await self.pool.close()
+            self.pool = None
+
+
+def create_state_storage(kind: str = STATE_STORAGE) -> StateStorage:
+    if kind == "memory":
+        return MemoryStateStorage()
+    if kind == "sqlite":
+        return SQLiteStateStorage()
+    if kind == "postgres":
+        return PostgresStateStorage()
+    raise ValueError(f"Unknown state storage: {kind}")
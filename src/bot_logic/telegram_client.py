@@ -1,18 +1,30 @@
 import logging
-import os
+import time
 
 from telethon import TelegramClient
 from telethon.errors.rpcerrorlist import ApiIdInvalidError
 
-LOG_FILE = os.path.join("logs", "server.log")
+from src.bot_logic.bot_metrics import record_telegram
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    filename=LOG_FILE,
-)
 logger = logging.getLogger(__name__)
 
+
+class InstrumentedTelegramClient(TelegramClient):
+    """TelegramClient, который замеряет каждый запрос к API.
+
+    Все методы Telethon (send_message, send_file, загрузка файлов в другие DC)
+    сходятся в _call, поэтому время засчитывается и текущему обработчику.
+    """
+
+    async def _call(self, sender, request, ordered=False, flood_sleep_threshold=None):
+        start = time.perf_counter()
+        try:
+            return await super()._call(sender, request, ordered=ordered, flood_sleep_threshold=flood_sleep_threshold)
+        finally:
+            name = type(request).__name__ if not isinstance(request, list) else "batch"
+            record_telegram(time.perf_counter() - start, name)
+
+
 class TelegramClientManager:
     def __init__(self, session_name: str, api_id: int, api_hash: str, bot_token: str):
         self.session_name = session_name
@@ -22,7 +34,7 @@ class TelegramClientManager:
         self.client = None
 
     async def __aenter__(self):
-        self.client = TelegramClient(
+        self.client = InstrumentedTelegramClient(
             self.session_name,
             self.api_id,
             self.api_hash,
@@ -43,7 +55,7 @@ class TelegramClientManager:
     async def send_message(self, user_id: int, message: str):
         try:
             await self.client.send_message(user_id, message)
-            logger.info(f"Sent message to user {user_id}")
+            logger.info("Sent message to user %s", user_id)
         except Exception as e:
-            logger.exception(f"Failed to send message to user {user_id}: {e}")
+            logger.exception("Failed to send message to user %s: %s", user_id, e)
             raise
\ No newline at end of file
@@ -1,7 +1,8 @@
 import io
-import os
 import logging
 
+import httpx
+
 from telethon import TelegramClient, events, Button
 from telethon.types import User
 from telethon.types import MessageMediaPhoto
@@ -10,28 +11,41 @@ from fastapi import UploadFile
 from typing import List
 import base64
 
+from src.bot_logic.bot_metrics import instrumented
 from src.bot_logic.database_service_client import get_database_service_client
+from src.bot_logic.media_cache import send_property_photos
+from src.bot_logic.admin_cache import get_admin_cache
 from src.bot_logic.state_machine import get_state_machine
 from src.bot_logic.messages import MESSAGES
 
-LOG_FILE = os.path.join("logs", "bot.log")
-
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    filename=LOG_FILE,
-)
 logger = logging.getLogger(__name__)
 
 async def is_admin(client: TelegramClient, user_id: int) -> bool:
     try:
-        database_service = get_database_service_client()
-
-        return await database_service.is_admin(user_id)
+        return await get_admin_cache().is_admin(user_id)
     except Exception as e:
-        logger.error(f"Error checking admin status: {e}")
+        logger.error("Error checking admin status: %s", e)
         return False
 
+def page_cursor(data: str):
+    """Курсор страницы из данных кнопки `prefix:<cursor>`.
+
+    Пусто или число - первая страница: в старых сообщениях кнопки несут смещение (`show_properties:10`),
+    а курсор в base64 никогда не состоит из одних цифр.
+    """
+    cursor = data.split(":", 1)[1].strip() if ":" in data else ""
+    return None if not cursor or cursor.isdigit() else cursor
+
+async def load_page(load, cursor):
+    """Страница по курсору кнопки. Если сервис курсор больше не принимает - первая страница"""
+    try:
+        return await load(cursor)
+    except httpx.HTTPStatusError as e:
+        if cursor is None or e.response.status_code != 400:
+            raise
+        logger.warning("Cursor %s rejected, showing the first page", cursor)
+        return await load(None)
+
 async def go_to_neutral_state(user_id, client: TelegramClient):
     state_machine = get_state_machine()
     state_machine.go_neutral(user_id)
@@ -39,19 +53,20 @@ async def go_to_neutral_state(user_id, client: TelegramClient):
     buttons = []
 
     is_user_admin = await is_admin(client, user_id)
-    logger.info(f"User {user_id} is admin: {is_user_admin}")
+    logger.info("User %s is admin: %s", user_id, is_user_admin)
 
     if is_user_admin:
         buttons.append([Button.inline("Добавить объявление", "/new_property")])
         buttons.append([Button.inline("Добавить объявления файлом", "/new_property_file")])
-        buttons.append([Button.inline("Просмотр объявлений", "show_properties:0")])
+        buttons.append([Button.inline("Просмотр объявлений", "show_properties:")])
         buttons.append([Button.inline("Статистика", "/get_statistics")])
+        buttons.append([Button.inline("Производительность", "/perf")])
         buttons.append([Button.inline("Перестать быть админом", "/unregister_admin")])
     else:
         buttons = [
             [Button.inline("Новый фильтр ❇️", "/new_filter")],
             [Button.inline("Инструкция 🧾", "/help")],
-            [Button.inline("Избранное ⭐️", "/favorites_list:0")],
+            [Button.inline("Избранное ⭐️", "/favorites_list:")],
             [Button.inline("Мои фильтры 🈴", "/filters_list")],
             [Button.inline("Изменить фильтр 🆙", "/update_filter")],
             [Button.inline("Удалить фильтр ❌", "/delete_filter")],
@@ -158,19 +173,19 @@ async def send_filter_info(client, user_id: int, filter_id: int):
             await client.send_message(user_id, "Фильтр не найден.")
             return
 
-        logger.info(f"Filter info: {filter_info}")
+        logger.debug("Filter info: %s", filter_info)
         message = format_filter_message(filter_info)
 
         await client.send_message(user_id, message)
     except Exception as e:
         await client.send_message(user_id, "Произошла ошибка при получении информации о фильтре.")
-        logger.error(f"Error getting filter info: {e}")
+        logger.error("Error getting filter info: %s", e)
 
 async def media_to_upload_file(client: TelegramClient, media: MessageMediaPhoto) -> UploadFile | None:
-    logger.info(f"Загрузка медиафайла: {media}")
+    logger.info("Загрузка медиафайла: %s", media)
     try:
         photo_bytes = await client.download_media(media, bytes)
-        logger.info(f"Got here 1 type:{type(photo_bytes)}")
+        logger.info("Got here 1 type:%s", type(photo_bytes))
 
         if photo_bytes is None:
             logger.error("Не удалось загрузить медиафайл.")
@@ -179,80 +194,69 @@ async def media_to_upload_file(client: TelegramClient, media: MessageMediaPhoto)
         return photo_bytes
 
     except Exception as e:
-        logger.error(f"Ошибка при загрузке медиафайла: {e}")
+        logger.error("Ошибка при загрузке медиафайла: %s", e)
         return None
 
-async def send_property_info(client: TelegramClient, user_id: int, property_id: int, message="", is_admin=False, buttons=None):
-    datatbase_service = get_database_service_client()
-
-    try:
-        property_info = await datatbase_service.get_property_description(property_id)
-        if not property_info:
-            await client.send_message(user_id, "Объявление не найдено.")
-            go_to_neutral_state(user_id, client)
-            return
-
-        logger.info(f"Property info: {property_info}")
-        
-        message += "\n"
-        message += f"Объявление {property_info.get('id', 'Не указано')}\n\n"
+def format_property_message(property_info: dict, message: str = "") -> str:
+    message += "\n"
+    message += f"Объявление {property_info.get('id', 'Не указано')}\n\n"
 
-        message += f"Состояние: {property_info.get('state', 'Не указано')}\n"
-        message += f"Адрес: {property_info.get('city', ' ')}"
+    message += f"Состояние: {property_info.get('state', 'Не указано')}\n"
+    message += f"Адрес: {property_info.get('city', ' ')}"
 
-        area_txt = property_info.get('area', None)
-        if area_txt:
-            message += f", {area_txt}"
-        
-        street_txt = property_info.get('street', None)
-        if street_txt:
-            message += f", {street_txt}"
+    area_txt = property_info.get('area', None)
+    if area_txt:
+        message += f", {area_txt}"
+    
+    street_txt = property_info.get('street', None)
+    if street_txt:
+        message += f", {street_txt}"
 
-        house_number_txt = property_info.get('house_number', None)
-        if house_number_txt:
-            message += f", {house_number_txt}"
+    house_number_txt = property_info.get('house_number', None)
+    if house_number_txt:
+        message += f", {house_number_txt}"
 
-        apartment_number_txt = property_info.get('apartment_number', None)
-        if apartment_number_txt:
-            message += f", {apartment_number_txt}"
+    apartment_number_txt = property_info.get('apartment_number', None)
+    if apartment_number_txt:
+        message += f", {apartment_number_txt}"
 
-        message += "\n"
-        
-        message += f"Тип: {property_info.get('property_type', 'Не указано')}\n"
-        message += f"Тип сделки: {property_info.get('deal_type', 'Не указано')}\n"
-        message += f"Цена: {property_info.get('price', 'Не указано')}\n\n"
-        message += f"Депозит: {property_info.get('deposit', 'Не указано')}\n"
+    message += "\n"
+    
+    message += f"Тип: {property_info.get('property_type', 'Не указано')}\n"
+    message += f"Тип сделки: {property_info.get('deal_type', 'Не указано')}\n"
+    message += f"Цена: {property_info.get('price', 'Не указано')}\n\n"
+    message += f"Депозит: {property_info.get('deposit', 'Не указано')}\n"
 
-        message += f"Описание: {property_info.get('description', 'Не указано')}\n\n"
+    message += f"Описание: {property_info.get('description', 'Не указано')}\n\n"
 
-        message += "Параметры:\n"
+    message += "Параметры:\n"
 
-        message += f"Комнат: {property_info.get('rooms', 'Не указано')}\n"
-        message += f"Площадь: {property_info.get('total_area', 'Не указано')}\n"
-        message += f"Этаж: {property_info.get('floor', 'Не указано')}\n"
-        message += f"Всего этажей: {property_info.get('total_floors', 'Не указано')}\n"
+    message += f"Комнат: {property_info.get('rooms', 'Не указано')}\n"
+    message += f"Площадь: {property_info.get('total_area', 'Не указано')}\n"
+    message += f"Этаж: {property_info.get('floor', 'Не указано')}\n"
+    message += f"Всего этажей: {property_info.get('total_floors', 'Не указано')}\n"
 
-        message += f"Балкон: {'Да' if property_info.get('balcony', False) else 'Нет'}\n"
-        message += f"Ремонт: {property_info.get('renovated', 'Не указано')}\n"
+    message += f"Балкон: {'Да' if property_info.get('balcony', False) else 'Нет'}\n"
+    message += f"Ремонт: {property_info.get('renovated', 'Не указано')}\n"
+    return message
 
-        photos_bytes = await datatbase_service.get_property_photos(property_id)
+@instrumented
+async def send_property_info(client: TelegramClient, user_id: int, property_id: int, message="", is_admin=False, buttons=None):
+    datatbase_service = get_database_service_client()
 
-        if not photos_bytes:
-            await client.send_message(user_id, "Нет фотографий для этого объявления.")
+    try:
+        card = await datatbase_service.get_property_card(property_id, viewer=user_id)
+        property_info = card.get("property") if card else None
+        if not property_info:
+            await client.send_message(user_id, "Объявление не найдено.")
+            go_to_neutral_state(user_id, client)
             return
+
+        logger.debug("Property info: %s", property_info)
         
-        photos = []
-
-        for photo_bytes in photos_bytes:
-            photo = await client.upload_file(
-                file=photo_bytes,
-                file_name="photo.jpg",
-            )
-            photos.append(photo)
-        
-        logger.info(f"Got {len(photos)} photos for property {property_id}")
+        message = format_property_message(property_info, message)
 
-        if await datatbase_service.is_admin(user_id) and buttons == None:
+        if card.get("viewer_is_admin") and buttons == None:
             buttons = [
                     [Button.inline("Получить статистику", f"get_property_statistics:{property_id}"), 
                     Button.inline("Снова активно", f"property_back_active:{property_id}")],
@@ -262,13 +266,16 @@ async def send_property_info(client: TelegramClient, user_id: int, property_id:
                     Button.inline("В меню", "/start")]
                 ]
 
-        await client.send_file(user_id, photos)
+        sent = await send_property_photos(client, user_id, property_id, count=len(card.get("photos", [])))
+        if not sent:
+            await client.send_message(user_id, "Нет фотографий для этого объявления.")
+            return
 
         await client.send_message(user_id, message, buttons=buttons)
-        logger.info(f"Message with photos sent to {user_id}")
+        logger.info("Message with photos sent to %s", user_id)
 
     except Exception as e:
-        logger.error(f"Error getting property info: {e}")
+        logger.error("Error getting property info: %s", e)
         await client.send_message(user_id, "Произошла ошибка при получении информации о фильтре.")
         return
 
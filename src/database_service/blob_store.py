@@ -0,0 +1,106 @@
+import asyncio
+import hashlib
+import logging
+import os
+from typing import BinaryIO, List, NamedTuple, Tuple
+
+from src.database_service.image_writer import get_image_write_executor, write_files
+from src.database_service.photo_variants import process_photos, remove_photo_files
+
+logger = logging.getLogger(__name__)
+
+HASH_BUFFER_SIZE = 1024 * 1024
+# Блоб без ссылок живет еще столько секунд: повторно выставленное объявление не загружает фото заново
+BLOB_GC_GRACE = int(os.getenv("BLOB_GC_GRACE", "86400"))
+BLOB_GC_INTERVAL = float(os.getenv("BLOB_GC_INTERVAL", "3600"))
+BLOB_GC_BATCH = int(os.getenv("BLOB_GC_BATCH", "500"))
+
+
+class Blob(NamedTuple):
+    sha256: str
+    path: str
+    size: int
+
+
+def blob_path(root: str, sha256: str) -> str:
+    """Путь блоба с разбиением по каталогам: ab/cd/abcd..."""
+    return os.path.join(root, sha256[:2], sha256[2:4], sha256)
+
+
+def hash_file(source: BinaryIO) -> Tuple[str, int]:
+    digest = hashlib.sha256()
+    size = 0
+    source.seek(0)
+    for chunk in iter(lambda: source.read(HASH_BUFFER_SIZE), b""):
+        digest.update(chunk)
+        size += len(chunk)
+    source.seek(0)
+    return digest.hexdigest(), size
+
+
+def _write_missing(files: List[Tuple[str, BinaryIO]]) -> List[str]:
+    """Записывает только блобы, которых еще нет на диске. Возвращает записанные пути"""
+    missing = {}
+    for path, source in files:
+        if path not in missing and not os.path.exists(path):
+            missing[path] = source
+    if not missing:
+        return []
+    for path in missing:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    write_files(list(missing.items()))
+    return list(missing)
+
+
+def remove_blob_files(paths: List[str]):
+    remove_photo_files([path for path in paths if os.path.exists(path)])
+
+
+async def store_images(root: str, sources: List[BinaryIO], database_manager) -> List[Blob]:
+    """Сохраняет изображения как блобы и берет на них ссылки.
+
+    Ссылки берутся до записи: сборщик мусора не удалит блоб, который
+    мы только что нашли на диске и решили не записывать повторно.
+    """
+    loop = asyncio.get_running_loop()
+    executor = get_image_write_executor()
+    hashes = await asyncio.gather(*(loop.run_in_executor(executor, hash_file, source) for source in sources))
+    blobs = [Blob(sha256, blob_path(root, sha256), size) for sha256, size in hashes]
+
+    await database_manager.acquire_blobs(blobs)
+    try:
+        written = await loop.run_in_executor(
+            executor, _write_missing, [(blob.path, source) for blob, source in zip(blobs, sources)]
+        )
+    except Exception:
+        await database_manager.release_blobs([blob.sha256 for blob in blobs])
+        raise
+
+    logger.info("Stored %s images, %s already present", len(blobs), len(blobs) - len(written))
+    # Варианты нужны только новым блобам, у остальных они уже построены
+    await process_photos(written)
+    return blobs
+
+
+async def collect_garbage(database_manager, grace: int = BLOB_GC_GRACE, limit: int = BLOB_GC_BATCH) -> int:
+    """Удаляет блобы без ссылок вместе с их вариантами. Возвращает число удаленных"""
+    removed = 0
+    while True:
+        count = await database_manager.collect_blobs(
+            lambda paths: asyncio.to_thread(remove_blob_files, paths), grace, limit
+        )
+        removed += count
+        if count < limit:
+            break
+    if removed:
+        logger.info("Collected %s unreferenced blobs", removed)
+    return removed
+
+
+async def run_blob_collector(database_manager, interval: float = BLOB_GC_INTERVAL):
+    while True:
+        try:
+            await collect_garbage(database_manager)
+        except Exception as e:
+            logger.exception("Failed to collect unreferenced blobs: %s", e)
+        await asyncio.sleep(interval)
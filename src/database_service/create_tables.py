@@ -56,6 +56,24 @@ def create_properties_table(conn):
     except (Exception, psycopg2.DatabaseError) as error:
         conn.rollback()
 
+def create_photo_blobs_table(conn):
+    try:
+        cur = conn.cursor()
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS photo_blobs (
+                sha256 VARCHAR(64) PRIMARY KEY,
+                path VARCHAR(255) NOT NULL,
+                size BIGINT NOT NULL,
+                refcount INT NOT NULL DEFAULT 0,
+                created_at TIMESTAMP DEFAULT NOW(),
+                released_at TIMESTAMP
+            );
+        """)
+        conn.commit()
+        cur.close()
+    except (Exception, psycopg2.DatabaseError) as error:
+        conn.rollback()
+
 def create_property_photos_table(conn):
     try:
         cur = conn.cursor()
@@ -64,9 +82,13 @@ def create_property_photos_table(conn):
                 id SERIAL PRIMARY KEY,
                 property_id INT NOT NULL,
                 photo_path VARCHAR(255) NOT NULL,
+                blob_sha256 VARCHAR(64),
                 CONSTRAINT fk_property_photos
                     FOREIGN KEY(property_id)
-                        REFERENCES properties(id)
+                        REFERENCES properties(id),
+                CONSTRAINT fk_property_photos_blob
+                    FOREIGN KEY(blob_sha256)
+                        REFERENCES photo_blobs(sha256)
             );
         """)
         conn.commit()
@@ -150,6 +172,39 @@ def create_user_statistics_table(conn):
     except (Exception, psycopg2.DatabaseError) as error:
         conn.rollback()
 
+def create_user_statistics_shards_table(conn):
+    try:
+        cur = conn.cursor()
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS user_statistics_shards (
+                shard_id INT PRIMARY KEY,
+                views BIGINT DEFAULT 0,
+                likes BIGINT DEFAULT 0,
+                favorites BIGINT DEFAULT 0
+            );
+        """)
+        conn.commit()
+        cur.close()
+    except (Exception, psycopg2.DatabaseError) as error:
+        conn.rollback()
+
+def create_admin_state_table(conn):
+    try:
+        cur = conn.cursor()
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS admin_state (
+                id INT PRIMARY KEY,
+                version BIGINT NOT NULL DEFAULT 0
+            );
+        """)
+        cur.execute("""
+            INSERT INTO admin_state (id, version) VALUES (1, 0) ON CONFLICT (id) DO NOTHING;
+        """)
+        conn.commit()
+        cur.close()
+    except (Exception, psycopg2.DatabaseError) as error:
+        conn.rollback()
+
 def create_property_statistics_table(conn):
     try:
         cur = conn.cursor()
@@ -191,12 +246,45 @@ def create_user_favorites_table(conn):
     except (Exception, psycopg2.DatabaseError) as error:
         conn.rollback()
 
+# Те же индексы, что в changeSet 4, 5 и 6 migrations/main_base_changelog.xml
+INDEXES = (
+    # Поиск по фильтру: равенства по городу, типам и состоянию, затем проход по id за курсором
+    "CREATE INDEX IF NOT EXISTS idx_properties_search ON properties (city, property_type, deal_type, state, id)",
+    "CREATE INDEX IF NOT EXISTS idx_properties_search_price ON properties (city, property_type, deal_type, state, price)",
+    # Постраничный просмотр объявлений по ключу (created_at, id)
+    "CREATE INDEX IF NOT EXISTS idx_properties_created_at_id ON properties (created_at DESC, id DESC)",
+    "CREATE INDEX IF NOT EXISTS idx_preferences_telegram_id ON user_property_preferences (telegram_id)",
+    # Подбор подписчиков для нового объявления без индекса фильтров в памяти
+    "CREATE INDEX IF NOT EXISTS idx_preferences_active_city ON user_property_preferences (city) WHERE is_active = TRUE",
+    "CREATE INDEX IF NOT EXISTS idx_preferences_active_type ON user_property_preferences (property_type, deal_type) WHERE is_active = TRUE",
+    "CREATE INDEX IF NOT EXISTS idx_preferences_areas ON user_property_preferences USING GIN (areas jsonb_path_ops) WHERE is_active = TRUE",
+    "CREATE INDEX IF NOT EXISTS idx_favorites_telegram_id ON user_favorites (telegram_id, id)",
+    "CREATE INDEX IF NOT EXISTS idx_favorites_property_id ON user_favorites (property_id)",
+    "CREATE INDEX IF NOT EXISTS idx_property_photos_property_id ON property_photos (property_id, id)",
+    # Проверка внешнего ключа при удалении блоба и поиск блобов без ссылок для сборщика мусора
+    "CREATE INDEX IF NOT EXISTS idx_property_photos_blob ON property_photos (blob_sha256)",
+    "CREATE INDEX IF NOT EXISTS idx_photo_blobs_unreferenced ON photo_blobs (released_at) WHERE refcount <= 0",
+    "CREATE INDEX IF NOT EXISTS idx_property_statistics_property_id ON property_statistics (property_id)",
+    "CREATE INDEX IF NOT EXISTS idx_users_admins ON users (telegram_id) WHERE is_admin = TRUE",
+)
+
+def create_indexes(conn):
+    try:
+        cur = conn.cursor()
+        for index in INDEXES:
+            cur.execute(index)
+        conn.commit()
+        cur.close()
+    except (Exception, psycopg2.DatabaseError) as error:
+        conn.rollback()
+
 def clear_database(conn):
     try:
         cur = conn.cursor()
         cur.execute("DROP TABLE IF EXISTS user_favorites CASCADE;")
         cur.execute("DROP TABLE IF EXISTS user_property_preferences CASCADE;")
         cur.execute("DROP TABLE IF EXISTS property_photos CASCADE;")
+        cur.execute("DROP TABLE IF EXISTS photo_blobs CASCADE;")
         cur.execute("DROP TABLE IF EXISTS properties CASCADE;")
         cur.execute("DROP TABLE IF EXISTS users CASCADE;")
         conn.commit()
@@ -213,11 +301,15 @@ def create_tables():
         clear_database(conn)
         create_users_table(conn)
         create_properties_table(conn)
+        create_photo_blobs_table(conn)
         create_property_photos_table(conn)
         create_user_property_preferences_table(conn)
         create_user_favorites_table(conn)
         create_property_statistics_table(conn)
         create_user_statistics_table(conn)
+        create_user_statistics_shards_table(conn)
+        create_admin_state_table(conn)
+        create_indexes(conn)
         conn.close()
     except (Exception, psycopg2.DatabaseError) as error:
         raise error
@@ -0,0 +1,38 @@
+import base64
+import datetime
+import json
+from typing import List, Optional
+
+EPOCH = datetime.datetime(1970, 1, 1)
+
+# Кнопка Telegram вмещает 64 байта данных, курсор должен помещаться туда вместе с префиксом
+MAX_CURSOR_LENGTH = 40
+
+
+def encode_cursor(*values) -> str:
+    """Непрозрачный курсор: ключ последней выданной строки в base64 без выравнивания"""
+    data = json.dumps(values, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def decode_cursor(cursor: Optional[str], size: int) -> Optional[List]:
+    """None для первой страницы. ValueError, если курсор испорчен"""
+    if not cursor:
+        return None
+    if len(cursor) > MAX_CURSOR_LENGTH:
+        raise ValueError("Cursor is too long")
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Invalid cursor: {e}")
+    if not isinstance(values, list) or len(values) != size or not all(isinstance(value, int) for value in values):
+        raise ValueError("Invalid cursor")
+    return values
+
+
+def timestamp_to_int(value: datetime.datetime) -> int:
+    return (value - EPOCH) // datetime.timedelta(microseconds=1)
+
+
+def int_to_timestamp(value: int) -> datetime.datetime:
+    return EPOCH + datetime.timedelta(microseconds=value)
@@ -1,6 +1,15 @@
+import asyncio
 import asyncpg
-from typing import List, Dict
+from typing import List, Dict, Optional, Callable, Awaitable, Tuple
 import json
+from fastapi import Request
+
+from src.database_service.filter_index import FilterIndex
+from src.database_service.search_sessions import SearchSessionStore
+from src.database_service.statistics_buffer import StatisticsBuffer, STATISTICS_PARAMS, STATISTICS_FLUSH_INTERVAL
+from src.database_service.filter_compiler import FilterPlanCache, compile_filter
+from src.database_service.cursors import decode_cursor, encode_cursor, int_to_timestamp, timestamp_to_int
+from src.database_service.db_metrics import MeteredConnection, MeteredPool, meter_methods, register_pool_gauges
 
 import logging
 from dotenv import load_dotenv
@@ -14,58 +23,164 @@ DB_NAME = os.getenv("DB_NAME")
 DB_USER = os.getenv("DB_USER")
 DB_PASSWORD = os.getenv("DB_PASSWORD")
 
-LOG_FILE = os.path.join("logs", "daatbase_service.log")
-
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    filename=LOG_FILE,
-)
 logger = logging.getLogger(__name__)
 
 DATABASE_URL = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 
-async def get_database_manager():
-    database_manager = SqlDatabaseManager(DATABASE_URL)
-    await database_manager.connect()
-    try:
-        yield database_manager
-    finally:
-        await database_manager.disconnect()
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "2"))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+DB_POOL_MAX_INACTIVE_LIFETIME = float(os.getenv("DB_POOL_MAX_INACTIVE_LIFETIME", "300"))
+DB_COMMAND_TIMEOUT = float(os.getenv("DB_COMMAND_TIMEOUT", "30"))
+DB_STATEMENT_TIMEOUT_MS = os.getenv("DB_STATEMENT_TIMEOUT_MS")
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "512"))
+
+ADMINS_CHANNEL = "admins_changed"
+
+PROPERTY_COLUMNS = (
+    "return_contact", "property_type", "deal_type", "price", "city", "area", "street",
+    "house_number", "apartment_number", "rooms", "balcony",
+    "renovated", "total_area", "floor", "total_floors", "deposit", "description",
+)
+
+# COPY кодирует значения на клиенте: число вне диапазона INT дает OverflowError, а не ошибку сервера
+COPY_ROW_ERRORS = (asyncpg.PostgresError, asyncpg.InterfaceError, OverflowError, TypeError, ValueError)
+
+def property_values(property_data) -> tuple:
+    return tuple(getattr(property_data, column) for column in PROPERTY_COLUMNS)
+
+async def get_database_manager(request: Request) -> "SqlDatabaseManager":
+    return request.app.state.database_manager
+
+async def set_statement_timeout(conn):
+    if DB_STATEMENT_TIMEOUT_MS:
+        await conn.execute(f"SET statement_timeout = {int(DB_STATEMENT_TIMEOUT_MS)}")
 
 class SqlDatabaseManager:
-    def __init__(self, database_url: str):
+    def __init__(
+        self,
+        database_url: str,
+        min_size: int = DB_POOL_MIN_SIZE,
+        max_size: int = DB_POOL_MAX_SIZE,
+        max_inactive_connection_lifetime: float = DB_POOL_MAX_INACTIVE_LIFETIME,
+        command_timeout: float = DB_COMMAND_TIMEOUT,
+        init_hooks: Optional[List[Callable[[asyncpg.Connection], Awaitable[None]]]] = None,
+    ):
         self.database_url = database_url
+        self.min_size = min_size
+        self.max_size = max_size
+        self.max_inactive_connection_lifetime = max_inactive_connection_lifetime
+        self.command_timeout = command_timeout
+        self.init_hooks = list(init_hooks) if init_hooks is not None else [set_statement_timeout]
+        self.connections_initialized = 0
         self.pool = None
+        self.filter_index = FilterIndex()
+        self.filter_index_loaded = False
+        self.search_sessions = SearchSessionStore()
+        self.filter_plans = FilterPlanCache()
+        self.statistics_buffer = StatisticsBuffer()
+        self._statistics_flush_lock = asyncio.Lock()
+        self._statistics_flush_task = None
+        self._statistics_flusher = None
+        self.admin_version = 0
+        self._admin_listener = None
+
+    def add_init_hook(self, hook: Callable[[asyncpg.Connection], Awaitable[None]]):
+        self.init_hooks.append(hook)
+
+    async def _init_connection(self, conn):
+        for hook in self.init_hooks:
+            await hook(conn)
+        self.connections_initialized += 1
 
     async def connect(self):
         try:
-            self.pool = await asyncpg.create_pool(self.database_url)
-            logger.info("Connected to the database")
+            pool = await asyncpg.create_pool(
+                self.database_url,
+                min_size=self.min_size,
+                max_size=self.max_size,
+                max_inactive_connection_lifetime=self.max_inactive_connection_lifetime,
+                command_timeout=self.command_timeout,
+                statement_cache_size=DB_STATEMENT_CACHE_SIZE,
+                connection_class=MeteredConnection,
+                init=self._init_connection,
+            )
+            self.pool = MeteredPool(pool)
+            register_pool_gauges(self.pool)
+            logger.info("Connected to the database, pool size %s-%s", self.min_size, self.max_size)
         except Exception as e:
-            logger.exception(f"Failed to connect to the database: {e}")
+            logger.exception("Failed to connect to the database: %s", e)
             raise
 
     async def disconnect(self):
+        if self._admin_listener is not None:
+            await self._admin_listener.close()
+            self._admin_listener = None
         if self.pool:
             await self.pool.close()
+            self.pool = None
             logger.info("Disconnected from the database")
 
-    # ------------------ User Functions ------------------
-
-    async def check_user(self, conn, telegram_id: int):
+    async def load_filter_index(self):
         async with self.pool.acquire() as conn:
             try:
-                result = await conn.fetchrow("SELECT * FROM users WHERE telegram_id = $1", telegram_id)
-                
-                if not result:
-                    await conn.execute("INSERT INTO users (telegram_id) VALUES ($1)", telegram_id)
-                    logger.info(f"User with telegram_id {telegram_id} added to the database")
-                    return False
-                
+                rows = await conn.fetch("SELECT * FROM user_property_preferences WHERE is_active = TRUE")
+                self.filter_index.rebuild(rows)
+                self.filter_index_loaded = True
             except Exception as e:
-                logger.exception(f"Failed to check user: {e}")
-                raise
+                self.filter_index_loaded = False
+                logger.exception("Failed to load filter index, falling back to SQL matching: %s", e)
+
+    async def listen_admin_changes(self):
+        # Отдельное соединение: слушатель должен жить все время работы сервиса,
+        # а NOTIFY от любого экземпляра сервиса обновляет версию во всех
+        try:
+            self.admin_version = await self.pool.fetchval("SELECT version FROM admin_state WHERE id = 1") or 0
+            self._admin_listener = await asyncpg.connect(self.database_url)
+            await self._admin_listener.add_listener(ADMINS_CHANNEL, self._on_admins_changed)
+            logger.info("Listening for admin changes, version %s", self.admin_version)
+        except Exception as e:
+            logger.exception("Failed to listen for admin changes: %s", e)
+
+    def _on_admins_changed(self, conn, pid, channel, payload):
+        try:
+            self.admin_version = max(self.admin_version, int(payload))
+        except ValueError:
+            logger.error("Bad admin version payload: %s", payload)
+
+    def get_pool_statistics(self) -> Dict:
+        if not self.pool:
+            return {"connected": False}
+
+        size = self.pool.get_size()
+        idle = self.pool.get_idle_size()
+        return {
+            "connected": True,
+            "min_size": self.pool.get_min_size(),
+            "max_size": self.pool.get_max_size(),
+            "size": size,
+            "idle": idle,
+            "in_use": size - idle,
+            "waiting": self.pool.waiting,
+            "connections_initialized": self.connections_initialized,
+            "filter_plans": len(self.filter_plans),
+            "filter_plan_hits": self.filter_plans.hits,
+            "filter_plan_misses": self.filter_plans.misses,
+        }
+
+    # ------------------ User Functions ------------------
+
+    async def check_user(self, conn, telegram_id: int):
+        try:
+            result = await conn.fetchrow("SELECT * FROM users WHERE telegram_id = $1", telegram_id)
+
+            if not result:
+                await conn.execute("INSERT INTO users (telegram_id) VALUES ($1)", telegram_id)
+                logger.info("User with telegram_id %s added to the database", telegram_id)
+                return False
+
+        except Exception as e:
+            logger.exception("Failed to check user: %s", e)
+            raise
 
     async def add_filter(self, filter_data):
         async with self.pool.acquire() as conn:
@@ -83,6 +198,7 @@ class SqlDatabaseManager:
                     ) VALUES (
                         $1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11, $12, $13, $14, $15, $16, $17, $18, $19
                     )
+                    RETURNING *
                 """
 
                 areas = None
@@ -111,35 +227,44 @@ class SqlDatabaseManager:
                     filter_data.total_floors,
                 )
 
-                await conn.execute(query, *values)
-                logger.info(f"Added filter for telegram_id: {filter_data.telegram_id}")
+                row = await conn.fetchrow(query, *values)
+                self.filter_index.upsert(row)
+                logger.info("Added filter for telegram_id: %s", filter_data.telegram_id)
 
             except Exception as e:
-                logger.exception(f"Failed to add filter: {e}")
+                logger.exception("Failed to add filter: %s", e)
                 raise
 
     async def update_filter(self, telegram_id: int, filter_id: int, filter_param: str, value):
         async with self.pool.acquire() as conn:
             try:
                 await self.check_user(conn, telegram_id)
-                query = f"UPDATE user_property_preferences SET {filter_param.lower()} = $1 WHERE id = $2"
-                await conn.execute(query, value, filter_id)
-                logger.info(f"Updated filter {filter_id} for telegram_id: {telegram_id}")
+                query = f"UPDATE user_property_preferences SET {filter_param.lower()} = $1 WHERE id = $2 RETURNING *"
+                row = await conn.fetchrow(query, value, filter_id)
+                if row:
+                    self.filter_index.upsert(row)
+                self.filter_plans.invalidate(filter_id)
+                self.search_sessions.drop_filter(filter_id)
+                logger.info("Updated filter %s for telegram_id: %s", filter_id, telegram_id)
 
             except Exception as e:
-                logger.exception(f"Failed to update filter: {e}")
+                logger.exception("Failed to update filter: %s", e)
                 raise
 
     async def update_filter_list_param(self, telegram_id: int, filter_id: int, filter_param: str, value):
         async with self.pool.acquire() as conn:
             try:
                 await self.check_user(conn, telegram_id)
-                query = f"UPDATE user_property_preferences SET {filter_param.lower()} = $1::jsonb WHERE id = $2"
-                await conn.execute(query, value, filter_id)
-                logger.info(f"Updated filter {filter_id} for telegram_id: {telegram_id}")
+                query = f"UPDATE user_property_preferences SET {filter_param.lower()} = $1::jsonb WHERE id = $2 RETURNING *"
+                row = await conn.fetchrow(query, value, filter_id)
+                if row:
+                    self.filter_index.upsert(row)
+                self.filter_plans.invalidate(filter_id)
+                self.search_sessions.drop_filter(filter_id)
+                logger.info("Updated filter %s for telegram_id: %s", filter_id, telegram_id)
 
             except Exception as e:
-                logger.exception(f"Failed to update filter: {e}")
+                logger.exception("Failed to update filter: %s", e)
                 raise
 
     async def delete_filter(self, telegram_id: int, filter_id: int):
@@ -147,9 +272,12 @@ class SqlDatabaseManager:
             try:
                 await self.check_user(conn, telegram_id)
                 await conn.execute("DELETE FROM user_property_preferences WHERE id = $1", filter_id)
-                logger.info(f"Deleted filter {filter_id}")
+                self.filter_index.remove(filter_id)
+                self.filter_plans.invalidate(filter_id)
+                self.search_sessions.drop_filter(filter_id)
+                logger.info("Deleted filter %s", filter_id)
             except Exception as e:
-                logger.exception(f"Failed to delete filter {filter_id}: {e}")
+                logger.exception("Failed to delete filter %s: %s", filter_id, e)
                 raise
 
     async def get_filters(self, telegram_id: int) -> List[Dict]:
@@ -159,7 +287,7 @@ class SqlDatabaseManager:
                 filters = await conn.fetch("SELECT name, id FROM user_property_preferences WHERE telegram_id = $1", telegram_id)
                 return [dict(filter) for filter in filters]
             except Exception as e:
-                logger.exception(f"Failed to get filters: {e}")
+                logger.exception("Failed to get filters: %s", e)
                 raise
 
     async def get_filter(self, filter_id: int) -> List[Dict]:
@@ -174,25 +302,25 @@ class SqlDatabaseManager:
                     return None
 
             except Exception as e:
-                logger.exception(f"Failed to get filters: {e}")
+                logger.exception("Failed to get filters: %s", e)
                 raise
 
     async def add_to_favorites(self, telegram_id: int, property_id: int):
         async with self.pool.acquire() as conn:
             try:
                 await conn.execute("INSERT INTO user_favorites (telegram_id, property_id) VALUES ($1, $2)", telegram_id, property_id)
-                logger.info(f"Added property {property_id} to favorites for user {telegram_id}")
+                logger.info("Added property %s to favorites for user %s", property_id, telegram_id)
             except Exception as e:
-                logger.exception(f"Failed to add property to favorites: {e}")
+                logger.exception("Failed to add property to favorites: %s", e)
                 raise
 
     async def remove_from_favorites(self, favorites_id: int):
         async with self.pool.acquire() as conn:
             try:
                 await conn.execute("DELETE FROM user_favorites WHERE id = $1", favorites_id)
-                logger.info(f"Removed property {favorites_id} from favorites")
+                logger.info("Removed property %s from favorites", favorites_id)
             except Exception as e:
-                logger.exception(f"Failed to remove property from favorites: {e}")
+                logger.exception("Failed to remove property from favorites: %s", e)
                 raise
 
     async def get_favorites(self, telegram_id: int, offset: int, limit: int):
@@ -207,196 +335,242 @@ class SqlDatabaseManager:
                 favorites = await conn.fetch(query, telegram_id, offset, limit)
                 return [dict(favorite) for favorite in favorites]
             except Exception as e:
-                logger.exception(f"Failed to get favorites: {e}")
+                logger.exception("Failed to get favorites: %s", e)
                 raise
 
-    async def get_property_for_filter(self, filter_id: int):
+    async def get_favorites_page(self, telegram_id: int, cursor: Optional[str], limit: int) -> Dict:
+        """Страница избранного после курсора: проход по индексу (telegram_id, id) без OFFSET"""
+        after = decode_cursor(cursor, 1)
+        async with self.pool.acquire() as conn:
+            try:
+                rows = await conn.fetch("""
+                    SELECT id, property_id
+                    FROM user_favorites
+                    WHERE telegram_id = $1 AND id > $2
+                    ORDER BY id
+                    LIMIT $3
+                """, telegram_id, after[0] if after else 0, limit + 1)
+            except Exception as e:
+                logger.exception("Failed to get favorites page: %s", e)
+                raise
+
+        favorites = [dict(row) for row in rows[:limit]]
+        next_cursor = encode_cursor(favorites[-1]["id"]) if len(rows) > limit else None
+        return {"favorites": favorites, "next_cursor": next_cursor}
+
+    async def get_property_for_filter(self, filter_id: int, telegram_id: Optional[int] = None):
 
         async with self.pool.acquire() as conn:
             try:
-                logger.info(f"Получение объекта недвижимости для фильтра {filter_id}")
-                query = """
-                    SELECT 
-                        property_type, deal_type, city, areas, min_price, max_price, 
-                        min_rooms, max_rooms, min_total_area, max_total_area, balcony, 
-                        renovated, min_deposit, max_deposit, floor, total_floors
-                    FROM user_property_preferences
-                    WHERE id = $1;
-                """
-                filter_data = await conn.fetchrow(query, filter_id)
-                logger.info(f"Полученные данные фильтра: {filter_data}")
+                compiled = self.filter_plans.get(filter_id)
+                if compiled is None:
+                    generation = self.filter_plans.generation
+                    logger.info("Получение объекта недвижимости для фильтра %s", filter_id)
+                    query = """
+                        SELECT 
+                            telegram_id, property_type, deal_type, city, areas, min_price, max_price, 
+                            min_rooms, max_rooms, min_total_area, max_total_area, balcony, 
+                            renovated, min_deposit, max_deposit, floor, total_floors
+                        FROM user_property_preferences
+                        WHERE id = $1;
+                    """
+                    filter_data = await conn.fetchrow(query, filter_id)
+                    logger.debug("Полученные данные фильтра: %s", filter_data)
 
-                if not filter_data:
-                    logger.warning(f"Фильтр с ID {filter_id} не найден или не активен.")
-                    return None
+                    if not filter_data:
+                        logger.warning("Фильтр с ID %s не найден или не активен.", filter_id)
+                        return None
 
+                    compiled = compile_filter(filter_id, filter_data)
+                    self.filter_plans.put(compiled, generation)
 
-                where_clauses = []
-                params = {}
-
-                where_clauses.append("state = $1")
-                params["state"] = "Активно"
-                param_index = 2
-
-                where_clauses.append(f"property_type = ${param_index}")
-                params["property_type"] = filter_data["property_type"]
-                param_index += 1
-
-                where_clauses.append(f"deal_type = ${param_index}")
-                params["deal_type"] = filter_data["deal_type"]
-                param_index += 1
-
-                where_clauses.append(f"city = ${param_index}")
-                params["city"] = filter_data["city"]
-                param_index += 1
-
-                areas = filter_data["areas"]
-                if areas:
-                    where_clauses.append(f"area = ANY(${param_index})")
-                    params["areas"] = list(areas)
-                    param_index += 1
-
-                if filter_data["min_price"] is not None:
-                    where_clauses.append(f"price >= ${param_index}")
-                    params["min_price"] = filter_data["min_price"]
-                    param_index += 1
-                if filter_data["max_price"] is not None:
-                    where_clauses.append(f"price <= ${param_index}")
-                    params["max_price"] = filter_data["max_price"]
-                    param_index += 1
-
-                if filter_data["min_rooms"] is not None:
-                    where_clauses.append(f"rooms >= ${param_index}")
-                    params["min_rooms"] = filter_data["min_rooms"]
-                    param_index += 1
-                if filter_data["max_rooms"] is not None:
-                    where_clauses.append(f"rooms <= ${param_index}")
-                    params["max_rooms"] = filter_data["max_rooms"]
-                    param_index += 1
-
-                if filter_data["min_total_area"] is not None:
-                    where_clauses.append(f"total_area >= ${param_index}")
-                    params["min_total_area"] = filter_data["min_total_area"]
-                    param_index += 1
-                if filter_data["max_total_area"] is not None:
-                    where_clauses.append(f"total_area <= ${param_index}")
-                    params["max_total_area"] = filter_data["max_total_area"]
-                    param_index += 1
-
-                if filter_data["balcony"] is not None:
-                    where_clauses.append(f"balcony = ${param_index}")
-                    params["balcony"] = filter_data["balcony"]
-                    param_index += 1
-
-                if filter_data["renovated"]:
-                  where_clauses.append(f"renovated = ${param_index}")
-                  params["renovated"] = filter_data["renovated"]
-                  param_index += 1
-
-                if filter_data["min_deposit"] is not None:
-                    where_clauses.append(f"deposit >= ${param_index}")
-                    params["min_deposit"] = filter_data["min_deposit"]
-                    param_index += 1
-                if filter_data["max_deposit"] is not None:
-                    where_clauses.append(f"deposit <= ${param_index}")
-                    params["max_deposit"] = filter_data["max_deposit"]
-                    param_index += 1
-
-                if filter_data["floor"] is not None:
-                    where_clauses.append(f"floor = ${param_index}")
-                    params["floor"] = filter_data["floor"]
-                    param_index += 1
-
-                if filter_data["total_floors"] is not None:
-                    where_clauses.append(f"total_floors = ${param_index}")
-                    params["total_floors"] = filter_data["total_floors"]
-                    param_index += 1
-
-                logger.info(f"Фильтр для поиска: {where_clauses}")
-
-                where_clause = " AND ".join(where_clauses)
-                sql_query = f"""
-                    SELECT id
-                    FROM properties
-                    WHERE {where_clause}
-                    ORDER BY RANDOM()
-                    LIMIT 1;
-                """
+                if telegram_id is None:
+                    telegram_id = compiled.telegram_id
+
+                session = self.search_sessions.get(telegram_id, filter_id)
 
-                logger.info(f"SQL запрос: {sql_query}")
-                logger.info(f"Параметры запроса: {params}")
+                # Текст запроса постоянен для фильтра: asyncpg берет подготовленный запрос из кэша соединения
+                property_id = await conn.fetchval(compiled.next_sql, *compiled.params, session.cursor)
 
-                prepared_params = [params[key] for key in params]
-                property_id = await conn.fetchval(sql_query, *prepared_params)
+                # Проход позади курсора передает весь список показанных id, поэтому после пустого
+                # результата повторяется только когда объекты снова становятся доступными
+                if not property_id and self.search_sessions.needs_behind_scan(session):
+                    property_id = await conn.fetchval(
+                        compiled.behind_sql, *compiled.params, session.cursor, list(session.shown)
+                    )
+                    if not property_id:
+                        self.search_sessions.mark_exhausted(session)
 
                 if property_id:
-                    logger.info(f"Найден случайный объект недвижимости {property_id} для фильтра {filter_id}.")
+                    session.advance(property_id)
+                    logger.info("Найден объект недвижимости %s для фильтра %s.", property_id, filter_id)
                     return property_id
                 else:
-                    logger.info(f"Не найдено объектов недвижимости для фильтра {filter_id}.")
+                    logger.info("Не найдено новых объектов недвижимости для фильтра %s.", filter_id)
                     return None
 
             except Exception as e:
-                logger.exception(f"Ошибка при поиске объекта недвижимости: {e}")
+                logger.exception("Ошибка при поиске объекта недвижимости: %s", e)
                 return None
 
-    async def increase_statistics(self, property_id: int, param_name: str):
-        async with self.pool.acquire() as conn:
+    def reset_search_session(self, telegram_id: int, filter_id: int):
+        self.search_sessions.reset(telegram_id, filter_id)
+        logger.info("Reset search session for filter %s of telegram_id: %s", filter_id, telegram_id)
+
+    async def increase_statistics(self, property_id: int, param_name: str, count: int = 1):
+        if param_name not in STATISTICS_PARAMS:
+            raise ValueError(f"Unknown statistics parameter: {param_name}")
+
+        if self.statistics_buffer.add(property_id, param_name, count):
+            self._schedule_statistics_flush()
+
+    def _schedule_statistics_flush(self):
+        if self._statistics_flush_task is None or self._statistics_flush_task.done():
+            self._statistics_flush_task = asyncio.create_task(self.flush_statistics())
+
+    async def flush_statistics(self):
+        async with self._statistics_flush_lock:
+            pending, totals = self.statistics_buffer.take()
+            if not pending:
+                self.statistics_buffer.commit()
+                return
+
+            property_ids = list(pending.keys())
+            columns = list(zip(*pending.values()))
             try:
-                await conn.execute(f"UPDATE user_statistics SET {param_name} = {param_name} + 1 WHERE id = 1")
-                await conn.execute(f"UPDATE property_statistics SET {param_name} = {param_name} + 1 WHERE property_id = {property_id}")
+                async with self.pool.acquire() as conn:
+                    async with conn.transaction():
+                        await conn.execute("""
+                            UPDATE property_statistics AS ps
+                            SET views = ps.views + d.views,
+                                likes = ps.likes + d.likes,
+                                favorites = ps.favorites + d.favorites
+                            FROM unnest($1::int[], $2::bigint[], $3::bigint[], $4::bigint[])
+                                AS d(property_id, views, likes, favorites)
+                            WHERE ps.property_id = d.property_id
+                        """, property_ids, *columns)
+                        await conn.execute("""
+                            INSERT INTO user_statistics_shards (shard_id, views, likes, favorites)
+                            VALUES ($1, $2, $3, $4)
+                            ON CONFLICT (shard_id) DO UPDATE
+                            SET views = user_statistics_shards.views + EXCLUDED.views,
+                                likes = user_statistics_shards.likes + EXCLUDED.likes,
+                                favorites = user_statistics_shards.favorites + EXCLUDED.favorites
+                        """, self.statistics_buffer.pick_shard(), *totals)
+                self.statistics_buffer.commit()
+                logger.info("Flushed statistics for %s properties", len(property_ids))
             except Exception as e:
-                logger.exception(f"Failed to add property to favorites: {e}")
-                raise
+                self.statistics_buffer.restore(pending, totals)
+                logger.exception("Failed to flush statistics: %s", e)
+
+    async def run_statistics_flusher(self, interval: float = STATISTICS_FLUSH_INTERVAL):
+        while True:
+            await asyncio.sleep(interval)
+            await self.flush_statistics()
+
+    def start_statistics_flusher(self):
+        if self._statistics_flusher is None:
+            self._statistics_flusher = asyncio.create_task(self.run_statistics_flusher())
+
+    async def stop_statistics_flusher(self):
+        if self._statistics_flusher is not None:
+            self._statistics_flusher.cancel()
+            try:
+                await self._statistics_flusher
+            except asyncio.CancelledError:
+                pass
+            self._statistics_flusher = None
+        await self.flush_statistics()
 
     # ------------------ Admin Functions ------------------
 
     async def is_admin(self, telegram_id: int) -> bool:
+        # Один запрос вместо check_user + SELECT: пользователь создается, если его еще нет
         async with self.pool.acquire() as conn:
             try:
-                await self.check_user(conn, telegram_id)
-                result = await conn.fetchrow("SELECT is_admin FROM users WHERE telegram_id = $1", telegram_id)
-
-                if not result:
-                    result = False
+                result = await conn.fetchval("""
+                    WITH existing AS (
+                        SELECT is_admin FROM users WHERE telegram_id = $1
+                    ), inserted AS (
+                        INSERT INTO users (telegram_id)
+                        SELECT $1 WHERE NOT EXISTS (SELECT 1 FROM existing)
+                        ON CONFLICT (telegram_id) DO NOTHING
+                        RETURNING is_admin
+                    )
+                    SELECT is_admin FROM existing
+                    UNION ALL
+                    SELECT is_admin FROM inserted
+                """, telegram_id)
 
-                return bool(result["is_admin"])
+                return bool(result)
             except Exception as e:
-                logger.exception(f"Failed to check admin status: {e}")
+                logger.exception("Failed to check admin status: %s", e)
                 raise
 
-    async def register_admin(self, telegram_id: int):
+    async def get_admins(self) -> Dict:
         async with self.pool.acquire() as conn:
             try:
-                result = await conn.fetchrow("SELECT * FROM users WHERE telegram_id = $1", telegram_id)
-
-                if not result:
-                    await conn.execute("INSERT INTO users (telegram_id, is_admin) VALUES ($1, TRUE)", telegram_id)
-                    logger.info(f"Admin with telegram_id {telegram_id} added to the database")
-                else:
-                    await conn.execute("UPDATE users SET is_admin = TRUE WHERE telegram_id = $1", telegram_id)
-                    logger.info(f"Admin with telegram_id {telegram_id} already exists in the database")
-
+                async with conn.transaction(isolation="repeatable_read", readonly=True):
+                    version = await conn.fetchval("SELECT version FROM admin_state WHERE id = 1") or 0
+                    rows = await conn.fetch("SELECT telegram_id FROM users WHERE is_admin = TRUE")
+                self.admin_version = max(self.admin_version, version)
+                return {"admins": [row["telegram_id"] for row in rows], "version": version}
             except Exception as e:
-                logger.exception(f"Failed to register admin: {e}")
+                logger.exception("Failed to get admins: %s", e)
                 raise
 
-    async def unregister_admin(self, telegram_id: int):
+    async def _set_admin(self, telegram_id: int, is_admin: bool):
         async with self.pool.acquire() as conn:
-            try:
-                result = await conn.fetchrow("SELECT * FROM users WHERE telegram_id = $1", telegram_id)
-
-                if not result:
-                    logger.info(f"Admin with telegram_id {telegram_id} not found in the database")
+            async with conn.transaction():
+                if is_admin:
+                    changed = await conn.fetchval("""
+                        INSERT INTO users (telegram_id, is_admin) VALUES ($1, TRUE)
+                        ON CONFLICT (telegram_id) DO UPDATE SET is_admin = TRUE
+                        WHERE users.is_admin IS DISTINCT FROM TRUE
+                        RETURNING 1
+                    """, telegram_id)
                 else:
-                    await conn.execute("UPDATE users SET is_admin = FALSE WHERE telegram_id = $1", telegram_id)
-                    logger.info(f"Admin with telegram_id {telegram_id} removed from the database")
+                    changed = await conn.fetchval(
+                        "UPDATE users SET is_admin = FALSE WHERE telegram_id = $1 AND is_admin RETURNING 1",
+                        telegram_id,
+                    )
+                if not changed:
+                    return False
 
-            except Exception as e:
-                logger.exception(f"Failed to unregister admin: {e}")
-                raise
+                version = await conn.fetchval("""
+                    INSERT INTO admin_state (id, version) VALUES (1, 1)
+                    ON CONFLICT (id) DO UPDATE SET version = admin_state.version + 1
+                    RETURNING version
+                """)
+                await conn.execute("SELECT pg_notify($1, $2)", ADMINS_CHANNEL, str(version))
+
+        self.admin_version = max(self.admin_version, version)
+        return True
+
+    async def register_admin(self, telegram_id: int):
+        try:
+            if await self._set_admin(telegram_id, True):
+                logger.info("Admin with telegram_id %s registered", telegram_id)
+            else:
+                logger.info("Admin with telegram_id %s already exists in the database", telegram_id)
+        except Exception as e:
+            logger.exception("Failed to register admin: %s", e)
+            raise
+
+    async def unregister_admin(self, telegram_id: int):
+        try:
+            if await self._set_admin(telegram_id, False):
+                logger.info("Admin with telegram_id %s removed from the database", telegram_id)
+            else:
+                logger.info("Admin with telegram_id %s not found in the database", telegram_id)
+        except Exception as e:
+            logger.exception("Failed to unregister admin: %s", e)
+            raise
 
     async def get_filters_for_property(self, property):
+        if self.filter_index_loaded:
+            return self.filter_index.match_telegram_ids(property)
+
         async with self.pool.acquire() as conn:
             query = """
             SELECT telegram_id 
@@ -485,41 +659,147 @@ class SqlDatabaseManager:
                     RETURNING id
                 """
 
-                values = (
-                    property_data.return_contact,
-                    property_data.property_type,
-                    property_data.deal_type,
-                    property_data.price,
-                    property_data.city,
-                    property_data.area,
-                    property_data.street,
-                    property_data.house_number,
-                    property_data.apartment_number,
-                    property_data.rooms,
-                    property_data.balcony,
-                    property_data.renovated,
-                    property_data.total_area,
-                    property_data.floor,
-                    property_data.total_floors,
-                    property_data.deposit,
-                    property_data.description,
-                )
+                values = property_values(property_data)
 
                 property_id = await conn.fetchval(query, *values)
                 await conn.execute("INSERT INTO property_statistics (property_id) VALUES ($1)", property_id)
                 return property_id
 
             except Exception as e:
-                logger.exception(f"Failed to add new property: {e}")
+                logger.exception("Failed to add new property: %s", e)
+                raise
+
+    async def _copy_properties(self, conn, properties) -> List[int]:
+        # id берутся из последовательности заранее, чтобы COPY не терял соответствие строк и id
+        ids = [
+            row["id"] for row in await conn.fetch(
+                "SELECT nextval(pg_get_serial_sequence('properties', 'id')) AS id FROM generate_series(1, $1)",
+                len(properties),
+            )
+        ]
+        await conn.copy_records_to_table(
+            "properties",
+            records=[(property_id,) + property_values(property_data) for property_id, property_data in zip(ids, properties)],
+            columns=("id",) + PROPERTY_COLUMNS,
+        )
+        await conn.copy_records_to_table(
+            "property_statistics", records=[(property_id,) for property_id in ids], columns=("property_id",),
+        )
+        return ids
+
+    async def add_properties(self, properties) -> List[Dict]:
+        """Добавляет объявления одной транзакцией.
+
+        Сначала все строки копируются одним COPY. Если какая-то строка нарушает
+        ограничения таблицы, строки вставляются по одной в точках сохранения,
+        и для каждой возвращается либо id, либо текст ошибки.
+        """
+        if not properties:
+            return []
+        async with self.pool.acquire() as conn:
+            async with conn.transaction():
+                try:
+                    async with conn.transaction():
+                        ids = await self._copy_properties(conn, properties)
+                    return [{"property_id": property_id, "error": None} for property_id in ids]
+                except COPY_ROW_ERRORS as e:
+                    logger.warning("Bulk insert of %s properties failed, retrying row by row: %s", len(properties), e)
+
+                results = []
+                for property_data in properties:
+                    try:
+                        async with conn.transaction():
+                            property_id = (await self._copy_properties(conn, [property_data]))[0]
+                        results.append({"property_id": property_id, "error": None})
+                    except COPY_ROW_ERRORS as e:
+                        results.append({"property_id": None, "error": str(e)})
+                return results
+
+    async def get_filters_for_properties(self, properties) -> List[List[Dict]]:
+        if self.filter_index_loaded:
+            return self.filter_index.match_telegram_ids_many(properties)
+        return [await self.get_filters_for_property(property) for property in properties]
+
+    async def acquire_blobs(self, blobs: List[Tuple[str, str, int]]):
+        """Увеличивает счетчики ссылок на блобы (sha256, path, size), создавая недостающие"""
+        sha256s, paths, sizes = (list(column) for column in zip(*blobs))
+        async with self.pool.acquire() as conn:
+            try:
+                # Строки блокируются в порядке sha256, чтобы параллельные загрузки не взаимоблокировались
+                await conn.execute("""
+                    INSERT INTO photo_blobs (sha256, path, size, refcount)
+                    SELECT sha256, min(path), min(size), count(*)
+                    FROM unnest($1::text[], $2::text[], $3::bigint[]) AS b(sha256, path, size)
+                    GROUP BY sha256
+                    ORDER BY sha256
+                    ON CONFLICT (sha256) DO UPDATE
+                    SET refcount = photo_blobs.refcount + EXCLUDED.refcount, released_at = NULL
+                """, sha256s, paths, sizes)
+            except Exception as e:
+                logger.exception("Failed to acquire blobs: %s", e)
+                raise
+
+    async def _release_blobs(self, conn, sha256s: List[str]):
+        await conn.execute("""
+            UPDATE photo_blobs AS b
+            SET refcount = b.refcount - d.count,
+                released_at = CASE WHEN b.refcount - d.count <= 0 THEN NOW() ELSE b.released_at END
+            FROM (
+                SELECT sha256, count(*) AS count FROM unnest($1::text[]) AS sha256 GROUP BY sha256
+            ) AS d
+            WHERE b.sha256 = d.sha256
+        """, sha256s)
+
+    async def release_blobs(self, sha256s: List[str]):
+        async with self.pool.acquire() as conn:
+            try:
+                await self._release_blobs(conn, sha256s)
+            except Exception as e:
+                logger.exception("Failed to release blobs: %s", e)
+                raise
+
+    async def collect_blobs(self, remove: Callable[[List[str]], Awaitable], grace: float, limit: int) -> int:
+        """Удаляет до limit блобов, на которые никто не ссылается дольше grace секунд.
+
+        Файлы удаляются до фиксации транзакции, под блокировкой строк: загрузка
+        того же содержимого ждет ее окончания и затем записывает файл заново.
+        """
+        async with self.pool.acquire() as conn:
+            try:
+                async with conn.transaction():
+                    rows = await conn.fetch("""
+                        DELETE FROM photo_blobs
+                        WHERE sha256 IN (
+                            SELECT sha256
+                            FROM photo_blobs
+                            WHERE refcount <= 0 AND released_at < NOW() - make_interval(secs => $1)
+                            ORDER BY released_at
+                            LIMIT $2
+                            FOR UPDATE SKIP LOCKED
+                        )
+                        RETURNING path
+                    """, float(grace), limit)
+                    if rows:
+                        await remove([row["path"] for row in rows])
+                return len(rows)
+            except Exception as e:
+                logger.exception("Failed to collect blobs: %s", e)
                 raise
 
-    async def upload_image(self, path: str, property_id: int):
+    async def upload_images(self, blobs: List[Tuple[str, str, int]], property_id: int):
+        """Добавляет фотографии объявлению. Ссылки на блобы уже взяты acquire_blobs"""
         async with self.pool.acquire() as conn:
             try:
-                await conn.execute("INSERT INTO property_photos (photo_path, property_id) VALUES ($1, $2)", path, property_id)
-                logger.info(f"Added image {path} for property_id: {property_id}")
+                # Порядок id совпадает с порядком фотографий: по нему выбирается photo_num
+                await conn.execute("""
+                    INSERT INTO property_photos (photo_path, blob_sha256, property_id)
+                    SELECT photo_path, blob_sha256, $3
+                    FROM unnest($1::text[], $2::text[]) WITH ORDINALITY AS p(photo_path, blob_sha256, num)
+                    ORDER BY num
+                """, [blob[1] for blob in blobs], [blob[0] for blob in blobs], property_id)
+                logger.info("Added %s images for property_id: %s", len(blobs), property_id)
             except Exception as e:
-                logger.exception(f"Failed to add image: {e}")
+                logger.exception("Failed to add images: %s", e)
                 raise
 
     async def get_property_details(self, property_id: int):
@@ -539,9 +819,55 @@ class SqlDatabaseManager:
                     else:
                         return None
                 except Exception as e:
-                    logger.exception(f"Failed to add new property: {e}")
+                    logger.exception("Failed to add new property: %s", e)
                     raise
 
+    async def get_property_card(self, property_id: int, viewer: Optional[int] = None):
+        async with self.pool.acquire() as conn:
+            try:
+                async with conn.transaction(isolation="repeatable_read", readonly=True):
+                    row = await conn.fetchrow("""
+                        SELECT id, state, return_contact, description, property_type, deal_type, price, city, area, street,
+                            house_number, apartment_number, rooms, balcony, renovated, total_area, floor, total_floors, deposit,
+                            created_at, updated_at
+                        FROM properties
+                        WHERE id = $1
+                    """, property_id)
+                    if not row:
+                        return None
+
+                    photos = await conn.fetch(
+                        "SELECT id, photo_path FROM property_photos WHERE property_id = $1 ORDER BY id",
+                        property_id,
+                    )
+                    statistics = await conn.fetchrow(
+                        "SELECT views, favorites, likes FROM property_statistics WHERE property_id = $1",
+                        property_id,
+                    )
+                    viewer_is_admin = False
+                    if viewer is not None:
+                        viewer_is_admin = bool(await conn.fetchval(
+                            "SELECT is_admin FROM users WHERE telegram_id = $1", viewer
+                        ))
+            except Exception as e:
+                logger.exception("Failed to get property card %s: %s", property_id, e)
+                raise
+
+        pending = self.statistics_buffer.pending_for(property_id)
+        return {
+            "property": dict(row),
+            "photos": [
+                {"num": num, "id": photo["id"], "path": photo["photo_path"]}
+                for num, photo in enumerate(photos)
+            ],
+            "statistics": {
+                "views": (statistics["views"] if statistics else 0) + pending["views"],
+                "favorites": (statistics["favorites"] if statistics else 0) + pending["favorites"],
+                "likes": (statistics["likes"] if statistics else 0) + pending["likes"],
+            },
+            "viewer_is_admin": viewer_is_admin,
+        }
+
     async def get_property_photos_count(self, property_id: int):
             async with self.pool.acquire() as conn:
                 try:
@@ -555,7 +881,7 @@ class SqlDatabaseManager:
 
                     return result
                 except Exception as e:
-                    logger.exception(f"Failed to get photos count: {e}")
+                    logger.exception("Failed to get photos count: %s", e)
                     raise
 
     async def get_property_photo_path(self, property_id: int, photo_num: int):
@@ -571,9 +897,9 @@ class SqlDatabaseManager:
                     """
                     result = await conn.fetchrow(query, property_id, photo_num)
 
-                    return result['photo_path']
+                    return result['photo_path'] if result else None
                 except Exception as e:
-                    logger.exception(f"Failed to add new property: {e}")
+                    logger.exception("Failed to add new property: %s", e)
                     raise
 
     async def get_properties(self, offset: int, limit: int):
@@ -588,30 +914,75 @@ class SqlDatabaseManager:
                 properties = await conn.fetch(query, offset, limit)
                 return [property for property in properties]
             except Exception as e:
-                logger.exception(f"Failed to get properties: {e}")
+                logger.exception("Failed to get properties: %s", e)
                 raise
 
-    async def delete_property(self, property_id: int):
+    async def get_properties_page(self, cursor: Optional[str], limit: int) -> Dict:
+        """Новые объявления первыми. Курсор - (created_at, id) последней строки страницы"""
+        after = decode_cursor(cursor, 2)
         async with self.pool.acquire() as conn:
             try:
-                await conn.execute("DELETE FROM property_photos WHERE property_id = $1", property_id)
-                await conn.execute("DELETE FROM user_favorites WHERE property_id = $1", property_id)
-                await conn.execute("DELETE FROM property_statistics WHERE property_id = $1", property_id)
-                await conn.execute("DELETE FROM properties WHERE id = $1", property_id)
+                if after is None:
+                    rows = await conn.fetch("""
+                        SELECT id, created_at
+                        FROM properties
+                        ORDER BY created_at DESC, id DESC
+                        LIMIT $1
+                    """, limit + 1)
+                else:
+                    rows = await conn.fetch("""
+                        SELECT id, created_at
+                        FROM properties
+                        WHERE (created_at, id) < ($1, $2)
+                        ORDER BY created_at DESC, id DESC
+                        LIMIT $3
+                    """, int_to_timestamp(after[0]), after[1], limit + 1)
+            except Exception as e:
+                logger.exception("Failed to get properties page: %s", e)
+                raise
 
-                logger.info(f"Deleted property {property_id}")
+        page = rows[:limit]
+        next_cursor = None
+        if len(rows) > limit:
+            last = page[-1]
+            next_cursor = encode_cursor(timestamp_to_int(last["created_at"]), last["id"])
+        return {"properties": [{"id": row["id"]} for row in page], "next_cursor": next_cursor}
+
+    async def delete_property(self, property_id: int) -> List[str]:
+        """Удаляет объявление и отпускает его блобы. Возвращает пути фотографий,
+        загруженных до хранилища блобов: их файлы удаляет вызывающий
+        """
+        async with self.pool.acquire() as conn:
+            try:
+                async with conn.transaction():
+                    photos = await conn.fetch(
+                        "DELETE FROM property_photos WHERE property_id = $1 RETURNING photo_path, blob_sha256",
+                        property_id,
+                    )
+                    sha256s = [photo["blob_sha256"] for photo in photos if photo["blob_sha256"]]
+                    if sha256s:
+                        await self._release_blobs(conn, sha256s)
+                    await conn.execute("DELETE FROM user_favorites WHERE property_id = $1", property_id)
+                    await conn.execute("DELETE FROM property_statistics WHERE property_id = $1", property_id)
+                    await conn.execute("DELETE FROM properties WHERE id = $1", property_id)
+                self.statistics_buffer.discard(property_id)
+
+                logger.info("Deleted property %s", property_id)
+                return [photo["photo_path"] for photo in photos if not photo["blob_sha256"]]
             except Exception as e:
-                logger.exception(f"Failed to delete property {property_id}: {e}")
+                logger.exception("Failed to delete property %s: %s", property_id, e)
                 raise
 
     async def change_property_state(self, property_id: int, new_state: str):
         async with self.pool.acquire() as conn:
             try:
                 await conn.execute("UPDATE properties SET state = $1 WHERE id = $2", new_state, property_id)
+                # Объект мог снова стать активным: он уже позади курсоров просмотра
+                self.search_sessions.properties_changed()
 
-                logger.info(f"Changed property state {property_id}")
+                logger.info("Changed property state %s", property_id)
             except Exception as e:
-                logger.exception(f"Failed to change property state {property_id}: {e}")
+                logger.exception("Failed to change property state %s: %s", property_id, e)
                 raise
 
     async def get_property_statistics(self, property_id):
@@ -623,31 +994,40 @@ class SqlDatabaseManager:
                     WHERE property_id = $1
                 """
                 statistics = await conn.fetchrow(query, property_id)
+                pending = self.statistics_buffer.pending_for(property_id)
                 result_dict = {
-                    "views": statistics[0],
-                    "favorites": statistics[1],
-                    "likes": statistics[2],
+                    "views": statistics[0] + pending["views"],
+                    "favorites": statistics[1] + pending["favorites"],
+                    "likes": statistics[2] + pending["likes"],
                 }
                 return result_dict
             except Exception as e:
-                logger.exception(f"Failed to get properties: {e}")
+                logger.exception("Failed to get properties: %s", e)
                 raise
 
     async def get_statistics(self):
         async with self.pool.acquire() as conn:
             try:
                 query = """
-                    SELECT views, favorites, likes
-                    FROM user_statistics WHERE id = 1
+                    SELECT COALESCE(SUM(views), 0), COALESCE(SUM(favorites), 0), COALESCE(SUM(likes), 0)
+                    FROM (
+                        SELECT views, favorites, likes FROM user_statistics WHERE id = 1
+                        UNION ALL
+                        SELECT views, favorites, likes FROM user_statistics_shards
+                    ) AS statistics
                 """
                 statistics = await conn.fetchrow(query)
+                pending = self.statistics_buffer.pending_totals()
                 result_dict = {
-                    "views": statistics[0],
-                    "favorites": statistics[1],
-                    "likes": statistics[2],
+                    "views": statistics[0] + pending["views"],
+                    "favorites": statistics[1] + pending["favorites"],
+                    "likes": statistics[2] + pending["likes"],
                 }
                 return result_dict
             except Exception as e:
-                logger.exception(f"Failed to get statistics: {e}")
+                logger.exception("Failed to get statistics: %s", e)
                 raise
 
+# Время каждого публичного метода и строки его запросов видны в /metrics.
+# Методы жизненного цикла не меряются: фоновый сброс статистики работает бесконечно
+meter_methods(SqlDatabaseManager, exclude=("connect", "disconnect", "run_statistics_flusher", "stop_statistics_flusher"))
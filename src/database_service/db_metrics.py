@@ -0,0 +1,132 @@
+import contextvars
+import functools
+import inspect
+import time
+
+import asyncpg
+
+from src.metrics import REGISTRY
+
+DB_METHOD_SECONDS = REGISTRY.histogram(
+    "database_service_db_method_duration_seconds", "SqlDatabaseManager method latency", ("method",),
+)
+DB_QUERIES = REGISTRY.counter(
+    "database_service_db_queries_total", "Queries issued by SqlDatabaseManager methods", ("method",),
+)
+DB_ROWS = REGISTRY.counter(
+    "database_service_db_rows_total", "Rows returned or affected by SqlDatabaseManager queries", ("method",),
+)
+DB_POOL_SIZE = REGISTRY.gauge("database_service_db_pool_size", "Open connections in the asyncpg pool")
+DB_POOL_IDLE = REGISTRY.gauge("database_service_db_pool_idle", "Idle connections in the asyncpg pool")
+DB_POOL_MAX = REGISTRY.gauge("database_service_db_pool_max_size", "Maximum size of the asyncpg pool")
+DB_POOL_WAITING = REGISTRY.gauge("database_service_db_pool_waiting", "Coroutines waiting for a pool connection")
+
+# Метод менеджера, от имени которого идут запросы: строки запросов засчитываются ему
+current_method: contextvars.ContextVar[str] = contextvars.ContextVar("db_method", default="other")
+
+
+def _count(rows: int):
+    method = current_method.get()
+    DB_QUERIES.labels(method).inc()
+    if rows:
+        DB_ROWS.labels(method).inc(rows)
+
+
+def _status_rows(status) -> int:
+    # "INSERT 0 5", "UPDATE 3", "COPY 100"
+    count = status.rsplit(" ", 1)[-1] if isinstance(status, str) else ""
+    return int(count) if count.isdigit() else 0
+
+
+class MeteredConnection(asyncpg.Connection):
+    """Соединение пула, которое считает запросы и строки"""
+
+    async def fetch(self, query, *args, **kwargs):
+        rows = await super().fetch(query, *args, **kwargs)
+        _count(len(rows))
+        return rows
+
+    async def fetchrow(self, query, *args, **kwargs):
+        row = await super().fetchrow(query, *args, **kwargs)
+        _count(row is not None)
+        return row
+
+    async def fetchval(self, query, *args, **kwargs):
+        value = await super().fetchval(query, *args, **kwargs)
+        _count(value is not None)
+        return value
+
+    async def execute(self, query, *args, **kwargs):
+        status = await super().execute(query, *args, **kwargs)
+        _count(_status_rows(status))
+        return status
+
+    async def copy_records_to_table(self, table_name, **kwargs):
+        status = await super().copy_records_to_table(table_name, **kwargs)
+        _count(_status_rows(status))
+        return status
+
+
+class _MeteredAcquire:
+    __slots__ = ("_pool", "_timeout", "_conn")
+
+    def __init__(self, pool: "MeteredPool", timeout):
+        self._pool = pool
+        self._timeout = timeout
+        self._conn = None
+
+    async def __aenter__(self):
+        self._pool.waiting += 1
+        try:
+            self._conn = await self._pool._pool.acquire(timeout=self._timeout)
+        finally:
+            self._pool.waiting -= 1
+        return self._conn
+
+    async def __aexit__(self, *exc):
+        await self._pool._pool.release(self._conn)
+
+
+class MeteredPool:
+    """Пул asyncpg, который знает, сколько корутин ждут соединения"""
+
+    def __init__(self, pool: asyncpg.Pool):
+        self._pool = pool
+        self.waiting = 0
+
+    def __getattr__(self, name):
+        return getattr(self._pool, name)
+
+    def acquire(self, *, timeout=None) -> _MeteredAcquire:
+        return _MeteredAcquire(self, timeout)
+
+
+def register_pool_gauges(pool: MeteredPool):
+    DB_POOL_SIZE.set_function(pool.get_size)
+    DB_POOL_IDLE.set_function(pool.get_idle_size)
+    DB_POOL_MAX.set_function(pool.get_max_size)
+    DB_POOL_WAITING.set_function(lambda: pool.waiting)
+
+
+def metered(method):
+    name = method.__name__
+
+    @functools.wraps(method)
+    async def wrapper(*args, **kwargs):
+        token = current_method.set(name)
+        start = time.perf_counter()
+        try:
+            return await method(*args, **kwargs)
+        finally:
+            DB_METHOD_SECONDS.labels(name).observe(time.perf_counter() - start)
+            current_method.reset(token)
+
+    return wrapper
+
+
+def meter_methods(cls, exclude=()):
+    """Оборачивает все публичные корутины класса в metered"""
+    for name, method in list(vars(cls).items()):
+        if not name.startswith("_") and name not in exclude and inspect.iscoroutinefunction(method):
+            setattr(cls, name, metered(method))
+    return cls
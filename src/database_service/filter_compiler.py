@@ -0,0 +1,121 @@
+import json
+import os
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+FILTER_PLAN_CACHE_SIZE = int(os.getenv("FILTER_PLAN_CACHE_SIZE", "10000"))
+
+ACTIVE_STATE = "Активно"
+
+# (колонка объявления, колонка фильтра, оператор) в порядке параметров запроса
+COMPARISONS = (
+    ("price", "min_price", ">="), ("price", "max_price", "<="),
+    ("rooms", "min_rooms", ">="), ("rooms", "max_rooms", "<="),
+    ("total_area", "min_total_area", ">="), ("total_area", "max_total_area", "<="),
+    ("balcony", "balcony", "="),
+    ("renovated", "renovated", "="),
+    ("deposit", "min_deposit", ">="), ("deposit", "max_deposit", "<="),
+    ("floor", "floor", "="), ("total_floors", "total_floors", "="),
+)
+
+
+class CompiledFilter:
+    """Готовый поиск по фильтру: текст запросов и параметры.
+
+    Текст зависит только от набора заданных условий, а не от значений,
+    поэтому фильтры одной формы разделяют подготовленный asyncpg запрос
+    в кэше каждого соединения.
+    """
+
+    __slots__ = ("filter_id", "telegram_id", "params", "next_sql", "behind_sql")
+
+    def __init__(self, filter_id: int, telegram_id: int, params: Tuple, next_sql: str, behind_sql: str):
+        self.filter_id = filter_id
+        self.telegram_id = telegram_id
+        self.params = params
+        self.next_sql = next_sql
+        self.behind_sql = behind_sql
+
+
+def build_property_search(filter_data) -> Tuple[str, list]:
+    where_clauses = ["state = $1"]
+    params = [ACTIVE_STATE]
+
+    for column in ("property_type", "deal_type", "city"):
+        where_clauses.append(f"{column} = ${len(params) + 1}")
+        params.append(filter_data[column])
+
+    areas = filter_data["areas"]
+    if isinstance(areas, str):
+        areas = json.loads(areas)
+    if areas:
+        where_clauses.append(f"area = ANY(${len(params) + 1})")
+        params.append(list(areas))
+
+    for column, filter_column, operator in COMPARISONS:
+        value = filter_data[filter_column]
+        # Пустая строка в renovated означает "не важно", как и None
+        if value is None or (filter_column == "renovated" and not value):
+            continue
+        where_clauses.append(f"{column} {operator} ${len(params) + 1}")
+        params.append(value)
+
+    return " AND ".join(where_clauses), params
+
+
+def compile_filter(filter_id: int, filter_data) -> CompiledFilter:
+    where_clause, params = build_property_search(filter_data)
+    cursor_param = len(params) + 1
+    # Следующий по id объект после курсора: диапазонный проход по первичному ключу
+    next_sql = f"""
+        SELECT id
+        FROM properties
+        WHERE {where_clause} AND id > ${cursor_param}
+        ORDER BY id
+        LIMIT 1
+    """
+    # Курсор дошел до конца: непоказанные объекты позади него, например снова ставшие активными
+    behind_sql = f"""
+        SELECT id
+        FROM properties
+        WHERE {where_clause} AND id <= ${cursor_param} AND NOT (id = ANY(${cursor_param + 1}::int[]))
+        ORDER BY id
+        LIMIT 1
+    """
+    return CompiledFilter(filter_id, filter_data["telegram_id"], tuple(params), next_sql, behind_sql)
+
+
+class FilterPlanCache:
+    """Скомпилированные фильтры по filter_id, вытесняются давно не использованные"""
+
+    def __init__(self, max_size: int = FILTER_PLAN_CACHE_SIZE):
+        self.max_size = max_size
+        self._plans: "OrderedDict[int, CompiledFilter]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        # Растет при каждой инвалидации: план, собранный до изменения фильтра, не кэшируется
+        self.generation = 0
+
+    def __len__(self):
+        return len(self._plans)
+
+    def get(self, filter_id: int) -> Optional[CompiledFilter]:
+        compiled = self._plans.get(filter_id)
+        if compiled is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._plans.move_to_end(filter_id)
+        return compiled
+
+    def put(self, compiled: CompiledFilter, generation: Optional[int] = None):
+        if generation is not None and generation != self.generation:
+            return
+        self._plans[compiled.filter_id] = compiled
+        self._plans.move_to_end(compiled.filter_id)
+        if len(self._plans) > self.max_size:
+            self._plans.popitem(last=False)
+
+    def invalidate(self, filter_id: int):
+        self.generation += 1
+        self._plans.pop(filter_id, None)
@@ -0,0 +1,252 @@
+import json
+import logging
+from bisect import bisect_left, bisect_right, insort
+from itertools import product
+from typing import Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# (поле объекта, нижняя граница фильтра, верхняя граница фильтра)
+RANGE_FIELDS = (
+    ("price", "min_price", "max_price"),
+    ("rooms", "min_rooms", "max_rooms"),
+    ("total_area", "min_total_area", "max_total_area"),
+    ("deposit", "min_deposit", "max_deposit"),
+)
+
+_INF = float("inf")
+
+
+def _parse_areas(raw) -> Optional[frozenset]:
+    if raw is None:
+        return None
+    if isinstance(raw, str):
+        try:
+            raw = json.loads(raw)
+        except ValueError:
+            return frozenset()
+    if isinstance(raw, list):
+        return frozenset(element for element in raw if isinstance(element, str))
+    if isinstance(raw, str):
+        return frozenset([raw])
+    return frozenset()
+
+
+class IndexedFilter:
+    __slots__ = (
+        "filter_id", "telegram_id", "key", "areas", "ranges",
+        "balcony", "renovated", "floor", "total_floors",
+    )
+
+    def __init__(self, row):
+        self.filter_id = row["id"]
+        self.telegram_id = row["telegram_id"]
+        self.key = (row["city"], row["property_type"], row["deal_type"])
+        self.areas = _parse_areas(row["areas"])
+        # Диапазон учитывается только если заданы обе границы, как и в SQL версии
+        self.ranges = tuple(
+            (row[low], row[high]) if row[low] is not None and row[high] is not None else None
+            for _, low, high in RANGE_FIELDS
+        )
+        self.balcony = row["balcony"]
+        self.renovated = row["renovated"]
+        self.floor = row["floor"]
+        self.total_floors = row["total_floors"]
+
+    def matches(self, property, values: Tuple) -> bool:
+        if property.area and self.areas is not None and property.area not in self.areas:
+            return False
+
+        for value, bounds in zip(values, self.ranges):
+            if value is not None and bounds is not None and not (bounds[0] <= value <= bounds[1]):
+                return False
+
+        if property.balcony is not None and self.balcony is not None and self.balcony != property.balcony:
+            return False
+        if property.renovated and self.renovated is not None and self.renovated != property.renovated:
+            return False
+        if property.floor is not None and self.floor is not None and self.floor != property.floor:
+            return False
+        if property.total_floors is not None and self.total_floors is not None and self.total_floors != property.total_floors:
+            return False
+
+        return True
+
+
+class _RangeIndex:
+    def __init__(self):
+        self.lows: List[Tuple] = []
+        self.highs: List[Tuple] = []
+        self.unbounded = set()
+
+    def add(self, filter_id: int, bounds, keep_sorted: bool = True):
+        if bounds is None:
+            self.unbounded.add(filter_id)
+        elif keep_sorted:
+            insort(self.lows, (bounds[0], filter_id))
+            insort(self.highs, (bounds[1], filter_id))
+        else:
+            self.lows.append((bounds[0], filter_id))
+            self.highs.append((bounds[1], filter_id))
+
+    def sort(self):
+        self.lows.sort()
+        self.highs.sort()
+
+    def remove(self, filter_id: int, bounds):
+        if bounds is None:
+            self.unbounded.discard(filter_id)
+            return
+        for items, item in ((self.lows, (bounds[0], filter_id)), (self.highs, (bounds[1], filter_id))):
+            index = bisect_left(items, item)
+            if index < len(items) and items[index] == item:
+                del items[index]
+
+    def stab(self, value) -> Tuple[int, Iterable[int]]:
+        """Возвращает оценку и кандидатов, чей диапазон может содержать value"""
+        below = bisect_right(self.lows, (value, _INF))
+        above = len(self.highs) - bisect_left(self.highs, (value, -_INF))
+        if below <= above:
+            candidates = (filter_id for _, filter_id in self.lows[:below])
+            cost = below
+        else:
+            candidates = (filter_id for _, filter_id in self.highs[len(self.highs) - above:])
+            cost = above
+        return cost + len(self.unbounded), candidates
+
+
+class _FilterBucket:
+    def __init__(self):
+        self.filters: Dict[int, IndexedFilter] = {}
+        self.ranges = tuple(_RangeIndex() for _ in RANGE_FIELDS)
+
+    def add(self, indexed: IndexedFilter, keep_sorted: bool = True):
+        self.filters[indexed.filter_id] = indexed
+        for range_index, bounds in zip(self.ranges, indexed.ranges):
+            range_index.add(indexed.filter_id, bounds, keep_sorted)
+
+    def sort(self):
+        for range_index in self.ranges:
+            range_index.sort()
+
+    def remove(self, indexed: IndexedFilter):
+        self.filters.pop(indexed.filter_id, None)
+        for range_index, bounds in zip(self.ranges, indexed.ranges):
+            range_index.remove(indexed.filter_id, bounds)
+
+    def candidates(self, values: Tuple) -> Iterable[int]:
+        best_cost = len(self.filters)
+        best = None
+        for range_index, value in zip(self.ranges, values):
+            if value is None:
+                continue
+            cost, candidates = range_index.stab(value)
+            if cost < best_cost:
+                best_cost = cost
+                best = (candidates, range_index.unbounded)
+        if best is None:
+            return self.filters.keys()
+        candidates, unbounded = best
+        return list(candidates) + list(unbounded)
+
+    def match(self, property, values: Tuple) -> List[IndexedFilter]:
+        filters = self.filters
+        result = []
+        for filter_id in self.candidates(values):
+            indexed = filters[filter_id]
+            if indexed.matches(property, values):
+                result.append(indexed)
+        return result
+
+
+class FilterIndex:
+    """Индекс активных фильтров для поиска подписчиков нового объявления.
+
+    Фильтры разложены по корзинам (city, property_type, deal_type), внутри корзины
+    для каждого числового диапазона хранятся отсортированные границы. Семантика
+    совпадает с SQL запросом get_filters_for_property.
+    """
+
+    def __init__(self):
+        self._buckets: Dict[Tuple, _FilterBucket] = {}
+        self._filters: Dict[int, IndexedFilter] = {}
+
+    def __len__(self):
+        return len(self._filters)
+
+    def rebuild(self, rows: Iterable):
+        self._buckets = {}
+        self._filters = {}
+        for row in rows:
+            if not row["is_active"] or row["id"] in self._filters:
+                continue
+            indexed = IndexedFilter(row)
+            self._bucket(indexed.key).add(indexed, keep_sorted=False)
+            self._filters[indexed.filter_id] = indexed
+        for bucket in self._buckets.values():
+            bucket.sort()
+        logger.info("Filter index rebuilt: %s active filters in %s buckets", len(self._filters), len(self._buckets))
+
+    def _bucket(self, key: Tuple) -> _FilterBucket:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = _FilterBucket()
+        return bucket
+
+    def upsert(self, row):
+        self.remove(row["id"])
+        if not row["is_active"]:
+            return
+        indexed = IndexedFilter(row)
+        self._bucket(indexed.key).add(indexed)
+        self._filters[indexed.filter_id] = indexed
+
+    def remove(self, filter_id: int):
+        indexed = self._filters.pop(filter_id, None)
+        if indexed is None:
+            return
+        bucket = self._buckets[indexed.key]
+        bucket.remove(indexed)
+        if not bucket.filters:
+            del self._buckets[indexed.key]
+
+    def _buckets_for(self, property) -> Iterable[_FilterBucket]:
+        key = (property.city, property.property_type, property.deal_type)
+        if all(key):
+            for candidate in product(*((value, None) for value in key)):
+                bucket = self._buckets.get(candidate)
+                if bucket is not None:
+                    yield bucket
+            return
+
+        for bucket_key, bucket in self._buckets.items():
+            if all(not value or bucket_value is None or bucket_value == value
+                   for value, bucket_value in zip(key, bucket_key)):
+                yield bucket
+
+    def match(self, property) -> List[IndexedFilter]:
+        values = tuple(getattr(property, field) for field, _, _ in RANGE_FIELDS)
+        result = []
+        for bucket in self._buckets_for(property):
+            result.extend(bucket.match(property, values))
+        return result
+
+    def match_telegram_ids(self, property) -> List[Dict]:
+        return [{"telegram_id": indexed.telegram_id} for indexed in self.match(property)]
+
+    def match_telegram_ids_many(self, properties) -> List[List[Dict]]:
+        """Подписчики для пачки объявлений за один проход: корзины ищутся один раз на ключ"""
+        buckets_by_key: Dict[Tuple, List[_FilterBucket]] = {}
+        result = []
+        for property in properties:
+            key = (property.city, property.property_type, property.deal_type)
+            buckets = buckets_by_key.get(key)
+            if buckets is None:
+                buckets = buckets_by_key[key] = list(self._buckets_for(property))
+            values = tuple(getattr(property, field) for field, _, _ in RANGE_FIELDS)
+            result.append([
+                {"telegram_id": indexed.telegram_id}
+                for bucket in buckets
+                for indexed in bucket.match(property, values)
+            ])
+        return result
@@ -0,0 +1,64 @@
+import asyncio
+import logging
+import os
+import shutil
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import BinaryIO, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+IMAGE_WRITE_WORKERS = int(os.getenv("IMAGE_WRITE_WORKERS", "4"))
+COPY_BUFFER_SIZE = 1024 * 1024
+
+_image_write_executor: Optional[ThreadPoolExecutor] = None
+
+
+def get_image_write_executor() -> ThreadPoolExecutor:
+    global _image_write_executor
+    if _image_write_executor is None:
+        _image_write_executor = ThreadPoolExecutor(max_workers=IMAGE_WRITE_WORKERS, thread_name_prefix="image-writer")
+    return _image_write_executor
+
+
+def _fsync_directory(directory: str):
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def write_files(files: List[Tuple[str, BinaryIO]]):
+    """Записывает файлы во временные, затем переименовывает все разом.
+
+    Каталог синхронизируется один раз на пачку, а не на каждый файл:
+    либо на диске оказываются все фотографии объявления, либо ни одной.
+    """
+    written = []
+    try:
+        for path, source in files:
+            # Уникальное имя: одинаковое содержимое может записываться двумя запросами сразу
+            tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+            written.append(tmp_path)
+            source.seek(0)
+            with open(tmp_path, "wb") as f:
+                shutil.copyfileobj(source, f, COPY_BUFFER_SIZE)
+                f.flush()
+                os.fsync(f.fileno())
+        for (path, _), tmp_path in zip(files, written):
+            os.replace(tmp_path, path)
+    except Exception:
+        for tmp_path in written:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        raise
+
+    for directory in {os.path.dirname(path) or "." for path, _ in files}:
+        _fsync_directory(directory)
+
+
+async def save_files(files: List[Tuple[str, BinaryIO]]):
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(get_image_write_executor(), write_files, files)
+    logger.info("Saved %s images", len(files))
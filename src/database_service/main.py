@@ -1,32 +1,60 @@
-from fastapi import FastAPI, HTTPException, Depends, UploadFile, File, status
+from fastapi import FastAPI, HTTPException, Depends, UploadFile, File, Request, status
 from fastapi.responses import StreamingResponse
-from pydantic import BaseModel
+from pydantic import BaseModel, ValidationError
 import uvicorn
+import asyncio
 import json
 import os
 import logging
-from typing import Optional, List
+from typing import Optional, List, Literal
 from dotenv import load_dotenv
 import uuid
 from typing import Annotated
 import os
 from io import BytesIO
+from email.utils import parsedate
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
 from fastapi.responses import FileResponse, Response
 
-from src.database_service.db_manager import get_database_manager, SqlDatabaseManager
+from src.database_service.db_manager import get_database_manager, SqlDatabaseManager, DATABASE_URL
 from src.database_service.create_tables import create_tables
+from src.logging_config import setup_logging
+from src.metrics import CONTENT_TYPE, REGISTRY, MetricsMiddleware
+from src.database_service.request_context import RequestContextMiddleware
+from src.database_service.statistics_buffer import STATISTICS_PARAMS
+from src.database_service.blob_store import remove_blob_files, run_blob_collector, store_images
+from src.database_service.photo_variants import ORIGINAL, PHOTO_FORMATS, PHOTO_SIZES, resolve_photo
 load_dotenv()
 
-LOG_FILE = os.path.join("logs", "database_service.log")
-
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    filename=LOG_FILE,
-)
+setup_logging("database_service")
 logger = logging.getLogger(__name__)
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    database_manager = SqlDatabaseManager(DATABASE_URL)
+    await database_manager.connect()
+    await database_manager.load_filter_index()
+    await database_manager.listen_admin_changes()
+    database_manager.start_statistics_flusher()
+    blob_collector = asyncio.create_task(run_blob_collector(database_manager))
+    app.state.database_manager = database_manager
+    try:
+        yield
+    finally:
+        blob_collector.cancel()
+        try:
+            await blob_collector
+        except asyncio.CancelledError:
+            pass
+        await database_manager.stop_statistics_flusher()
+        await database_manager.disconnect()
+
+app = FastAPI(lifespan=lifespan)
+
+app.add_middleware(RequestContextMiddleware)
+# Добавлен последним, поэтому внешний: время запроса включает остальные middleware
+app.add_middleware(MetricsMiddleware, prefix="database_service")
 
 class AddFilterRequest(BaseModel):
     telegram_id: int
@@ -75,9 +103,14 @@ class Property(BaseModel):
     deposit: Optional[int] = None
     description: Optional[str] = None
 
+class AddPropertiesRequest(BaseModel):
+    # Строки проверяются по одной, чтобы ошибка в одной не отклоняла всю пачку
+    properties: List[dict]
+
 class IncreaseStatistics(BaseModel):
     property_id: int
     param_name: str
+    count: int = 1
 
 # ---------------------- User Endpoints ------------------
 
@@ -96,7 +129,7 @@ async def create_filter(
 
         return {"status": "ok", "telegram_id": telegram_id}
     except Exception as e:
-        logger.exception(f"Failed to create subscription: {e}")
+        logger.exception("Failed to create subscription: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
     
 @app.post("/update_filter")
@@ -136,7 +169,7 @@ async def update_filter(
 
         return {"status": "ok", "telegram_id": telegram_id}
     except Exception as e:
-        logger.exception(f"Failed to create subscription: {e}")
+        logger.exception("Failed to create subscription: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
     
 @app.delete("/delete_filter")
@@ -153,7 +186,7 @@ async def delete_filter(
 
         return {"status": "ok", "telegram_id": telegram_id}
     except Exception as e:
-        logger.exception(f"Failed to create subscription: {e}")
+        logger.exception("Failed to create subscription: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/get_filters")
@@ -165,7 +198,7 @@ async def get_filters(
         filters = await database_manager.get_filters(telegram_id)
         return filters
     except Exception as e:
-        logger.exception(f"Failed to get filters: {e}")
+        logger.exception("Failed to get filters: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/get_filter")
@@ -177,19 +210,33 @@ async def get_filters(
         filter_info = await database_manager.get_filter(filter_id)
         return filter_info
     except Exception as e:
-        logger.exception(f"Failed to get filter_info: {e}")
+        logger.exception("Failed to get filter_info: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/get_property_for_filter")
 async def get_property_for_filter(
     filter_id: int,
+    telegram_id: Optional[int] = None,
     database_manager : SqlDatabaseManager = Depends(get_database_manager)
 ):
     try:
-        property_id = await database_manager.get_property_for_filter(filter_id)
+        property_id = await database_manager.get_property_for_filter(filter_id, telegram_id)
         return property_id
     except Exception as e:
-        logger.exception(f"Failed to get filters: {e}")
+        logger.exception("Failed to get filters: %s", e)
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.delete("/search_session")
+async def reset_search_session(
+    telegram_id: int,
+    filter_id: int,
+    database_manager : SqlDatabaseManager = Depends(get_database_manager)
+):
+    try:
+        database_manager.reset_search_session(telegram_id, filter_id)
+        return {"status": "ok", "telegram_id": telegram_id, "filter_id": filter_id}
+    except Exception as e:
+        logger.exception("Failed to reset search session: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/add_to_favorites/{telegram_id}/{property_id}")
@@ -206,7 +253,7 @@ async def add_to_favorites(
 
         return {"status": "ok", "telegram_id": telegram_id}
     except Exception as e:
-        logger.exception(f"Failed to add to favorites: {e}")
+        logger.exception("Failed to add to favorites: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.delete("/remove_from_favorites")
@@ -222,7 +269,7 @@ async def remove_from_favorites(
 
         return {"status": "ok", "favorites_id": favorites_id}
     except Exception as e:
-        logger.exception(f"Failed to remove from favorites: {e}")
+        logger.exception("Failed to remove from favorites: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/get_favorites/{telegram_id}/{offset}/{limit}")
@@ -240,7 +287,26 @@ async def get_favorites(
 
         return favorites
     except Exception as e:
-        logger.exception(f"Failed to get favorites: {e}")
+        logger.exception("Failed to get favorites: %s", e)
+        raise HTTPException(status_code=500, detail=str(e))
+
+PAGE_MAX_LIMIT = 50
+
+@app.get("/favorites/{telegram_id}")
+async def get_favorites_page(
+    telegram_id: int,
+    cursor: Optional[str] = None,
+    limit: int = 10,
+    database_manager : SqlDatabaseManager = Depends(get_database_manager)
+):
+    if not 0 < limit <= PAGE_MAX_LIMIT:
+        raise HTTPException(status_code=400, detail=f"Limit must be between 1 and {PAGE_MAX_LIMIT}")
+    try:
+        return await database_manager.get_favorites_page(telegram_id, cursor, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.exception("Failed to get favorites page: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/increase_statistics")
@@ -248,12 +314,17 @@ async def increase_statistics(
     params:IncreaseStatistics,
     database_manager : SqlDatabaseManager = Depends(get_database_manager)
 ):
+    if params.param_name not in STATISTICS_PARAMS:
+        raise HTTPException(status_code=400, detail="Unknown statistics parameter")
+    if params.count < 1:
+        raise HTTPException(status_code=400, detail="Count must be positive")
+
     try:
-        favorites = await database_manager.increase_statistics(params.property_id, params.param_name)
+        await database_manager.increase_statistics(params.property_id, params.param_name, params.count)
 
-        return favorites
+        return {"status": "ok", "property_id": params.property_id}
     except Exception as e:
-        logger.exception(f"Failed to increase statistics: {e}")
+        logger.exception("Failed to increase statistics: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 # ---------------------- Admin Endpoints ------------------
@@ -269,9 +340,26 @@ async def is_admin(
         is_admin = await database_manager.is_admin(telegram_id)
         return {"is_admin": is_admin}
     except Exception as e:
-        logger.exception(f"Failed to check admin status: {e}")
+        logger.exception("Failed to check admin status: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
     
+@app.get("/admins")
+async def get_admins(
+    database_manager : SqlDatabaseManager = Depends(get_database_manager)
+):
+    try:
+        return await database_manager.get_admins()
+    except Exception as e:
+        logger.exception("Failed to get admins: %s", e)
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/admins/version")
+async def get_admin_version(
+    database_manager : SqlDatabaseManager = Depends(get_database_manager)
+):
+    # Версия хранится в памяти и обновляется по NOTIFY: запрос не ходит в базу
+    return {"version": database_manager.admin_version}
+
 @app.post("/register_admin/{telegram_id}")
 async def register_admin(
     telegram_id: int,
@@ -285,7 +373,7 @@ async def register_admin(
 
         return {"status": "ok", "telegram_id": telegram_id}
     except Exception as e:
-        logger.exception(f"Failed to register admin: {e}")
+        logger.exception("Failed to register admin: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/unregister_admin/{telegram_id}")
@@ -301,49 +389,67 @@ async def unregister_admin(
 
         return {"status": "ok", "telegram_id": telegram_id}
     except Exception as e:
-        logger.exception(f"Failed to unregister admin: {e}")
+        logger.exception("Failed to unregister admin: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
+async def _attach_images(property_id: int, images: List[UploadFile], database_manager: SqlDatabaseManager) -> int:
+    # Части multipart уже разобраны потоково во временные файлы, хэш считается по ним:
+    # уже сохраненное содержимое повторно не записывается
+    blobs = await store_images(IMAGE_UPLOAD_FOLDER, [image.file for image in images], database_manager)
+    try:
+        await database_manager.upload_images(blobs, property_id)
+    except Exception:
+        await database_manager.release_blobs([blob.sha256 for blob in blobs])
+        raise
+    return len(blobs)
+
 @app.post("/upload_image")
 async def upload_images(image: UploadFile = File(...), database_manager : SqlDatabaseManager = Depends(get_database_manager)):
     try:
-        logger.info(f"Uploading image: {image}")
-
-        filename = image.filename
-        file_extension = filename.split(".")[-1]
-
-        filepath = os.path.join(IMAGE_UPLOAD_FOLDER, filename)
-
-        contents = await image.read()
-
-        logger.info(f"Image filename: {filename} file_extension: {file_extension}")
-
-        with open(filepath, "wb") as f:
-            f.write(contents)
-
-        logger.info(f"Image saved to {filepath}")
+        logger.info("Uploading image: %s", image)
 
         if not image.filename:
             raise HTTPException(status_code=400, detail="Отсутствует имя файла изображения")
 
         try:
-            property_id = int(filename.split("_")[0])
+            property_id = int(image.filename.split("_")[0])
             if not property_id:
                 raise HTTPException(status_code=400, detail="Отсутствует ID объявления в имени файла")
         except ValueError:
             raise HTTPException(status_code=400, detail="Неверный формат имени файла. Ожидается <property_id>_<number>.jpg")
 
-        logger.info(f"Uploading image property_id: {property_id}")
+        logger.info("Uploading image property_id: %s", property_id)
 
-        await database_manager.upload_image(filepath, property_id)
+        await _attach_images(property_id, [image], database_manager)
 
         return {"status": "ok"}
     except HTTPException as e:
-        logger.exception(f"Failed to upload image: {e.detail}")
+        logger.exception("Failed to upload image: %s", e.detail)
 
         raise e
     except Exception as e:
-        logger.exception(f"Failed to upload image: {e}")
+        logger.exception("Failed to upload image: %s", e)
+        raise HTTPException(status_code=500, detail=f"Произошла общая ошибка: {e}")
+
+MAX_IMAGES_PER_UPLOAD = int(os.getenv("MAX_IMAGES_PER_UPLOAD", "10"))
+
+@app.post("/upload_images/{property_id}")
+async def upload_property_images(
+    property_id: int,
+    images: List[UploadFile] = File(...),
+    database_manager : SqlDatabaseManager = Depends(get_database_manager)
+):
+    if not images:
+        raise HTTPException(status_code=400, detail="Нет изображений")
+    if len(images) > MAX_IMAGES_PER_UPLOAD:
+        raise HTTPException(status_code=400, detail=f"Не больше {MAX_IMAGES_PER_UPLOAD} изображений за раз")
+
+    try:
+        count = await _attach_images(property_id, images, database_manager)
+
+        return {"status": "ok", "property_id": property_id, "count": count}
+    except Exception as e:
+        logger.exception("Failed to upload images for property %s: %s", property_id, e)
         raise HTTPException(status_code=500, detail=f"Произошла общая ошибка: {e}")
 
 @app.post("/add_property")
@@ -357,7 +463,43 @@ async def add_property(
 
         return {"status": "ok" , "property_id": property_id, "users_id": users_id}
     except Exception as e:
-        logger.exception(f"Failed to add property: {e}")
+        logger.exception("Failed to add property: %s", e)
+        raise HTTPException(status_code=500, detail=str(e))
+
+MAX_PROPERTIES_BATCH = int(os.getenv("MAX_PROPERTIES_BATCH", "1000"))
+
+@app.post("/add_properties")
+async def add_properties(
+    request: AddPropertiesRequest,
+    database_manager : SqlDatabaseManager = Depends(get_database_manager)
+):
+    if len(request.properties) > MAX_PROPERTIES_BATCH:
+        raise HTTPException(status_code=400, detail=f"Too many properties: at most {MAX_PROPERTIES_BATCH} per request")
+
+    results = [{"property_id": None, "error": None, "users_id": []} for _ in request.properties]
+    valid = []
+    for index, raw_property in enumerate(request.properties):
+        try:
+            valid.append((index, Property.model_validate(raw_property)))
+        except ValidationError as e:
+            results[index]["error"] = str(e)
+
+    try:
+        inserted = await database_manager.add_properties([property for _, property in valid])
+        added = [
+            (index, property) for (index, property), row in zip(valid, inserted)
+            if row["property_id"] is not None
+        ]
+        matches = await database_manager.get_filters_for_properties([property for _, property in added])
+
+        for (index, _), row in zip(valid, inserted):
+            results[index].update(row)
+        for (index, _), users_id in zip(added, matches):
+            results[index]["users_id"] = users_id
+
+        return {"status": "ok", "results": results}
+    except Exception as e:
+        logger.exception("Failed to add properties: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/get_properties/{offset}/{limit}")
@@ -370,7 +512,23 @@ async def get_properties(
         properties = await database_manager.get_properties(offset, limit)
         return {"properties": properties}
     except Exception as e:
-        logger.exception(f"Failed to get properties: {e}")
+        logger.exception("Failed to get properties: %s", e)
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/properties")
+async def get_properties_page(
+    cursor: Optional[str] = None,
+    limit: int = 10,
+    database_manager : SqlDatabaseManager = Depends(get_database_manager),
+):
+    if not 0 < limit <= PAGE_MAX_LIMIT:
+        raise HTTPException(status_code=400, detail=f"Limit must be between 1 and {PAGE_MAX_LIMIT}")
+    try:
+        return await database_manager.get_properties_page(cursor, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.exception("Failed to get properties page: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/get_property_info/{property_id}")
@@ -381,10 +539,40 @@ async def get_property(property_id: int, database_manager : SqlDatabaseManager =
             raise HTTPException(status_code=404, detail="Объект недвижимости не найден")
         return property_data
     except HTTPException as e:
-        logger.exception(f"Failed to get property: {e.detail}")
+        logger.exception("Failed to get property: %s", e.detail)
+        raise e
+    except Exception as e:
+        logger.exception("Failed to get property: %s", e)
+        raise HTTPException(status_code=500, detail=f"Произошла общая ошибка: {e}")
+
+def _photo_size(path: str) -> Optional[int]:
+    try:
+        return os.stat(path).st_size
+    except OSError:
+        return None
+
+@app.get("/property_card/{property_id}")
+async def get_property_card(
+    property_id: int,
+    viewer: Optional[int] = None,
+    database_manager : SqlDatabaseManager = Depends(get_database_manager),
+):
+    try:
+        card = await database_manager.get_property_card(property_id, viewer)
+        if not card:
+            raise HTTPException(status_code=404, detail="Объект недвижимости не найден")
+
+        paths = [photo.pop("path") for photo in card["photos"]]
+        sizes = await asyncio.to_thread(lambda: [_photo_size(path) for path in paths])
+        for photo, size in zip(card["photos"], sizes):
+            photo["size"] = size
+
+        return card
+    except HTTPException as e:
+        logger.exception("Failed to get property card: %s", e.detail)
         raise e
     except Exception as e:
-        logger.exception(f"Failed to get property: {e}")
+        logger.exception("Failed to get property card: %s", e)
         raise HTTPException(status_code=500, detail=f"Произошла общая ошибка: {e}")
 
 @app.get("/get_property_photos_count/{property_id}")
@@ -395,14 +583,37 @@ async def get_property_photos_count(property_id: int, database_manager : SqlData
             raise HTTPException(status_code=404, detail="Объект недвижимости не найден")
         return {"photos_count": count}
     except HTTPException as e:
-        logger.exception(f"Failed to get property photos count: {e.detail}")
+        logger.exception("Failed to get property photos count: %s", e.detail)
         raise e
     except Exception as e:
-        logger.exception(f"Failed to get property photos count: {e}")
+        logger.exception("Failed to get property photos count: %s", e)
         raise HTTPException(status_code=500, detail=f"Произошла общая ошибка: {e}")
 
+PHOTO_CACHE_MAX_AGE = int(os.getenv("PHOTO_CACHE_MAX_AGE", "3600"))
+
+def _is_not_modified(response_headers, request_headers) -> bool:
+    if_none_match = request_headers.get("if-none-match")
+    if if_none_match:
+        if if_none_match.strip() == "*":
+            return True
+        etag = response_headers["etag"]
+        return etag in [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+
+    if_modified_since = request_headers.get("if-modified-since")
+    if if_modified_since:
+        since = parsedate(if_modified_since)
+        last_modified = parsedate(response_headers["last-modified"])
+        return since is not None and last_modified is not None and since >= last_modified
+
+    return False
+
+PhotoSize = Literal[tuple(PHOTO_SIZES)]
+PhotoFormat = Literal[tuple(PHOTO_FORMATS)]
+
 @app.get("/properties/{property_id}/photo/{photo_num}")
-async def get_property_photo(property_id: int, photo_num: int,
+async def get_property_photo(property_id: int, photo_num: int, request: Request,
+    size: PhotoSize = ORIGINAL,
+    format: PhotoFormat = "jpeg",
     database_manager : SqlDatabaseManager = Depends(get_database_manager)
 ):
     photo_path = await database_manager.get_property_photo_path(property_id, photo_num)
@@ -410,13 +621,30 @@ async def get_property_photo(property_id: int, photo_num: int,
     if not photo_path:
         raise HTTPException(status_code=404, detail="Фотография не найдена")
 
-    if not os.path.exists(photo_path):
+    photo_file = await resolve_photo(photo_path, size, format)
+    media_type = PHOTO_FORMATS[format] if photo_file != photo_path else "image/jpeg"
+
+    try:
+        stat_result = await asyncio.to_thread(os.stat, photo_file)
+    except OSError:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Фотография не найдена на сервере")
 
-    with open(photo_path, "rb") as f:
-        image_bytes = f.read()
+    # FileResponse читает файл частями в отдельном потоке (или через sendfile) и поддерживает Range
+    response = FileResponse(
+        photo_file,
+        media_type=media_type,
+        stat_result=stat_result,
+        headers={"Cache-Control": f"public, max-age={PHOTO_CACHE_MAX_AGE}"},
+    )
+
+    if _is_not_modified(response.headers, request.headers):
+        headers = {
+            name: value for name, value in response.headers.items()
+            if name in ("etag", "last-modified", "cache-control")
+        }
+        return Response(status_code=304, headers=headers)
 
-    return Response(content=image_bytes, media_type="image/jpeg")
+    return response
 
 @app.delete("/delete_property/{property_id}")
 async def delete_property(
@@ -427,17 +655,13 @@ async def delete_property(
         if not property_id:
             raise HTTPException(status_code=400, detail="ID is required")
 
-        count = await database_manager.get_property_photos_count(property_id=property_id)
-
-        for i in range(count):
-            filepath = os.path.join(IMAGE_UPLOAD_FOLDER, f"{property_id}_{i}.jpeg")
-            os.remove(filepath)
-
-        await database_manager.delete_property(property_id)
+        # Блобы удалит сборщик мусора, когда на них не останется ссылок
+        legacy_paths = await database_manager.delete_property(property_id)
+        await asyncio.to_thread(remove_blob_files, legacy_paths)
 
         return {"status": "ok", "property_id": property_id}
     except Exception as e:
-        logger.exception(f"Failed to delete property: {e}")
+        logger.exception("Failed to delete property: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/change_property_state/{property_id}/{new_state}")
@@ -454,7 +678,7 @@ async def change_property_state(
 
         return {"status": "ok", "property_id": property_id}
     except Exception as e:
-        logger.exception(f"Failed to change property state: {e}")
+        logger.exception("Failed to change property state: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/get_property_statistics/{property_id}")
@@ -466,7 +690,7 @@ async def get_property_statistics(
         statistics = await database_manager.get_property_statistics(property_id)
         return statistics
     except Exception as e:
-        logger.exception(f"Failed to get property statistics: {e}")
+        logger.exception("Failed to get property statistics: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
     
 @app.get("/get_statistics")
@@ -477,9 +701,19 @@ async def get_statistics(
         statistics = await database_manager.get_statistics()
         return statistics
     except Exception as e:
-        logger.exception(f"Failed to get statistics: {e}")
+        logger.exception("Failed to get statistics: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/metrics")
+async def metrics():
+    return Response(content=REGISTRY.render(), media_type=CONTENT_TYPE)
+
+@app.get("/pool_statistics")
+async def pool_statistics(
+    database_manager : SqlDatabaseManager = Depends(get_database_manager),
+):
+    return database_manager.get_pool_statistics()
+
 if __name__ == "__main__":
     create_tables()
     uvicorn.run(app, host="0.0.0.0", port=8005)
\ No newline at end of file
@@ -0,0 +1,125 @@
+import asyncio
+import logging
+import os
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+PHOTO_WORKERS = int(os.getenv("PHOTO_WORKERS", "2"))
+
+ORIGINAL = "original"
+# Наибольшая сторона в пикселях. Telegram сам уменьшает фотографии до 1280
+PHOTO_SIZES: Dict[str, Optional[int]] = {"thumb": 320, "card": 1280, ORIGINAL: None}
+PHOTO_FORMATS = {"jpeg": "image/jpeg", "webp": "image/webp"}
+
+JPEG_QUALITY = int(os.getenv("PHOTO_JPEG_QUALITY", "82"))
+WEBP_QUALITY = int(os.getenv("PHOTO_WEBP_QUALITY", "78"))
+
+
+def variant_path(path: str, size: str, fmt: str) -> str:
+    """Путь варианта фотографии. Исходный файл - это original в jpeg"""
+    if size == ORIGINAL and fmt == "jpeg":
+        return path
+    return f"{os.path.splitext(path)[0]}.{size}.{fmt}"
+
+
+def variant_paths(path: str) -> List[str]:
+    return [
+        variant_path(path, size, fmt)
+        for size in PHOTO_SIZES for fmt in PHOTO_FORMATS
+        if not (size == ORIGINAL and fmt == "jpeg")
+    ]
+
+
+def _save(image, path: str, fmt: str):
+    # Уникальное имя: одну фотографию могут строить два процесса сразу
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    try:
+        if fmt == "jpeg":
+            image.save(tmp_path, "JPEG", quality=JPEG_QUALITY, optimize=True, progressive=True)
+        else:
+            image.save(tmp_path, "WEBP", quality=WEBP_QUALITY, method=4)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def render_variants(path: str) -> List[str]:
+    """Строит уменьшенные и пережатые варианты фотографии. Выполняется в отдельном процессе"""
+    from PIL import Image, ImageOps
+
+    created = []
+    with Image.open(path) as source:
+        image = ImageOps.exif_transpose(source).convert("RGB")
+        for size, max_side in PHOTO_SIZES.items():
+            resized = image
+            if max_side is not None and max(image.size) > max_side:
+                resized = image.copy()
+                resized.thumbnail((max_side, max_side), Image.LANCZOS)
+            for fmt in PHOTO_FORMATS:
+                target = variant_path(path, size, fmt)
+                if target == path:
+                    continue
+                _save(resized, target, fmt)
+                created.append(target)
+    return created
+
+
+def remove_photo_files(paths: List[str]):
+    for path in paths:
+        os.remove(path)
+        for variant in variant_paths(path):
+            if os.path.exists(variant):
+                os.remove(variant)
+
+
+_photo_executor: Optional[ProcessPoolExecutor] = None
+# Варианты, которые строятся сейчас: повторный запрос той же фотографии ждет их, а не строит заново
+_renders: Dict[str, asyncio.Future] = {}
+
+
+def get_photo_executor() -> ProcessPoolExecutor:
+    global _photo_executor
+    if _photo_executor is None:
+        _photo_executor = ProcessPoolExecutor(max_workers=PHOTO_WORKERS)
+    return _photo_executor
+
+
+async def _render(path: str) -> List[str]:
+    future = _renders.get(path)
+    if future is None:
+        future = asyncio.get_running_loop().run_in_executor(get_photo_executor(), render_variants, path)
+        _renders[path] = future
+        future.add_done_callback(lambda done: _renders.pop(path, None) if _renders.get(path) is done else None)
+    # Отмена одного запроса не должна отменять построение для остальных
+    return await asyncio.shield(future)
+
+
+async def process_photos(paths: List[str]) -> int:
+    """Строит варианты для загруженных фотографий. Ошибка одной фотографии не мешает остальным:
+    без вариантов отдается исходный файл. Возвращает число обработанных фотографий
+    """
+    results = await asyncio.gather(*(_render(path) for path in paths), return_exceptions=True)
+    processed = 0
+    for path, result in zip(paths, results):
+        if isinstance(result, Exception):
+            logger.error("Failed to build variants for %s: %s", path, result)
+        else:
+            processed += 1
+    return processed
+
+
+async def resolve_photo(path: str, size: str, fmt: str) -> str:
+    """Файл для ответа: готовый вариант, иначе строит варианты на лету (фото, загруженные
+    до появления вариантов), а при ошибке отдает исходный файл
+    """
+    target = variant_path(path, size, fmt)
+    if target == path or await asyncio.to_thread(os.path.exists, target):
+        return target
+    if await process_photos([path]) and await asyncio.to_thread(os.path.exists, target):
+        return target
+    return path
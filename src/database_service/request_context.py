@@ -0,0 +1,40 @@
+from starlette.datastructures import Headers, MutableHeaders, QueryParams
+
+from src.logging_config import log_context, new_request_id
+
+REQUEST_ID_HEADER = "X-Request-ID"
+ADMIN_VERSION_HEADER = "X-Admin-Version"
+
+
+class RequestContextMiddleware:
+    """ASGI middleware: контекст логов запроса и служебные заголовки ответа.
+
+    Написан без BaseHTTPMiddleware: запрос не получает отдельной задачи, а тело
+    ответа (в том числе FileResponse) не проходит через промежуточный поток.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        # Бот передает идентификатор обработки обновления: записи обоих сервисов связываются по нему
+        request_id = Headers(scope=scope).get(REQUEST_ID_HEADER, "")[:64] or new_request_id()
+        telegram_id = QueryParams(scope.get("query_string", b"")).get("telegram_id", "")
+        state = scope["app"].state if "app" in scope else None
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                headers[REQUEST_ID_HEADER] = request_id
+                # Бот сравнивает версию со своим кэшем администраторов и сбрасывает его при изменении
+                database_manager = getattr(state, "database_manager", None)
+                if database_manager is not None:
+                    headers[ADMIN_VERSION_HEADER] = str(database_manager.admin_version)
+            await send(message)
+
+        with log_context(request_id, int(telegram_id) if telegram_id.isdigit() else None):
+            await self.app(scope, receive, send_wrapper)
@@ -0,0 +1,74 @@
+import os
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+SEARCH_SESSIONS_MAX = int(os.getenv("SEARCH_SESSIONS_MAX", "10000"))
+
+
+class SearchSession:
+    """Просмотр объявлений по фильтру: курсор по id и отсортированный набор показанных id"""
+
+    __slots__ = ("cursor", "shown", "exhausted_at")
+
+    def __init__(self):
+        self.cursor = 0
+        self.shown = array("q")
+        # Поколение хранилища, в котором проход позади курсора ничего не нашел
+        self.exhausted_at = -1
+
+    def is_shown(self, property_id: int) -> bool:
+        index = bisect_left(self.shown, property_id)
+        return index < len(self.shown) and self.shown[index] == property_id
+
+    def mark_shown(self, property_id: int):
+        if not self.shown or self.shown[-1] < property_id:
+            self.shown.append(property_id)
+            return
+        index = bisect_left(self.shown, property_id)
+        if index == len(self.shown) or self.shown[index] != property_id:
+            self.shown.insert(index, property_id)
+
+    def advance(self, property_id: int):
+        self.mark_shown(property_id)
+        self.cursor = max(self.cursor, property_id)
+
+
+class SearchSessionStore:
+    def __init__(self, max_sessions: int = SEARCH_SESSIONS_MAX):
+        self.max_sessions = max_sessions
+        self._sessions: "OrderedDict[Tuple[int, int], SearchSession]" = OrderedDict()
+        # Растет, когда объекты позади курсоров могут снова стать доступными
+        self.generation = 0
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def get(self, telegram_id: int, filter_id: int) -> SearchSession:
+        key = (telegram_id, filter_id)
+        session = self._sessions.get(key)
+        if session is None:
+            session = self._sessions[key] = SearchSession()
+            if len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        else:
+            self._sessions.move_to_end(key)
+        return session
+
+    def reset(self, telegram_id: int, filter_id: int) -> Optional[SearchSession]:
+        return self._sessions.pop((telegram_id, filter_id), None)
+
+    def needs_behind_scan(self, session: SearchSession) -> bool:
+        """Искать позади курсора имеет смысл, только если с прошлого пустого прохода что-то изменилось"""
+        return session.cursor > 0 and session.exhausted_at != self.generation
+
+    def mark_exhausted(self, session: SearchSession):
+        session.exhausted_at = self.generation
+
+    def properties_changed(self):
+        self.generation += 1
+
+    def drop_filter(self, filter_id: int):
+        for key in [key for key in self._sessions if key[1] == filter_id]:
+            del self._sessions[key]
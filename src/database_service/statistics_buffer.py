@@ -0,0 +1,79 @@
+import os
+import random
+from typing import Dict, List, Tuple
+
+STATISTICS_PARAMS = ("views", "likes", "favorites")
+
+STATISTICS_FLUSH_INTERVAL = float(os.getenv("STATISTICS_FLUSH_INTERVAL", "5"))
+STATISTICS_FLUSH_THRESHOLD = int(os.getenv("STATISTICS_FLUSH_THRESHOLD", "1000"))
+STATISTICS_SHARDS = int(os.getenv("STATISTICS_SHARDS", "16"))
+
+
+class StatisticsBuffer:
+    """Накопитель счетчиков статистики между сбросами в базу"""
+
+    def __init__(
+        self,
+        flush_threshold: int = STATISTICS_FLUSH_THRESHOLD,
+        shards: int = STATISTICS_SHARDS,
+    ):
+        self.flush_threshold = flush_threshold
+        self.shards = shards
+        self.pending: Dict[int, List[int]] = {}
+        self.totals: List[int] = [0] * len(STATISTICS_PARAMS)
+        self.increments = 0
+        # Пачка, которую сейчас записывает flush: до коммита ее нет в базе, но читатели должны ее видеть
+        self.in_flight: Dict[int, List[int]] = {}
+        self.in_flight_totals: List[int] = [0] * len(STATISTICS_PARAMS)
+
+    def add(self, property_id: int, param_name: str, count: int = 1) -> bool:
+        """Добавляет инкремент, возвращает True, если пора сбросить буфер"""
+        index = STATISTICS_PARAMS.index(param_name)
+        counters = self.pending.get(property_id)
+        if counters is None:
+            counters = self.pending[property_id] = [0] * len(STATISTICS_PARAMS)
+        counters[index] += count
+        self.totals[index] += count
+        self.increments += 1
+        return self.increments >= self.flush_threshold
+
+    def take(self) -> Tuple[Dict[int, List[int]], List[int]]:
+        """Забирает накопленное для записи. До commit или restore пачка считается в pending_*"""
+        pending, totals = self.pending, self.totals
+        self.in_flight, self.in_flight_totals = pending, totals
+        self.pending = {}
+        self.totals = [0] * len(STATISTICS_PARAMS)
+        self.increments = 0
+        return pending, totals
+
+    def commit(self):
+        """Пачка записана в базу"""
+        self.in_flight = {}
+        self.in_flight_totals = [0] * len(STATISTICS_PARAMS)
+
+    def restore(self, pending: Dict[int, List[int]], totals: List[int]):
+        """Запись не удалась: пачка возвращается в буфер"""
+        self.commit()
+        for property_id, counters in pending.items():
+            current = self.pending.setdefault(property_id, [0] * len(STATISTICS_PARAMS))
+            for index, value in enumerate(counters):
+                current[index] += value
+        for index, value in enumerate(totals):
+            self.totals[index] += value
+
+    def discard(self, property_id: int):
+        self.pending.pop(property_id, None)
+        self.in_flight.pop(property_id, None)
+
+    def pending_for(self, property_id: int) -> Dict[str, int]:
+        counters = [0] * len(STATISTICS_PARAMS)
+        for source in (self.pending, self.in_flight):
+            for index, value in enumerate(source.get(property_id, ())):
+                counters[index] += value
+        return dict(zip(STATISTICS_PARAMS, counters))
+
+    def pending_totals(self) -> Dict[str, int]:
+        return dict(zip(STATISTICS_PARAMS, map(sum, zip(self.totals, self.in_flight_totals))))
+
+    def pick_shard(self) -> int:
+        return random.randrange(self.shards)
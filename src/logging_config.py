@@ -0,0 +1,239 @@
+import atexit
+import contextvars
+import copy
+import datetime
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import uuid
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+__all__ = (
+    "setup_logging", "stop_logging", "log_context", "new_request_id",
+    "request_id_var", "user_id_var", "JsonFormatter", "logging_statistics",
+)
+
+LOG_DIR = os.getenv("LOG_DIR", "logs")
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+# Уровни отдельных логгеров: "src.bot_logic.router=DEBUG,httpx=WARNING"
+LOG_LEVELS = os.getenv("LOG_LEVELS", "")
+# Доля сохраняемых DEBUG/INFO записей логгера: "src.bot_logic.database_service_client=0.1"
+LOG_SAMPLING = os.getenv("LOG_SAMPLING", "")
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+# Запрос (обновление Telegram или HTTP запрос) и пользователь, в контексте которых пишется запись
+request_id_var: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("request_id", default=None)
+user_id_var: contextvars.ContextVar[Optional[int]] = contextvars.ContextVar("user_id", default=None)
+
+# Атрибуты LogRecord, которые не попадают в JSON как дополнительные поля
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {
+    "message", "asctime", "request_id", "user_id",
+}
+
+
+def new_request_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+
+@contextmanager
+def log_context(request_id: Optional[str] = None, user_id: Optional[int] = None):
+    """Записи внутри блока (и в созданных в нем задачах) помечаются request_id и user_id"""
+    tokens = [request_id_var.set(request_id or new_request_id())]
+    if user_id is not None:
+        tokens.append(user_id_var.set(user_id))
+    try:
+        yield request_id_var.get()
+    finally:
+        for token in reversed(tokens):
+            token.var.reset(token)
+
+
+def parse_mapping(value: str) -> Dict[str, str]:
+    result = {}
+    for item in value.split(","):
+        name, _, setting = item.partition("=")
+        if name.strip() and setting.strip():
+            result[name.strip()] = setting.strip()
+    return result
+
+
+class ContextFilter(logging.Filter):
+    """Копирует контекст в запись. Работает в потоке, который пишет в лог, до постановки в очередь"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        record.user_id = user_id_var.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Пропускает только долю DEBUG/INFO записей шумных логгеров. Предупреждения и ошибки не теряются"""
+
+    def __init__(self, rates: Dict[str, float]):
+        super().__init__()
+        # Самый длинный подходящий префикс имени логгера
+        self.rates = sorted(rates.items(), key=lambda item: len(item[0]), reverse=True)
+        self._resolved: Dict[str, float] = {}
+        self.dropped = 0
+
+    def rate_for(self, name: str) -> float:
+        rate = self._resolved.get(name)
+        if rate is None:
+            rate = next(
+                (rate for prefix, rate in self.rates if name == prefix or name.startswith(prefix + ".")),
+                1.0,
+            )
+            self._resolved[name] = rate
+        return rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self.rate_for(record.name)
+        if rate >= 1.0 or random.random() < rate:
+            return True
+        self.dropped += 1
+        return False
+
+
+class LazyQueueHandler(logging.handlers.QueueHandler):
+    """Кладет запись в очередь, JSON собирается в фоновом потоке.
+
+    Сообщение подставляется до постановки в очередь: аргументы - живые объекты
+    обработчиков, и к моменту записи они могут измениться. Платят за это только
+    записи, прошедшие проверку уровня и выборку.
+
+    Очередь ограничена: если поток записи не успевает, запись отбрасывается,
+    а не блокирует цикл событий.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Копия: другие обработчики корневого логгера получают запись без изменений
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = _EXCEPTION_FORMATTER.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+_EXCEPTION_FORMATTER = logging.Formatter()
+
+
+class _QueueListener(logging.handlers.QueueListener):
+    def enqueue_sentinel(self):
+        # Ожидает места в заполненной очереди: при остановке записи не теряются
+        self.queue.put(self._sentinel)
+
+
+class JsonFormatter(logging.Formatter):
+    """Одна запись - одна JSON строка"""
+
+    def __init__(self, service: str):
+        super().__init__()
+        self.service = service
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "ts": datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "service": self.service,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        request_id = getattr(record, "request_id", None)
+        if request_id is not None:
+            data["request_id"] = request_id
+        user_id = getattr(record, "user_id", None)
+        if user_id is not None:
+            data["user_id"] = user_id
+        # Поля, переданные через extra=
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith("_"):
+                data[key] = value
+        if record.exc_info:
+            data["exc_info"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            data["exc_info"] = record.exc_text
+        if record.stack_info:
+            data["stack_info"] = self.formatStack(record.stack_info)
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_queue_handler: Optional[LazyQueueHandler] = None
+_sampling_filter: Optional[SamplingFilter] = None
+
+
+def setup_logging(service: str, directory: str = LOG_DIR, level: str = LOG_LEVEL,
+                  levels: str = LOG_LEVELS, sampling: str = LOG_SAMPLING,
+                  handler: Optional[logging.Handler] = None) -> logging.handlers.QueueListener:
+    """Настраивает логирование процесса: корневой логгер пишет в очередь,
+    фоновый поток записывает JSON строки в <directory>/<service>.log.
+
+    Вызывается один раз в точке входа сервиса, повторные вызовы ничего не меняют.
+    """
+    global _listener, _queue_handler, _sampling_filter
+    if _listener is not None:
+        return _listener
+
+    if handler is None:
+        os.makedirs(directory, exist_ok=True)
+        handler = logging.FileHandler(os.path.join(directory, f"{service}.log"), encoding="utf-8")
+    handler.setFormatter(JsonFormatter(service))
+
+    log_queue: queue.Queue = queue.Queue(LOG_QUEUE_SIZE)
+    _sampling_filter = SamplingFilter({name: float(rate) for name, rate in parse_mapping(sampling).items()})
+    _queue_handler = LazyQueueHandler(log_queue)
+    _queue_handler.addFilter(_sampling_filter)
+    _queue_handler.addFilter(ContextFilter())
+
+    root = logging.getLogger()
+    root.addHandler(_queue_handler)
+    root.setLevel(level.upper())
+    for name, logger_level in parse_mapping(levels).items():
+        logging.getLogger(name).setLevel(logger_level.upper())
+
+    _listener = _QueueListener(log_queue, handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+    return _listener
+
+
+def stop_logging():
+    """Дописывает очередь и останавливает фоновый поток"""
+    global _listener, _queue_handler, _sampling_filter
+    if _listener is None:
+        return
+    logging.getLogger().removeHandler(_queue_handler)
+    _listener.stop()
+    for handler in _listener.handlers:
+        handler.close()
+    _listener = None
+    _queue_handler = None
+    _sampling_filter = None
+
+
+def logging_statistics() -> Dict[str, int]:
+    """Сколько записей отброшено выборкой и из-за переполненной очереди"""
+    return {
+        "sampled_out": _sampling_filter.dropped if _sampling_filter is not None else 0,
+        "queue_dropped": _queue_handler.dropped if _queue_handler is not None else 0,
+        "queue_size": _queue_handler.queue.qsize() if _queue_handler is not None else 0,
+    }
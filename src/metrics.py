@@ -0,0 +1,286 @@
+import asyncio
+import math
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, List, Optional, Tuple
+
+__all__ = (
+    "Counter", "Gauge", "Histogram", "MetricsRegistry", "REGISTRY",
+    "DEFAULT_BUCKETS", "CONTENT_TYPE", "MetricsMiddleware", "start_metrics_server",
+)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Секунды: от быстрых запросов к кэшу до медленных загрузок фотографий
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SCRAPE_TIMEOUT = 5.0
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    """Метрика с дочерними значениями по меткам.
+
+    Значения меняются только из потока цикла событий, поэтому обходятся
+    без блокировок: inc/observe - это обращение к словарю и сложение.
+    """
+
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values):
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}, got {values}")
+            child = self._children[values] = self._new_child()
+        return child
+
+    def children(self) -> List[Tuple[Tuple[str, ...], object]]:
+        """Значения меток и дочерние значения на момент вызова"""
+        return list(self._children.items())
+
+    def _label_text(self, values: Tuple[str, ...], extra: Optional[Tuple[str, str]] = None) -> str:
+        pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(self.labelnames, values)]
+        if extra is not None:
+            pairs.append(f'{extra[0]}="{extra[1]}"')
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"] + self.samples()
+
+
+class _Value:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+    def dec(self, amount: float = 1):
+        self.value -= amount
+
+    def set(self, value: float):
+        self.value = value
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount: float = 1):
+        self.labels().inc(amount)
+
+    def samples(self) -> List[str]:
+        return [
+            f"{self.name}{self._label_text(values)} {_format_value(child.value)}"
+            for values, child in list(self._children.items())
+        ]
+
+
+class Gauge(Counter):
+    """Значение, которое растет и убывает. С set_function вычисляется при каждом сборе"""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._function: Optional[Callable[[], float]] = None
+
+    def dec(self, amount: float = 1):
+        self.labels().dec(amount)
+
+    def set(self, value: float):
+        self.labels().set(value)
+
+    def set_function(self, function: Optional[Callable[[], float]]):
+        self._function = function
+
+    def samples(self) -> List[str]:
+        if self._function is not None:
+            return [f"{self.name} {_format_value(self._function())}"]
+        return super().samples()
+
+
+class _HistogramValue:
+    __slots__ = ("bounds", "counts", "sum")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        # Последняя корзина - +Inf. Счетчики не накопительные, суммируются при сборе
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def samples(self) -> List[str]:
+        lines = []
+        for values, child in list(self._children.items()):
+            total = 0
+            for bound, count in zip(self.buckets + (math.inf,), list(child.counts)):
+                total += count
+                lines.append(f"{self.name}_bucket{self._label_text(values, ('le', _format_value(bound)))} {total}")
+            lines.append(f"{self.name}_sum{self._label_text(values)} {_format_value(child.sum)}")
+            lines.append(f"{self.name}_count{self._label_text(values)} {total}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        # Повторный импорт модуля (тесты, перезагрузка) получает уже созданную метрику
+        existing = self._metrics.get(metric.name)
+        if existing is not None:
+            if type(existing) is not type(metric) or existing.labelnames != metric.labelnames:
+                raise ValueError(f"Metric {metric.name} is already registered with a different type")
+            return existing
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                  buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def get(self, name: str) -> Optional[_Metric]:
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        """Текстовый формат Prometheus"""
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+
+async def start_metrics_server(host: str, port: int, registry: MetricsRegistry = REGISTRY) -> asyncio.AbstractServer:
+    """Минимальный HTTP сервер с единственным маршрутом GET /metrics для процессов без веб-фреймворка"""
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), SCRAPE_TIMEOUT)
+            # Заголовки не нужны, но их надо дочитать до пустой строки
+            while (await asyncio.wait_for(reader.readline(), SCRAPE_TIMEOUT)) not in (b"\r\n", b"\n", b""):
+                pass
+            parts = request_line.split()
+            if len(parts) >= 2 and parts[0] == b"GET" and parts[1].split(b"?", 1)[0] == b"/metrics":
+                status, content_type, body = "200 OK", CONTENT_TYPE, registry.render().encode()
+            else:
+                status, content_type, body = "404 Not Found", "text/plain; charset=utf-8", b"Not Found\n"
+            writer.write(
+                f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\n"
+                f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body
+            )
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    return await asyncio.start_server(handle, host, port)
+
+
+class MetricsMiddleware:
+    """ASGI middleware: число, длительность и объем ответов по шаблону маршрута.
+
+    Написан без BaseHTTPMiddleware: не создает задач и потоков тела ответа на запрос.
+    """
+
+    def __init__(self, app, prefix: str, registry: MetricsRegistry = REGISTRY):
+        self.app = app
+        self.requests = registry.counter(
+            f"{prefix}_http_requests_total", "HTTP requests by route and status", ("method", "route", "status"),
+        )
+        self.latency = registry.histogram(
+            f"{prefix}_http_request_duration_seconds", "HTTP request latency by route", ("method", "route"),
+        )
+        self.in_flight = registry.gauge(
+            f"{prefix}_http_requests_in_flight", "HTTP requests being handled", ("method",),
+        )
+        self.response_bytes = registry.counter(
+            f"{prefix}_http_response_bytes_total", "HTTP response body bytes by route", ("route",),
+        )
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        in_flight = self.in_flight.labels(method)
+        status = 500
+        sent = 0
+
+        async def send_wrapper(message):
+            nonlocal status, sent
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                sent += len(message.get("body", b""))
+            await send(message)
+
+        in_flight.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            in_flight.dec()
+            # Шаблон маршрута, а не путь: число меток не зависит от id в запросах
+            route = getattr(scope.get("route"), "path", "unmatched")
+            self.requests.labels(method, route, str(status)).inc()
+            self.latency.labels(method, route).observe(elapsed)
+            if sent:
+                self.response_bytes.labels(route).inc(sent)
@@ -0,0 +1,27 @@
+import pytest
+
+from src.benchmarks.flows import FLOWS
+from src.benchmarks.harness import BenchmarkHarness
+from src.benchmarks.stats import format_report, percentile
+
+
+def test_percentile():
+    values = [1, 2, 3, 4, 5, 6, 7, 8, 9, 10]
+    assert percentile(values, 0.5) == 5
+    assert percentile(values, 0.99) == 10
+    assert percentile([], 0.95) == 0
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("flow", list(FLOWS))
+async def test_flow_runs_without_handler_errors(flow, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    harness = BenchmarkHarness(properties=20, work_dir=str(tmp_path))
+    try:
+        summary = await harness.run([flow], users=3, concurrency=3, pages=2)
+    finally:
+        await harness.close()
+
+    assert summary["handler_errors"] == {}
+    assert summary["total"]["count"] > 0
+    assert "TOTAL" in format_report(summary, baseline=summary)
@@ -0,0 +1,85 @@
+import httpx
+import pytest
+
+from src.bot_logic.admin_cache import AdminCache
+from src.bot_logic.database_service_client import DatabaseServiceClient
+
+
+class AdminService:
+    def __init__(self):
+        self.admins = [1]
+        self.version = 1
+        self.admin_requests = 0
+        self.version_requests = 0
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        headers = {"X-Admin-Version": str(self.version)}
+        if request.url.path == "/admins":
+            self.admin_requests += 1
+            return httpx.Response(200, json={"admins": self.admins, "version": self.version}, headers=headers)
+        if request.url.path == "/admins/version":
+            self.version_requests += 1
+            return httpx.Response(200, json={"version": self.version}, headers=headers)
+        return httpx.Response(200, json={"filters": []}, headers=headers)
+
+
+@pytest.fixture
+def service():
+    return AdminService()
+
+
+@pytest.fixture
+def database_client(service):
+    return DatabaseServiceClient(base_url="http://db_service:8005", backoff=0, transport=httpx.MockTransport(service))
+
+
+@pytest.mark.asyncio
+async def test_admins_are_cached(service, database_client):
+    cache = AdminCache(database_client, ttl=60)
+
+    assert await cache.is_admin(1) is True
+    assert await cache.is_admin(2) is False
+    assert service.admin_requests == 1
+
+
+@pytest.mark.asyncio
+async def test_newer_version_header_invalidates(service, database_client):
+    cache = AdminCache(database_client, ttl=60)
+    assert await cache.is_admin(2) is False
+
+    # Другой процесс зарегистрировал администратора
+    service.admins = [1, 2]
+    service.version = 2
+    await database_client.get_property_filters_list(5)
+
+    assert await cache.is_admin(2) is True
+    assert service.admin_requests == 2
+
+
+@pytest.mark.asyncio
+async def test_ttl_and_explicit_invalidation(service, database_client):
+    cache = AdminCache(database_client, ttl=0)
+    await cache.is_admin(1)
+    await cache.is_admin(1)
+    assert service.admin_requests == 2
+
+    cache.ttl = 60
+    await cache.is_admin(1)
+    cache.invalidate()
+    await cache.is_admin(1)
+    assert service.admin_requests == 4
+
+
+@pytest.mark.asyncio
+async def test_cached_admin_is_checked_against_version(service, database_client):
+    cache = AdminCache(database_client, ttl=60)
+    assert await cache.is_admin(1) is True
+    assert await cache.is_admin(1) is True
+    assert service.version_requests == 1
+
+    # Администратора сняли в другом процессе бота, этот процесс не делал запросов
+    service.admins = []
+    service.version = 2
+
+    assert await cache.is_admin(1) is False
+    assert service.admin_requests == 2
@@ -0,0 +1,134 @@
+import asyncio
+import logging
+from types import SimpleNamespace
+
+import pytest
+
+from src.bot_logic import bot_metrics
+from src.bot_logic.bot_metrics import (
+    HANDLER_DATABASE_SECONDS, HANDLER_ERRORS, HANDLER_SECONDS, HANDLER_TELEGRAM_SECONDS,
+    handler_summary, install_error_counter, record_database, record_telegram, uninstall_error_counter,
+)
+from src.bot_logic.handlers.admin_scenario_handlers.perf_handler import format_perf_report
+from src.bot_logic.router import UpdateRouter
+from src.bot_logic.state_machine import get_state_machine
+from src.metrics import start_metrics_server
+
+logger = logging.getLogger(__name__)
+
+
+class MetricsHandlers:
+    async def slow(self, event):
+        record_telegram(0.02, "SendMessageRequest")
+        record_database(0.03, "GET", "200")
+
+    async def logged(self, event):
+        try:
+            raise KeyError("property")
+        except KeyError as e:
+            logger.exception("Handler failed: %s", e)
+
+    async def raising(self, event):
+        raise RuntimeError("boom")
+
+
+def message(user_id, text):
+    return SimpleNamespace(sender_id=user_id, text=text)
+
+
+def value(metric, *labels):
+    """Counter value without creating the child"""
+    return dict(metric.children()).get(labels, SimpleNamespace(value=0.0)).value
+
+
+def count(histogram, *labels):
+    """Observations in a histogram child"""
+    child = dict(histogram.children()).get(labels)
+    return sum(child.counts) if child is not None else 0
+
+
+@pytest.fixture
+def router():
+    handlers = MetricsHandlers()
+    router = UpdateRouter()
+    router.add_message("/metrics_slow", handlers.slow)
+    router.add_message("/metrics_logged", handlers.logged)
+    router.add_message("/metrics_raising", handlers.raising)
+    install_error_counter()
+    yield router
+    uninstall_error_counter()
+
+
+@pytest.mark.asyncio
+async def test_span_attributes_api_time_to_handler(router):
+    get_state_machine().go_neutral(601)
+    name = "MetricsHandlers.slow"
+    before = count(HANDLER_SECONDS, name)
+    telegram = value(HANDLER_TELEGRAM_SECONDS, name)
+    database = value(HANDLER_DATABASE_SECONDS, name)
+
+    await router.on_message(message(601, "/metrics_slow"))
+
+    assert count(HANDLER_SECONDS, name) == before + 1
+    assert value(HANDLER_TELEGRAM_SECONDS, name) == pytest.approx(telegram + 0.02)
+    assert value(HANDLER_DATABASE_SECONDS, name) == pytest.approx(database + 0.03)
+    # Outside a handler span the time is not attributed to anyone
+    record_database(0.5, "GET", "200")
+    assert value(HANDLER_DATABASE_SECONDS, name) == pytest.approx(database + 0.03)
+
+
+@pytest.mark.asyncio
+async def test_logged_and_raised_errors_are_counted(router):
+    get_state_machine().go_neutral(602)
+    logged = value(HANDLER_ERRORS, "MetricsHandlers.logged", "KeyError")
+    raised = value(HANDLER_ERRORS, "MetricsHandlers.raising", "RuntimeError")
+
+    await router.on_message(message(602, "/metrics_logged"))
+    with pytest.raises(RuntimeError):
+        await router.on_message(message(602, "/metrics_raising"))
+
+    assert value(HANDLER_ERRORS, "MetricsHandlers.logged", "KeyError") == logged + 1
+    assert value(HANDLER_ERRORS, "MetricsHandlers.raising", "RuntimeError") == raised + 1
+    assert router.statistics()["message /metrics_raising"]["count"] == 1
+
+    rows = {row["handler"]: row for row in handler_summary()}
+    assert rows["MetricsHandlers.raising"]["errors"] >= 1
+    report = format_perf_report(handler_summary(3), get_state_machine().memory_stats())
+    assert report.startswith("Самые медленные обработчики")
+
+
+@pytest.mark.asyncio
+async def test_instrumented_keeps_name_and_counts_errors():
+    @bot_metrics.instrumented
+    async def failing():
+        raise ValueError("bad")
+
+    name = failing.__qualname__
+    assert name.endswith("failing")
+    with pytest.raises(ValueError):
+        await failing()
+    assert value(bot_metrics.FUNCTION_ERRORS, name, "ValueError") == 1
+    assert count(bot_metrics.FUNCTION_SECONDS, name) == 1
+
+
+@pytest.mark.asyncio
+async def test_metrics_server_serves_registry():
+    server = await start_metrics_server("127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    try:
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(b"GET /metrics HTTP/1.1\r\nHost: localhost\r\n\r\n")
+        response = await reader.read()
+        writer.close()
+
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(b"GET /other HTTP/1.1\r\n\r\n")
+        missing = await reader.read()
+        writer.close()
+    finally:
+        server.close()
+        await server.wait_closed()
+
+    assert response.startswith(b"HTTP/1.1 200 OK")
+    assert b"bot_handler_duration_seconds" in response
+    assert missing.startswith(b"HTTP/1.1 404")
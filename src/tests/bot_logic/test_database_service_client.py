@@ -1,99 +1,161 @@
+import json
+
+import httpx
 import pytest
-from unittest.mock import patch, MagicMock
 from src.bot_logic.database_service_client import DatabaseServiceClient
 
+class RecordingTransport:
+    def __init__(self):
+        self.requests = []
+        self.responses = []
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        response = self.responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
 @pytest.fixture
-def mock_client():
-    """Fixture to create a mock instance of DatabaseServiceClient"""
-    return DatabaseServiceClient(base_url="http://db_service:8005")
-    
+def transport():
+    return RecordingTransport()
+
+@pytest.fixture
+def mock_client(transport):
+    """Fixture to create a DatabaseServiceClient backed by a mock transport"""
+    return DatabaseServiceClient(
+        base_url="http://db_service:8005",
+        backoff=0,
+        transport=httpx.MockTransport(transport),
+    )
+
 @pytest.mark.asyncio
-@patch("requests.post")
-async def test_new_property_filter(mock_post, mock_client):
+async def test_new_property_filter(transport, mock_client):
     user_id = 123
     filter_data = {"min_price": 1000, "max_price": 5000, "city": "Moscow"}
-    
-    mock_response = MagicMock()
-    mock_response.json.return_value = {"status": "success", "filter_id": 1}
-    mock_post.return_value = mock_response
-    
+
+    transport.responses.append(httpx.Response(200, json={"status": "success", "filter_id": 1}))
+
     response = await mock_client.new_property_filter(user_id, filter_data)
-    
-    mock_post.assert_called_once_with("http://db_service:8005/create_filter", json={
+
+    request = transport.requests[0]
+    assert request.method == "POST"
+    assert str(request.url) == "http://db_service:8005/create_filter"
+    assert json.loads(request.content) == {
         "telegram_id": user_id,
         "min_price": 1000,
         "max_price": 5000,
         "city": "Moscow"
-    })
-    
+    }
+
     assert response == {"status": "success", "filter_id": 1}
-    
+
 @pytest.mark.asyncio
-@patch("requests.post")
-async def test_update_property_filter(mock_post, mock_client):
+async def test_update_property_filter(transport, mock_client):
     user_id = 123
     filter_id = 1
     update_param = "max_price"
     new_value = "4000"
     param_type = "int"
-    
-    mock_response = MagicMock()
-    mock_response.json.return_value = {"status": "success", "filter_id": filter_id}
-    mock_post.return_value = mock_response
-    
+
+    transport.responses.append(httpx.Response(200, json={"status": "success", "filter_id": filter_id}))
+
     response = await mock_client.update_property_filter(user_id, filter_id, update_param, new_value, param_type)
-    
-    mock_post.assert_called_once_with("http://db_service:8005/update_filter", json={
+
+    request = transport.requests[0]
+    assert str(request.url) == "http://db_service:8005/update_filter"
+    assert json.loads(request.content) == {
         "telegram_id": user_id,
         "filter_id": filter_id,
         "filter_param": update_param,
         "value": new_value,
         "type": param_type
-    })
-    
+    }
+
     assert response == {"status": "success", "filter_id": filter_id}
-    
+
 @pytest.mark.asyncio
-@patch("requests.get")
-async def test_get_property_filters_list(mock_get, mock_client):
+async def test_get_property_filters_list(transport, mock_client):
     user_id = 123
-    mock_response = MagicMock()
-    mock_response.json.return_value = {"filters": [{"id": 1, "min_price": 1000, "max_price": 5000, "city": "Moscow"}]}
-    mock_get.return_value = mock_response
-    
+    transport.responses.append(httpx.Response(200, json={"filters": [{"id": 1, "min_price": 1000, "max_price": 5000, "city": "Moscow"}]}))
+
     response = await mock_client.get_property_filters_list(user_id)
-    
-    mock_get.assert_called_once_with("http://db_service:8005/get_filters", params={"telegram_id": user_id})
-    
+
+    request = transport.requests[0]
+    assert request.method == "GET"
+    assert str(request.url) == "http://db_service:8005/get_filters?telegram_id=123"
+
     assert response == {"filters": [{"id": 1, "min_price": 1000, "max_price": 5000, "city": "Moscow"}]}
-    
+
 @pytest.mark.asyncio
-@patch("requests.get")
-async def test_get_property_filter(mock_get, mock_client):
+async def test_get_property_filter(transport, mock_client):
     filter_id = 1
-    mock_response = MagicMock()
-    mock_response.json.return_value = {"id": 1, "min_price": 1000, "max_price": 5000, "city": "Moscow"}
-    mock_get.return_value = mock_response
-    
+    transport.responses.append(httpx.Response(200, json={"id": 1, "min_price": 1000, "max_price": 5000, "city": "Moscow"}))
+
     response = await mock_client.get_property_filter(filter_id)
-    
-    mock_get.assert_called_once_with("http://db_service:8005/get_filter", params={"filter_id": filter_id})
-    
+
+    assert str(transport.requests[0].url) == "http://db_service:8005/get_filter?filter_id=1"
+
     assert response == {"id": 1, "min_price": 1000, "max_price": 5000, "city": "Moscow"}
-    
+
 @pytest.mark.asyncio
-@patch("requests.delete")
-async def test_delete_property_filter(mock_delete, mock_client):
+async def test_delete_property_filter(transport, mock_client):
     user_id = 123
     filter_id = 1
-    
-    mock_response = MagicMock()
-    mock_response.json.return_value = {"status": "success"}
-    mock_delete.return_value = mock_response
-    
+
+    transport.responses.append(httpx.Response(200, json={"status": "success"}))
+
     response = await mock_client.delete_property_filter(user_id, filter_id)
-    
-    mock_delete.assert_called_once_with("http://db_service:8005/delete_filter", params={"telegram_id": user_id, "filter_id": filter_id})
-    
+
+    request = transport.requests[0]
+    assert request.method == "DELETE"
+    assert str(request.url) == "http://db_service:8005/delete_filter?telegram_id=123&filter_id=1"
+
     assert response == {"status": "success"}
-    
\ No newline at end of file
+
+@pytest.mark.asyncio
+async def test_get_retries_with_backoff(transport, mock_client):
+    transport.responses.append(httpx.ConnectError("connection refused"))
+    transport.responses.append(httpx.Response(503))
+    transport.responses.append(httpx.Response(200, json={"is_admin": True}))
+
+    assert await mock_client.is_admin(123) is True
+    assert len(transport.requests) == 3
+
+@pytest.mark.asyncio
+async def test_post_is_not_retried_after_server_error(transport, mock_client):
+    transport.responses.append(httpx.Response(503))
+
+    with pytest.raises(httpx.HTTPStatusError):
+        await mock_client.new_property(123, {"price": 1})
+    assert len(transport.requests) == 1
+
+@pytest.mark.asyncio
+async def test_get_property_card(transport, mock_client):
+    card = {
+        "property": {"id": 5, "city": "Moscow"},
+        "photos": [{"num": 0, "id": 11, "size": 1024}],
+        "statistics": {"views": 1, "favorites": 0, "likes": 0},
+        "viewer_is_admin": False,
+    }
+    transport.responses.append(httpx.Response(200, json=card))
+
+    response = await mock_client.get_property_card(5, viewer=123)
+
+    assert str(transport.requests[0].url) == "http://db_service:8005/property_card/5?viewer=123"
+    assert response == card
+
+@pytest.mark.asyncio
+async def test_upload_images_sends_one_multipart_request(transport, mock_client):
+    transport.responses.append(httpx.Response(200, json={"status": "ok", "property_id": 7, "count": 3}))
+
+    response = await mock_client.upload_images(7, [b"a", b"bb", b"ccc"])
+
+    assert response["count"] == 3
+    assert len(transport.requests) == 1
+    request = transport.requests[0]
+    assert str(request.url) == "http://db_service:8005/upload_images/7"
+    body = request.read()
+    for number in (0, 1, 2):
+        assert f'filename="7_{number}.jpeg"'.encode() in body
+    assert body.count(b'name="images"') == 3
@@ -0,0 +1,103 @@
+import pytest
+from telethon.errors import FileReferenceExpiredError
+from telethon.tl.types import InputPhoto
+
+from src.benchmarks.fake_telegram import FakeTelegramClient
+from src.bot_logic import media_cache
+from src.bot_logic.media_cache import MediaCache, send_cached_photos
+
+
+class FakeDatabaseService:
+    def __init__(self):
+        self.downloads = []
+
+    async def get_property_photo(self, property_id, photo_num=0, size="original"):
+        self.downloads.append((property_id, photo_num))
+        return b"jpeg"
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    cache = MediaCache(str(tmp_path / "cache" / "media.sqlite3"))
+    monkeypatch.setattr(media_cache, "_media_cache", cache)
+    yield cache
+    cache.close()
+
+
+@pytest.fixture
+def database_service(monkeypatch):
+    service = FakeDatabaseService()
+    monkeypatch.setattr(media_cache, "get_database_service_client", lambda: service)
+    return service
+
+
+@pytest.mark.asyncio
+async def test_cache_persists_and_invalidates(tmp_path):
+    path = str(tmp_path / "media.sqlite3")
+    cache = MediaCache(path)
+    await cache.put((1, 0), InputPhoto(id=5, access_hash=6, file_reference=b"x"))
+    await cache.set_photos_count(1, 1)
+    cache.close()
+
+    cache = MediaCache(path)
+    assert await cache.get_many([(1, 0), (1, 1)]) == {(1, 0): InputPhoto(id=5, access_hash=6, file_reference=b"x")}
+    assert await cache.get_photos_count(1) == 1
+
+    await cache.invalidate(1)
+    assert await cache.get_many([(1, 0)]) == {}
+    assert await cache.get_photos_count(1) is None
+    cache.close()
+
+
+@pytest.mark.asyncio
+async def test_sizes_are_cached_separately_and_old_cache_is_migrated(tmp_path):
+    import sqlite3
+
+    path = str(tmp_path / "media.sqlite3")
+    conn = sqlite3.connect(path)
+    conn.execute("""
+        CREATE TABLE photos (
+            property_id INTEGER NOT NULL, photo_num INTEGER NOT NULL, photo_id INTEGER NOT NULL,
+            access_hash INTEGER NOT NULL, file_reference BLOB NOT NULL, PRIMARY KEY (property_id, photo_num)
+        )
+    """)
+    conn.execute("INSERT INTO photos VALUES (1, 0, 5, 6, x'78')")
+    conn.commit()
+    conn.close()
+
+    cache = MediaCache(path)
+    thumb = InputPhoto(id=9, access_hash=6, file_reference=b"t")
+    await cache.put((1, 0), thumb, "thumb")
+
+    assert await cache.get_many([(1, 0)]) == {(1, 0): InputPhoto(id=5, access_hash=6, file_reference=b"x")}
+    assert await cache.get_many([(1, 0)], "thumb") == {(1, 0): thumb}
+    assert await cache.get_many([(1, 0)], "card") == {}
+    cache.close()
+
+
+@pytest.mark.asyncio
+async def test_second_send_uses_cache(cache, database_service):
+    client = FakeTelegramClient()
+    keys = [(1, 0), (1, 1)]
+
+    assert await send_cached_photos(client, 10, keys) == 2
+    assert await send_cached_photos(client, 11, keys) == 2
+
+    assert client.calls["upload_file"] == 2
+    assert database_service.downloads == keys
+    assert all(isinstance(file, InputPhoto) for file in client.sent_files[1][1])
+
+
+@pytest.mark.asyncio
+async def test_expired_reference_is_reuploaded(cache, database_service):
+    await cache.put((1, 0), InputPhoto(id=5, access_hash=6, file_reference=b"old"))
+    client = FakeTelegramClient()
+    client.fail_once(
+        "send_file", FileReferenceExpiredError(request=None),
+        when=lambda user_id, files: any(isinstance(file, InputPhoto) for file in files),
+    )
+
+    assert await send_cached_photos(client, 10, [(1, 0)]) == 1
+
+    assert client.calls["upload_file"] == 1
+    assert (await cache.get_many([(1, 0)]))[(1, 0)].file_reference == b"ref"
@@ -0,0 +1,109 @@
+import pytest
+from telethon.errors import FloodWaitError
+
+from src.benchmarks.fake_telegram import FakeTelegramClient
+from src.bot_logic import media_cache, notifications
+from src.bot_logic.media_cache import MediaCache
+from src.bot_logic.notifications import PropertyFanout, RateLimiter
+
+
+class FakeDatabaseService:
+    def __init__(self, card_error=None, photos_missing=False):
+        self.downloads = 0
+        self.card_requests = 0
+        self.statistics = []
+        self.card_error = card_error
+        self.photos_missing = photos_missing
+
+    async def get_property_card(self, property_id, viewer=None):
+        self.card_requests += 1
+        if self.card_error is not None:
+            raise self.card_error
+        return {"property": {"id": property_id, "city": "Москва"}, "photos": [{"num": 0}, {"num": 1}]}
+
+    async def get_property_photo(self, property_id, photo_num=0, size="original"):
+        self.downloads += 1
+        return None if self.photos_missing else b"jpeg"
+
+    async def increase_statistics(self, property_id, param_name, count=1):
+        self.statistics.append((property_id, param_name, count))
+
+
+@pytest.fixture
+def database_service(tmp_path, monkeypatch):
+    cache = MediaCache(str(tmp_path / "media.sqlite3"))
+    service = FakeDatabaseService()
+    monkeypatch.setattr(media_cache, "_media_cache", cache)
+    monkeypatch.setattr(media_cache, "get_database_service_client", lambda: service)
+    monkeypatch.setattr(notifications, "get_database_service_client", lambda: service)
+    yield service
+    cache.close()
+
+
+def flood_once(client):
+    client.fail_once(
+        "send_message", FloodWaitError(request=None, capture=0), when=lambda user_id, text: user_id != 1,
+    )
+
+
+def recipients(sent):
+    return [user_id for user_id, _ in sent]
+
+
+@pytest.mark.asyncio
+async def test_fanout_builds_card_and_media_once(database_service):
+    client = FakeTelegramClient()
+    fanout = PropertyFanout(client, 5, [10, 11, 12, 11, 13], admin_id=1, limiter=RateLimiter(10_000), concurrency=3)
+
+    result = await fanout.run()
+
+    assert result["recipients"] == 4
+    assert result["delivered"] == 4
+    assert database_service.card_requests == 1
+    assert database_service.downloads == 2
+    assert client.calls["upload_file"] == 2
+    assert sorted(recipients(client.sent_files)) == [10, 11, 12, 13]
+    assert database_service.statistics == [(5, "views", 4)]
+    assert recipients(client.sent_messages)[0] == 1
+
+
+@pytest.mark.asyncio
+async def test_fanout_retries_after_flood_wait(database_service):
+    client = FakeTelegramClient()
+    flood_once(client)
+    fanout = PropertyFanout(client, 5, [10, 11], limiter=RateLimiter(10_000), concurrency=2)
+
+    result = await fanout.run()
+
+    assert result["delivered"] == 2
+    assert result["failed"] == 0
+    # photos are not resent when only the text hit the flood wait
+    assert sorted(recipients(client.sent_files)) == [10, 11]
+
+
+@pytest.mark.asyncio
+async def test_fanout_failure_still_reports_to_admin(database_service):
+    database_service.card_error = RuntimeError("database_service is down")
+    client = FakeTelegramClient()
+    fanout = PropertyFanout(client, 5, [10, 11], admin_id=1, limiter=RateLimiter(10_000))
+
+    result = await fanout.run()
+
+    assert result["aborted"]
+    assert result["delivered"] == 0
+    assert recipients(client.sent_messages) == [1]
+
+
+@pytest.mark.asyncio
+async def test_unsent_photos_are_retried_with_the_message(database_service):
+    database_service.photos_missing = True
+    client = FakeTelegramClient()
+    flood_once(client)
+    fanout = PropertyFanout(client, 5, [10], limiter=RateLimiter(10_000))
+
+    result = await fanout.run()
+
+    assert result["delivered"] == 1
+    assert client.sent_files == []
+    # both photos are requested again on the attempt after the flood wait
+    assert database_service.downloads == 4
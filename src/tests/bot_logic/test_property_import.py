@@ -0,0 +1,167 @@
+import pandas as pd
+import pytest
+
+from src.benchmarks.fake_telegram import FakeTelegramClient
+from src.bot_logic import media_cache, property_import
+from src.bot_logic.media_cache import MediaCache
+from src.bot_logic.property_import import FeedImport, ImageDownloader, read_feed, validate_batch
+
+
+def make_row(**overrides):
+    row = {
+        "Id": "a1",
+        "Category": "Квартиры",
+        "OperationType": "Продам",
+        "Price": 5_000_000,
+        "Address": "Московская область, Москва, Ленина 1",
+        "Rooms": "Студия",
+        "BalconyOrLoggiaMulti": None,
+        "MarketType": "Вторичка",
+        "Square": 31.5,
+        "Floor": 3,
+        "Floors": 9,
+        "DepositAmount": None,
+        "Description": "Уютная студия",
+        "ImageUrls": "https://img/1.jpg | https://img/2.jpg",
+    }
+    row.update(overrides)
+    return row
+
+
+class FakeDatabaseService:
+    def __init__(self):
+        self.next_id = 0
+        self.batches = []
+        self.uploads = []
+        self.deleted = []
+
+    async def new_properties(self, user_id, payloads):
+        self.batches.append(len(payloads))
+        results = []
+        for payload in payloads:
+            if payload["description"] == "reject":
+                results.append({"property_id": None, "error": "value too long", "users_id": []})
+                continue
+            self.next_id += 1
+            results.append({"property_id": self.next_id, "error": None, "users_id": []})
+        return {"status": "ok", "results": results}
+
+    async def upload_images(self, property_id, images):
+        self.uploads.append((property_id, len(images)))
+
+    async def delete_property(self, property_id):
+        self.deleted.append(property_id)
+
+
+def test_validate_batch_reports_bad_rows():
+    rows = [
+        make_row(),
+        make_row(Id="a2", Address="Москва"),
+        make_row(Id="a3", Rooms="много"),
+        make_row(Id="a4", ImageUrls=None),
+    ]
+    valid, errors = validate_batch(rows, user_id=7)
+
+    assert [row_id for row_id, _, _ in valid] == ["a1"]
+    _, payload, image_urls = valid[0]
+    assert payload["city"] == "Москва"
+    assert payload["rooms"] == 1
+    assert payload["deposit"] == 0
+    assert payload["balcony"] is False
+    assert image_urls == ["https://img/1.jpg", "https://img/2.jpg"]
+    assert len(errors) == 3
+    assert "a2" in errors[0] and "город" in errors[0]
+
+
+def test_read_feed_uses_template_sheet(tmp_path):
+    path = tmp_path / "feed.xlsx"
+    columns = list(make_row())
+    with pd.ExcelWriter(path) as writer:
+        pd.DataFrame({"info": ["instructions"]}).to_excel(writer, sheet_name="Инструкция", index=False)
+        # Template layout: title row, header, two description rows, then listings
+        rows = [["Объявления"] + [None] * (len(columns) - 1), columns,
+                ["описание"] * len(columns), ["пример"] * len(columns),
+                list(make_row().values()), [None] * len(columns)]
+        pd.DataFrame(rows).to_excel(writer, sheet_name="Квартиры", index=False, header=False)
+
+    records = read_feed(str(path))
+
+    assert len(records) == 1
+    assert records[0]["Id"] == "a1"
+    assert records[0]["DepositAmount"] is None
+
+
+@pytest.mark.asyncio
+async def test_feed_import_inserts_batches_and_rolls_back_failed_listing(tmp_path, monkeypatch):
+    cache = MediaCache(str(tmp_path / "media.sqlite3"))
+    service = FakeDatabaseService()
+    monkeypatch.setattr(media_cache, "_media_cache", cache)
+    monkeypatch.setattr(property_import, "get_database_service_client", lambda: service)
+
+    rows = [make_row(Id=f"r{index}") for index in range(5)]
+    rows[2]["ImageUrls"] = "https://broken/1.jpg"
+    rows.append(make_row(Id="bad", Rooms="много"))
+    rows.append(make_row(Id="rejected", Description="reject"))
+
+    async def fake_parse(file_path):
+        return rows
+
+    async def fake_download(self, url):
+        if "broken" in url:
+            raise Exception("404")
+        return b"jpeg"
+
+    monkeypatch.setattr(property_import, "parse_feed", fake_parse)
+    monkeypatch.setattr(ImageDownloader, "download", fake_download)
+
+    client = FakeTelegramClient()
+    result = await FeedImport(client, user_id=7, batch_size=2).run("feed.xlsx")
+
+    assert result["total"] == 7
+    assert result["imported"] == 4
+    assert result["errors"] == 3
+    # One insert request per batch, invalid rows never reach the service
+    assert service.batches == [2, 2, 1, 1]
+    assert service.deleted == [3]
+    # All photos of a listing go in one request
+    assert sorted(service.uploads) == [(1, 2), (2, 2), (4, 2), (5, 2)]
+    # One progress message edited in place plus the error summary
+    assert len(client.sent_messages) == 2
+    assert all(row_id in client.sent_messages[-1][1] for row_id in ("r2", "bad", "rejected"))
+    cache.close()
+
+
+class UnavailableDatabaseService(FakeDatabaseService):
+    async def upload_images(self, property_id, images):
+        raise ConnectionError("database_service is down")
+
+    async def delete_property(self, property_id):
+        raise ConnectionError("database_service is down")
+
+
+@pytest.mark.asyncio
+async def test_feed_import_survives_failed_rollback(tmp_path, monkeypatch):
+    cache = MediaCache(str(tmp_path / "media.sqlite3"))
+    service = UnavailableDatabaseService()
+    monkeypatch.setattr(media_cache, "_media_cache", cache)
+    monkeypatch.setattr(property_import, "get_database_service_client", lambda: service)
+
+    async def fake_parse(file_path):
+        return [make_row(Id=f"r{index}") for index in range(3)]
+
+    async def fake_download(self, url):
+        return b"jpeg"
+
+    monkeypatch.setattr(property_import, "parse_feed", fake_parse)
+    monkeypatch.setattr(ImageDownloader, "download", fake_download)
+
+    client = FakeTelegramClient()
+    result = await FeedImport(client, user_id=7, batch_size=2).run("feed.xlsx")
+
+    assert result["imported"] == 0
+    assert result["errors"] == 3
+    # Every batch is still sent and the admin gets the error summary
+    assert service.batches == [2, 1]
+    assert len(client.sent_messages) == 2
+    assert all(row_id in client.sent_messages[-1][1] for row_id in ("r0", "r1", "r2"))
+    cache.close()
@@ -0,0 +1,82 @@
+from types import SimpleNamespace
+
+import pytest
+
+from src.bot_logic.router import UpdateRouter
+from src.bot_logic.state_machine import get_state_machine
+
+
+class Recorder:
+    def __init__(self, name, calls):
+        self.name = name
+        self.calls = calls
+
+    async def __call__(self, event):
+        self.calls.append(self.name)
+
+
+@pytest.fixture
+def calls():
+    return []
+
+
+@pytest.fixture
+def router(calls):
+    router = UpdateRouter()
+    router.add_command("/start", Recorder("start", calls))
+    router.add_message("/register_admin", Recorder("register_admin", calls))
+    router.add_callback("search:", Recorder("search", calls))
+    router.add_callback("search_reset:", Recorder("search_reset", calls))
+    router.add_state("CREATING_PROPERTY", Recorder("creating_property", calls))
+    router.set_default_message(Recorder("default", calls))
+    return router
+
+
+def message(user_id, text):
+    return SimpleNamespace(sender_id=user_id, text=text)
+
+
+def callback(user_id, data):
+    return SimpleNamespace(sender_id=user_id, data=data.encode())
+
+
+@pytest.mark.asyncio
+async def test_routes_commands_and_prefixes(router, calls):
+    get_state_machine().go_neutral(501)
+
+    await router.on_message(message(501, "/start"))
+    await router.on_message(message(501, "/register_admin secret"))
+    await router.on_callback(callback(501, "search:Дом"))
+    await router.on_callback(callback(501, "search_reset:Дом"))
+
+    assert calls == ["start", "register_admin", "search", "search_reset"]
+
+
+@pytest.mark.asyncio
+async def test_state_fallback_only_without_command(router, calls):
+    get_state_machine().starting_add_property(502)
+
+    await router.on_callback(callback(502, "квартира"))
+    await router.on_message(message(502, "Москва"))
+    await router.on_callback(callback(502, "/start"))
+
+    assert calls == ["creating_property", "creating_property", "start"]
+    get_state_machine().go_neutral(502)
+
+
+@pytest.mark.asyncio
+async def test_default_and_unrouted(router, calls):
+    get_state_machine().go_neutral(503)
+
+    await router.on_message(message(503, "Просто текст"))
+    await router.on_callback(callback(503, "unknown:1"))
+
+    assert calls == ["default"]
+    statistics = router.statistics()
+    assert statistics["message default"]["count"] == 1
+    assert statistics["callback unrouted"]["count"] == 1
+
+
+def test_duplicate_route_raises(router, calls):
+    with pytest.raises(ValueError):
+        router.add_callback("search:", Recorder("other", calls))
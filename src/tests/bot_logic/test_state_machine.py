@@ -1,4 +1,7 @@
+from types import SimpleNamespace
+
 import pytest
+from src.bot_logic import state_machine as state_machine_module
 from src.bot_logic.state_machine import get_state_machine
 
 @pytest.fixture
@@ -9,21 +12,55 @@ def state_machine():
 
 def test_goes_to_neutral(state_machine):
     user_id = 123
-    state_machine.user_state[user_id] = "SOME_STATE"
-    state_machine.user_property_filters[user_id] = {"city": "Москва"}
+    state_machine.starting_property_filter(user_id)
+    state_machine.save_filter_info(user_id, "CITY", "Москва")
     state_machine.go_neutral(user_id)
 
-    assert state_machine.user_state[user_id] == "NEUTRAL"
-    assert state_machine.user_property_state[user_id] == 0
-    assert state_machine.user_property_filters[user_id] == {}
-    assert state_machine.user_update_param[user_id] == {}
-    assert state_machine.user_creating_property_param[user_id] == 0
+    session = state_machine.sessions[user_id]
+    assert session.state == "NEUTRAL"
+    assert session.property_state == 0
+    assert session.property_filters is None
+    assert session.update_param is None
+    assert session.creating_property_param == 0
 
-def test_get_state_initializes_neutral(state_machine):
+def test_get_state_does_not_create_session(state_machine):
     user_id = 999
-    state = state_machine.get_state(user_id)
-    assert state == "NEUTRAL"
-    assert state_machine.user_property_state[user_id] == 0
+    state_machine.sessions.pop(user_id, None)
+    assert state_machine.get_state(user_id) == "NEUTRAL"
+    assert state_machine.get_property_state(user_id) == "NEUTRAL"
+    assert user_id not in state_machine.sessions
+
+def test_idle_sessions_expire(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(state_machine_module, "time", SimpleNamespace(monotonic=lambda: clock[0]))
+    state_machine = state_machine_module.StateMachine(idle_timeout=3, wheel_tick=1)
+    state_machine.starting_add_property(1)
+    state_machine.starting_add_property(2)
+    state_machine._dirty.clear()
+
+    clock[0] += 2
+    state_machine.next_creating_property_pram(2)
+    state_machine._dirty.clear()
+    assert state_machine.expire_idle() == 0
+
+    clock[0] += 2
+    assert state_machine.expire_idle() == 1
+    assert list(state_machine.sessions) == [2]
+
+    clock[0] += 5
+    assert state_machine.expire_idle() == 1
+    assert state_machine.memory_stats()["sessions"] == 0
+    assert state_machine.memory_stats()["evicted"] == 2
+
+def test_unsaved_sessions_are_not_expired(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(state_machine_module, "time", SimpleNamespace(monotonic=lambda: clock[0]))
+    state_machine = state_machine_module.StateMachine(idle_timeout=1, wheel_tick=1)
+    state_machine.starting_add_property(1)
+
+    clock[0] += 5
+    assert state_machine.expire_idle() == 0
+    assert 1 in state_machine.sessions
 
 def test_get_filter_param_type_valid(state_machine):
     assert state_machine.get_filter_param_type("city") == "str"
@@ -0,0 +1,105 @@
+import asyncio
+
+import pytest
+
+from src.bot_logic.state_machine import StateMachine
+from src.bot_logic.state_storage import MemoryStateStorage, SQLiteStateStorage
+
+
+class FailingStorage(MemoryStateStorage):
+    async def save_many(self, sessions):
+        raise RuntimeError("storage is down")
+
+
+@pytest.mark.asyncio
+async def test_conversation_survives_restart(tmp_path):
+    path = str(tmp_path / "state.sqlite3")
+    state_machine = StateMachine(SQLiteStateStorage(path))
+    state_machine.go_neutral(1)
+    state_machine.starting_property_filter(1)
+    state_machine.save_filter_info(1, "NAME", "Дом")
+    state_machine.next_property_filter(1)
+    await state_machine.flush()
+    await state_machine.storage.close()
+
+    restarted = StateMachine(SQLiteStateStorage(path))
+    await restarted.ensure_loaded(1)
+
+    assert restarted.get_state(1) == "PROPERTY_FILTERS"
+    assert restarted.get_property_state(1) == "PROPERTY_TYPE"
+    assert restarted.sessions[1].property_filters == {"name": "Дом"}
+    await restarted.storage.close()
+
+
+@pytest.mark.asyncio
+async def test_writes_are_batched():
+    storage = MemoryStateStorage()
+    state_machine = StateMachine(storage)
+    for user_id in range(10):
+        state_machine.go_neutral(user_id)
+        state_machine.starting_add_property(user_id)
+
+    assert storage.sessions == {}
+    await state_machine.flush()
+
+    assert len(storage.sessions) == 10
+    assert state_machine._dirty == set()
+
+
+@pytest.mark.asyncio
+async def test_failed_flush_keeps_dirty_sessions():
+    state_machine = StateMachine(FailingStorage())
+    state_machine.go_neutral(7)
+
+    await state_machine.flush()
+
+    assert state_machine._dirty == {7}
+
+
+@pytest.mark.asyncio
+async def test_dialog_finished_by_other_worker_is_reset(monkeypatch):
+    monkeypatch.setattr("src.bot_logic.state_machine.STATE_CACHE_TTL", 0)
+    storage = MemoryStateStorage()
+    first, second = StateMachine(storage), StateMachine(storage)
+    first.starting_add_property(3)
+    first.save_property_param(3, "city", "Москва")
+    await first.flush()
+
+    await second.ensure_loaded(3)
+    assert second.get_property_params(3) == {"city": "Москва"}
+    second.end_creating_property(3)
+    await second.flush()
+
+    await first.ensure_loaded(3)
+    assert first.get_state(3) == "NEUTRAL"
+    assert first.get_property_params(3) == {}
+
+
+class SlowStorage(MemoryStateStorage):
+    def __init__(self):
+        super().__init__()
+        self.saving = asyncio.Event()
+        self.release = asyncio.Event()
+
+    async def save_many(self, sessions):
+        self.saving.set()
+        await self.release.wait()
+        await super().save_many(sessions)
+
+
+@pytest.mark.asyncio
+async def test_load_during_flush_keeps_local_state(monkeypatch):
+    monkeypatch.setattr("src.bot_logic.state_machine.STATE_CACHE_TTL", 0)
+    storage = SlowStorage()
+    state_machine = StateMachine(storage)
+    state_machine.starting_add_property(4)
+    flush = asyncio.create_task(state_machine.flush())
+    await storage.saving.wait()
+
+    await state_machine.ensure_loaded(4)
+    assert state_machine.get_state(4) == "CREATING_PROPERTY"
+
+    storage.release.set()
+    await flush
+    await state_machine.ensure_loaded(4)
+    assert state_machine.get_state(4) == "CREATING_PROPERTY"
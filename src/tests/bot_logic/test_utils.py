@@ -0,0 +1,26 @@
+import httpx
+import pytest
+
+from src.bot_logic.utils import load_page, page_cursor
+
+
+def test_page_cursor_treats_old_offsets_as_first_page():
+    assert page_cursor("show_properties:") is None
+    assert page_cursor("show_properties:10") is None
+    assert page_cursor("/favorites_list:20") is None
+    assert page_cursor("show_properties:WzEyLDNd") == "WzEyLDNd"
+
+
+@pytest.mark.asyncio
+async def test_rejected_cursor_restarts_from_first_page():
+    requested = []
+
+    async def load(cursor):
+        requested.append(cursor)
+        if cursor is not None:
+            request = httpx.Request("GET", "http://db_service:8005/properties")
+            raise httpx.HTTPStatusError("bad cursor", request=request, response=httpx.Response(400, request=request))
+        return {"properties": [], "next_cursor": None}
+
+    assert await load_page(load, "broken") == {"properties": [], "next_cursor": None}
+    assert requested == ["broken", None]
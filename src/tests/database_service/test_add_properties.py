@@ -0,0 +1,73 @@
+import itertools
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+
+import pytest
+
+from src.database_service.db_manager import PROPERTY_COLUMNS, SqlDatabaseManager
+
+INT4_MAX = 2 ** 31 - 1
+
+
+class CopyConnection:
+    """Encodes COPY records on the client like asyncpg and keeps rows of committed savepoints"""
+    def __init__(self):
+        self.ids = itertools.count(1)
+        self.rows = []
+        self._pending = []
+        self._depth = 0
+
+    async def fetch(self, query, count):
+        return [{"id": next(self.ids)} for _ in range(count)]
+
+    async def copy_records_to_table(self, table, records, columns):
+        for record in records:
+            for value in record:
+                if isinstance(value, int) and not isinstance(value, bool) and value > INT4_MAX:
+                    raise OverflowError("value out of int32 range")
+        if table == "properties":
+            self._pending.extend(record[0] for record in records)
+
+    @asynccontextmanager
+    async def transaction(self):
+        start = len(self._pending)
+        self._depth += 1
+        try:
+            yield
+        except BaseException:
+            del self._pending[start:]
+            raise
+        finally:
+            self._depth -= 1
+        if not self._depth:
+            self.rows.extend(self._pending)
+            self._pending.clear()
+
+
+class CopyPool:
+    def __init__(self, conn):
+        self.conn = conn
+
+    @asynccontextmanager
+    async def acquire(self):
+        yield self.conn
+
+
+def new_property(**overrides):
+    values = dict.fromkeys(PROPERTY_COLUMNS)
+    values.update(return_contact="1", property_type="квартира", deal_type="продажа", price=5_000_000)
+    values.update(overrides)
+    return SimpleNamespace(**values)
+
+
+@pytest.mark.asyncio
+async def test_oversized_price_fails_only_its_row():
+    manager = SqlDatabaseManager("postgresql://unused")
+    conn = CopyConnection()
+    manager.pool = CopyPool(conn)
+
+    results = await manager.add_properties([new_property(), new_property(price=3_000_000_000), new_property()])
+
+    assert [result["property_id"] is not None for result in results] == [True, False, True]
+    assert "int32" in results[1]["error"]
+    assert len(conn.rows) == 2
@@ -0,0 +1,89 @@
+import hashlib
+import io
+import os
+from collections import Counter
+
+import pytest
+
+from src.database_service import blob_store
+from src.database_service.blob_store import blob_path, collect_garbage, store_images
+
+
+class FakeBlobDatabase:
+    """In-memory refcounts behind the SqlDatabaseManager blob methods"""
+    def __init__(self):
+        self.refcounts = Counter()
+        self.paths = {}
+
+    async def acquire_blobs(self, blobs):
+        for sha256, path, size in blobs:
+            self.refcounts[sha256] += 1
+            self.paths[sha256] = path
+
+    async def release_blobs(self, sha256s):
+        for sha256 in sha256s:
+            self.refcounts[sha256] -= 1
+
+    async def collect_blobs(self, remove, grace, limit):
+        unreferenced = [sha256 for sha256, count in self.refcounts.items() if count <= 0][:limit]
+        if unreferenced:
+            await remove([self.paths[sha256] for sha256 in unreferenced])
+        for sha256 in unreferenced:
+            del self.refcounts[sha256]
+            del self.paths[sha256]
+        return len(unreferenced)
+
+
+@pytest.fixture(autouse=True)
+def no_variants(monkeypatch):
+    async def process_photos(paths):
+        return len(paths)
+
+    monkeypatch.setattr(blob_store, "process_photos", process_photos)
+
+
+@pytest.mark.asyncio
+async def test_identical_images_are_stored_once(tmp_path, monkeypatch):
+    database = FakeBlobDatabase()
+    written = []
+    write_files = blob_store.write_files
+    monkeypatch.setattr(blob_store, "write_files", lambda files: written.extend(files) or write_files(files))
+
+    first = await store_images(str(tmp_path), [io.BytesIO(b"kitchen"), io.BytesIO(b"kitchen")], database)
+    second = await store_images(str(tmp_path), [io.BytesIO(b"kitchen"), io.BytesIO(b"bedroom")], database)
+
+    sha256 = hashlib.sha256(b"kitchen").hexdigest()
+    assert first[0].path == blob_path(str(tmp_path), sha256) == os.path.join(str(tmp_path), sha256[:2], sha256[2:4], sha256)
+    assert first[0] == first[1] == second[0]
+    assert len(written) == 2
+    assert database.refcounts[sha256] == 3
+    with open(first[0].path, "rb") as f:
+        assert f.read() == b"kitchen"
+
+
+@pytest.mark.asyncio
+async def test_garbage_collection_keeps_referenced_blobs(tmp_path):
+    database = FakeBlobDatabase()
+    shared, single = await store_images(str(tmp_path), [io.BytesIO(b"facade"), io.BytesIO(b"yard")], database)
+    await database.acquire_blobs([shared])
+
+    await database.release_blobs([shared.sha256, single.sha256])
+    assert await collect_garbage(database, grace=0) == 1
+
+    assert os.path.exists(shared.path)
+    assert not os.path.exists(single.path)
+
+
+@pytest.mark.asyncio
+async def test_failed_write_releases_references(tmp_path, monkeypatch):
+    database = FakeBlobDatabase()
+
+    def broken_write(files):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(blob_store, "write_files", broken_write)
+
+    with pytest.raises(OSError):
+        await store_images(str(tmp_path), [io.BytesIO(b"balcony")], database)
+
+    assert database.refcounts[hashlib.sha256(b"balcony").hexdigest()] == 0
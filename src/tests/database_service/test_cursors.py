@@ -0,0 +1,30 @@
+import datetime
+
+import pytest
+
+from src.database_service.cursors import (
+    MAX_CURSOR_LENGTH, decode_cursor, encode_cursor, int_to_timestamp, timestamp_to_int,
+)
+
+
+def test_cursor_round_trip_fits_callback_data():
+    created_at = datetime.datetime(2025, 3, 14, 15, 9, 26, 535897)
+    cursor = encode_cursor(timestamp_to_int(created_at), 2_147_483_647)
+
+    assert len(cursor) <= MAX_CURSOR_LENGTH
+    # Telegram callback data is limited to 64 bytes together with the route prefix
+    assert len(f"show_properties:{cursor}".encode()) <= 64
+    micros, property_id = decode_cursor(cursor, 2)
+    assert int_to_timestamp(micros) == created_at
+    assert property_id == 2_147_483_647
+
+
+def test_empty_cursor_means_first_page():
+    assert decode_cursor(None, 1) is None
+    assert decode_cursor("", 1) is None
+
+
+@pytest.mark.parametrize("cursor", ["not-base64!", encode_cursor(1, 2), encode_cursor("1"), "A" * 100])
+def test_invalid_cursor_is_rejected(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor, 1)
@@ -0,0 +1,73 @@
+import asyncio
+
+import pytest
+
+from src.database_service.db_metrics import (
+    DB_METHOD_SECONDS, DB_QUERIES, DB_ROWS, MeteredPool, _count, _status_rows, meter_methods,
+)
+
+
+class FakePool:
+    """One connection, so a second acquire has to wait"""
+    def __init__(self):
+        self.free = asyncio.Semaphore(1)
+
+    async def acquire(self, timeout=None):
+        await self.free.acquire()
+        return object()
+
+    async def release(self, conn):
+        self.free.release()
+
+
+@pytest.mark.asyncio
+async def test_pool_counts_waiting_acquires():
+    pool = MeteredPool(FakePool())
+    entered = asyncio.Event()
+    release = asyncio.Event()
+
+    async def hold():
+        async with pool.acquire():
+            entered.set()
+            await release.wait()
+
+    holder = asyncio.create_task(hold())
+    await entered.wait()
+    waiter = asyncio.create_task(hold())
+    await asyncio.sleep(0)
+    assert pool.waiting == 1
+
+    release.set()
+    await asyncio.gather(holder, waiter)
+    assert pool.waiting == 0
+
+
+def test_status_rows():
+    assert _status_rows("INSERT 0 5") == 5
+    assert _status_rows("UPDATE 3") == 3
+    assert _status_rows("BEGIN") == 0
+    assert _status_rows(None) == 0
+
+
+@pytest.mark.asyncio
+async def test_queries_are_attributed_to_the_manager_method():
+    @meter_methods
+    class Manager:
+        async def get_things(self):
+            _count(4)
+            await self.count_more()
+            _count(1)
+
+        async def count_more(self):
+            _count(2)
+
+        async def _private(self):
+            pass
+
+    await Manager().get_things()
+
+    assert DB_ROWS.labels("get_things").value >= 5
+    assert DB_ROWS.labels("count_more").value >= 2
+    assert DB_QUERIES.labels("get_things").value >= 2
+    assert sum(DB_METHOD_SECONDS.labels("get_things").counts) >= 1
+    assert ("_private",) not in DB_METHOD_SECONDS._children
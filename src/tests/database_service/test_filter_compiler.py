@@ -0,0 +1,55 @@
+import json
+
+from src.database_service.filter_compiler import FilterPlanCache, compile_filter
+
+
+def make_filter(**overrides):
+    row = {
+        "telegram_id": 7, "property_type": "квартира", "deal_type": "аренда", "city": "Москва",
+        "areas": None, "min_price": None, "max_price": None, "min_rooms": None, "max_rooms": None,
+        "min_total_area": None, "max_total_area": None, "balcony": None, "renovated": None,
+        "min_deposit": None, "max_deposit": None, "floor": None, "total_floors": None,
+    }
+    row.update(overrides)
+    return row
+
+
+def test_same_shape_filters_share_sql_text():
+    first = compile_filter(1, make_filter(min_price=10, max_price=20, areas=json.dumps(["центр"])))
+    second = compile_filter(2, make_filter(min_price=30, max_price=40, areas=json.dumps(["юг", "север"])))
+    other = compile_filter(3, make_filter(min_price=10))
+
+    assert first.next_sql == second.next_sql
+    assert first.behind_sql == second.behind_sql
+    assert first.next_sql != other.next_sql
+    assert first.params == ("Активно", "квартира", "аренда", "Москва", ["центр"], 10, 20)
+    assert second.params[-3:] == (["юг", "север"], 30, 40)
+
+
+def test_params_follow_placeholders():
+    compiled = compile_filter(1, make_filter(balcony=True, renovated="", total_floors=9, min_deposit=0))
+
+    assert compiled.params == ("Активно", "квартира", "аренда", "Москва", True, 0, 9)
+    assert "renovated" not in compiled.next_sql
+    # Cursor and shown ids follow the filter parameters
+    assert "id > $8" in compiled.next_sql
+    assert "ANY($9::int[])" in compiled.behind_sql
+
+
+def test_cache_invalidation_and_stale_plans():
+    cache = FilterPlanCache(max_size=2)
+    cache.put(compile_filter(1, make_filter()))
+    generation = cache.generation
+
+    cache.invalidate(1)
+    # A plan compiled from a row read before the update must not be cached
+    cache.put(compile_filter(1, make_filter()), generation)
+
+    assert cache.get(1) is None
+    cache.put(compile_filter(1, make_filter()), cache.generation)
+    cache.put(compile_filter(2, make_filter()))
+    assert cache.get(1) is not None
+    cache.put(compile_filter(3, make_filter()))
+    assert cache.get(2) is None
+    assert len(cache) == 2
+    assert cache.hits == 1 and cache.misses == 2
@@ -0,0 +1,125 @@
+import json
+import random
+from types import SimpleNamespace
+
+import pytest
+from src.database_service.filter_index import FilterIndex
+
+CITIES = ["Москва", "Казань", None]
+PROPERTY_TYPES = ["квартира", "дом", None]
+DEAL_TYPES = ["аренда", "продажа", None]
+AREAS = ["центр", "север", "юг"]
+
+def make_filter(filter_id, rng):
+    def bound(low, high):
+        return rng.choice([None, rng.randint(low, high)])
+
+    return {
+        "id": filter_id,
+        "telegram_id": 1000 + filter_id,
+        "is_active": rng.random() > 0.1,
+        "city": rng.choice(CITIES),
+        "property_type": rng.choice(PROPERTY_TYPES),
+        "deal_type": rng.choice(DEAL_TYPES),
+        "areas": rng.choice([None, json.dumps(rng.sample(AREAS, 2))]),
+        "min_price": bound(0, 50), "max_price": bound(50, 100),
+        "min_rooms": bound(0, 2), "max_rooms": bound(2, 5),
+        "min_total_area": bound(10, 50), "max_total_area": bound(50, 120),
+        "min_deposit": bound(0, 10), "max_deposit": bound(10, 20),
+        "balcony": rng.choice([None, True, False]),
+        "renovated": rng.choice([None, "Да", "Нет"]),
+        "floor": bound(1, 3),
+        "total_floors": bound(3, 5),
+    }
+
+def make_property(rng):
+    return SimpleNamespace(
+        property_type=rng.choice(PROPERTY_TYPES[:-1]),
+        deal_type=rng.choice(DEAL_TYPES[:-1]),
+        city=rng.choice(CITIES),
+        area=rng.choice(AREAS + [None]),
+        price=rng.randint(0, 100),
+        rooms=rng.choice([None, rng.randint(0, 5)]),
+        total_area=rng.choice([None, rng.randint(10, 120)]),
+        deposit=rng.choice([None, rng.randint(0, 20)]),
+        balcony=rng.choice([None, True, False]),
+        renovated=rng.choice([None, "Да", "Нет"]),
+        floor=rng.choice([None, rng.randint(1, 3)]),
+        total_floors=rng.choice([None, rng.randint(3, 5)]),
+    )
+
+def sql_matches(row, property):
+    """Повторяет условия SQL запроса SqlDatabaseManager.get_filters_for_property"""
+    if not row["is_active"]:
+        return False
+    for field in ("property_type", "deal_type", "city"):
+        if getattr(property, field) and row[field] is not None and row[field] != getattr(property, field):
+            return False
+    if property.area and row["areas"] is not None and property.area not in json.loads(row["areas"]):
+        return False
+    for field in ("rooms", "price", "total_area", "deposit"):
+        value = getattr(property, field)
+        low, high = row["min_" + field], row["max_" + field]
+        if value is not None and low is not None and high is not None and not (low <= value <= high):
+            return False
+    for field in ("balcony", "floor", "total_floors"):
+        value = getattr(property, field)
+        if value is not None and row[field] is not None and row[field] != value:
+            return False
+    if property.renovated and row["renovated"] is not None and row["renovated"] != property.renovated:
+        return False
+    return True
+
+@pytest.fixture
+def rng():
+    return random.Random(42)
+
+def test_index_matches_sql_semantics(rng):
+    rows = [make_filter(filter_id, rng) for filter_id in range(1, 2001)]
+    index = FilterIndex()
+    index.rebuild(rows)
+
+    for _ in range(300):
+        property = make_property(rng)
+        expected = sorted(row["id"] for row in rows if sql_matches(row, property))
+        assert sorted(f.filter_id for f in index.match(property)) == expected
+
+def test_batch_match_equals_single_matches(rng):
+    index = FilterIndex()
+    index.rebuild(make_filter(filter_id, rng) for filter_id in range(1, 1001))
+    properties = [make_property(rng) for _ in range(200)]
+
+    batch = index.match_telegram_ids_many(properties)
+
+    assert batch == [index.match_telegram_ids(property) for property in properties]
+
+def test_index_incremental_updates(rng):
+    rows = {filter_id: make_filter(filter_id, rng) for filter_id in range(1, 301)}
+    index = FilterIndex()
+    index.rebuild(rows.values())
+
+    for filter_id in range(1, 301, 3):
+        del rows[filter_id]
+        index.remove(filter_id)
+    for filter_id in range(2, 301, 3):
+        rows[filter_id] = dict(make_filter(filter_id, rng), id=filter_id)
+        index.upsert(rows[filter_id])
+
+    assert len(index) == sum(1 for row in rows.values() if row["is_active"])
+    for _ in range(200):
+        property = make_property(rng)
+        expected = sorted(row["id"] for row in rows.values() if sql_matches(row, property))
+        assert sorted(f.filter_id for f in index.match(property)) == expected
+
+def test_deactivated_filter_leaves_index(rng):
+    row = make_filter(1, rng)
+    row.update(is_active=True, city=None, property_type=None, deal_type=None, areas=None)
+    index = FilterIndex()
+    index.upsert(row)
+    property = make_property(rng)
+    assert len(index) == 1
+
+    index.upsert(dict(row, is_active=False))
+
+    assert len(index) == 0
+    assert index.match_telegram_ids(property) == []
@@ -0,0 +1,30 @@
+import io
+
+import pytest
+
+from src.database_service.image_writer import save_files, write_files
+
+
+@pytest.mark.asyncio
+async def test_save_files_writes_all_images(tmp_path):
+    files = [(str(tmp_path / f"7_{number}.jpeg"), io.BytesIO(b"photo%d" % number)) for number in range(3)]
+
+    await save_files(files)
+
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["7_0.jpeg", "7_1.jpeg", "7_2.jpeg"]
+    assert (tmp_path / "7_2.jpeg").read_bytes() == b"photo2"
+
+
+class BrokenSource(io.BytesIO):
+    """Upload stream whose connection drops"""
+    def read(self, *args):
+        raise OSError("connection reset")
+
+
+def test_write_files_leaves_nothing_on_failure(tmp_path):
+    files = [(str(tmp_path / "7_0.jpeg"), io.BytesIO(b"photo")), (str(tmp_path / "7_1.jpeg"), BrokenSource())]
+
+    with pytest.raises(OSError):
+        write_files(files)
+
+    assert list(tmp_path.iterdir()) == []
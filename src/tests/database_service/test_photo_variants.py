@@ -0,0 +1,79 @@
+import asyncio
+import os
+
+import pytest
+from PIL import Image
+
+from src.database_service import photo_variants
+from src.database_service.photo_variants import (
+    process_photos, remove_photo_files, render_variants, resolve_photo, variant_path,
+)
+
+
+def make_photo(path, size=(2000, 1500)):
+    Image.new("RGB", size, (200, 120, 40)).save(path, "JPEG")
+    return str(path)
+
+
+def test_render_variants_downscales(tmp_path):
+    path = make_photo(tmp_path / "7_0.jpeg")
+
+    created = render_variants(path)
+
+    assert variant_path(path, "original", "jpeg") == path
+    assert len(created) == 5
+    with Image.open(variant_path(path, "thumb", "jpeg")) as thumb:
+        assert max(thumb.size) == 320
+    with Image.open(variant_path(path, "card", "webp")) as card:
+        assert card.format == "WEBP"
+        assert card.size == (1280, 960)
+    with Image.open(variant_path(path, "original", "webp")) as original:
+        assert original.size == (2000, 1500)
+
+
+def test_small_photo_is_not_upscaled(tmp_path):
+    path = make_photo(tmp_path / "7_0.jpeg", size=(200, 100))
+
+    render_variants(path)
+
+    with Image.open(variant_path(path, "card", "jpeg")) as card:
+        assert card.size == (200, 100)
+
+
+@pytest.mark.asyncio
+async def test_resolve_photo_renders_missing_variants_and_remove_cleans_up(tmp_path):
+    path = make_photo(tmp_path / "7_0.jpeg")
+
+    assert await resolve_photo(path, "thumb", "webp") == variant_path(path, "thumb", "webp")
+
+    remove_photo_files([path])
+    assert list(tmp_path.iterdir()) == []
+
+
+@pytest.mark.asyncio
+async def test_broken_photo_falls_back_to_original(tmp_path):
+    path = tmp_path / "7_0.jpeg"
+    path.write_bytes(b"not an image")
+
+    assert await process_photos([str(path)]) == 0
+    assert await resolve_photo(str(path), "thumb", "jpeg") == str(path)
+
+
+@pytest.mark.asyncio
+async def test_concurrent_requests_share_one_render(tmp_path, monkeypatch):
+    path = make_photo(tmp_path / "7_0.jpeg")
+    renders = []
+
+    def counting_render(source):
+        renders.append(source)
+        return render_variants(source)
+
+    monkeypatch.setattr(photo_variants, "get_photo_executor", lambda: None)
+    monkeypatch.setattr(photo_variants, "render_variants", counting_render)
+
+    results = await asyncio.gather(*(resolve_photo(path, "card", "webp") for _ in range(6)))
+
+    assert results == [variant_path(path, "card", "webp")] * 6
+    assert renders == [path]
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".tmp")]
+    assert not photo_variants._renders
@@ -0,0 +1,307 @@
+"""Query plan regression suite.
+
+Seeds a disposable Postgres database (TEST_DATABASE_URL, dropped and recreated
+by create_tables helpers) with synthetic data, runs SqlDatabaseManager methods
+while recording every statement they issue, and fails if EXPLAIN shows a
+sequential scan on one of the large tables.
+"""
+import json
+import os
+from types import SimpleNamespace
+
+import asyncpg
+import pytest
+
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+
+pytestmark = pytest.mark.skipif(not TEST_DATABASE_URL, reason="TEST_DATABASE_URL is not set")
+
+LARGE_TABLES = {
+    "users", "properties", "property_photos", "photo_blobs", "property_statistics",
+    "user_property_preferences", "user_favorites",
+}
+
+USERS = 20_000
+PROPERTIES = 50_000
+FILTERS = 20_000
+FAVORITES = 60_000
+PHOTOS_PER_PROPERTY = 3
+UNREFERENCED_BLOBS = 1_000
+
+SEED_SQL = f"""
+    INSERT INTO users (telegram_id, is_admin)
+    SELECT 1000 + n, n % 5000 = 0 FROM generate_series(1, {USERS}) AS n;
+
+    INSERT INTO properties (
+        return_contact, property_type, deal_type, price, city, area, rooms, balcony,
+        renovated, total_area, floor, total_floors, deposit, description, state
+    )
+    SELECT '1',
+        (ARRAY['квартира', 'дом', 'комната', 'участок', 'коммерческая'])[1 + n % 5],
+        (ARRAY['аренда', 'продажа'])[1 + n % 2],
+        10000 + (n * 7919) % 5000000,
+        'Город ' || (n % 50),
+        'Район ' || (n % 10),
+        1 + n % 5, n % 2 = 0, 'Да', 20 + n % 100, 1 + n % 9, 9, n % 50000, 'Объявление',
+        CASE WHEN n % 10 = 0 THEN 'Неактивно' ELSE 'Активно' END
+    FROM generate_series(1, {PROPERTIES}) AS n;
+
+    INSERT INTO property_statistics (property_id) SELECT id FROM properties;
+
+    INSERT INTO photo_blobs (sha256, path, size, refcount)
+    SELECT md5(id::text) || md5(id::text), '/ad_images/blobs/' || id, 100000, 1 FROM properties;
+
+    INSERT INTO photo_blobs (sha256, path, size, refcount, released_at)
+    SELECT md5('unreferenced' || n) || md5(n::text), '/ad_images/blobs/unreferenced' || n, 100000, 0,
+        NOW() - INTERVAL '2 days'
+    FROM generate_series(1, {UNREFERENCED_BLOBS}) AS n;
+
+    -- The first photo of every property lives in the blob store, the rest use legacy paths
+    INSERT INTO property_photos (property_id, photo_path, blob_sha256)
+    SELECT id, '/ad_images/' || id || '_' || num || '.jpeg',
+        CASE WHEN num = 0 THEN md5(id::text) || md5(id::text) END
+    FROM properties, generate_series(0, {PHOTOS_PER_PROPERTY - 1}) AS num;
+
+    INSERT INTO user_property_preferences (
+        telegram_id, name, property_type, deal_type, city, areas, min_price, max_price, is_active
+    )
+    SELECT 1000 + 1 + n % {USERS}, 'Фильтр ' || n,
+        (ARRAY['квартира', 'дом', 'комната', 'участок', 'коммерческая'])[1 + n % 5],
+        (ARRAY['аренда', 'продажа'])[1 + n % 2],
+        'Город ' || (n % 50),
+        CASE WHEN n % 3 = 0 THEN NULL ELSE jsonb_build_array('Район ' || (n % 10)) END,
+        0, 10000000, n % 4 <> 0
+    FROM generate_series(1, {FILTERS}) AS n;
+
+    INSERT INTO user_favorites (telegram_id, property_id)
+    SELECT 1000 + 1 + n % {USERS}, 1 + (n * 31) % {PROPERTIES} FROM generate_series(1, {FAVORITES}) AS n;
+"""
+
+
+class RecordingConnection:
+    """Proxies an asyncpg connection and records every statement"""
+    def __init__(self, conn, statements):
+        self._conn = conn
+        self._statements = statements
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def _record(self, query, args):
+        self._statements.append((query, args))
+
+    async def fetch(self, query, *args, **kwargs):
+        self._record(query, args)
+        return await self._conn.fetch(query, *args, **kwargs)
+
+    async def fetchrow(self, query, *args, **kwargs):
+        self._record(query, args)
+        return await self._conn.fetchrow(query, *args, **kwargs)
+
+    async def fetchval(self, query, *args, **kwargs):
+        self._record(query, args)
+        return await self._conn.fetchval(query, *args, **kwargs)
+
+    async def execute(self, query, *args, **kwargs):
+        self._record(query, args)
+        return await self._conn.execute(query, *args, **kwargs)
+
+
+class _Acquire:
+    def __init__(self, pool, statements):
+        self._acquire = pool.acquire()
+        self._statements = statements
+
+    async def __aenter__(self):
+        return RecordingConnection(await self._acquire.__aenter__(), self._statements)
+
+    async def __aexit__(self, *exc):
+        return await self._acquire.__aexit__(*exc)
+
+
+class RecordingPool:
+    """Hands out recording connections"""
+    def __init__(self, pool, statements):
+        self._pool = pool
+        self._statements = statements
+
+    def __getattr__(self, name):
+        return getattr(self._pool, name)
+
+    def acquire(self):
+        return _Acquire(self._pool, self._statements)
+
+
+def sequential_scans(plan):
+    """Yields relation names of every Seq Scan node in an EXPLAIN (FORMAT JSON) plan"""
+    if plan.get("Node Type") == "Seq Scan":
+        yield plan.get("Relation Name")
+    for child in plan.get("Plans", []):
+        yield from sequential_scans(child)
+
+
+@pytest.fixture(scope="module")
+def seeded_database():
+    import psycopg2
+    from src.database_service import create_tables as schema
+
+    conn = psycopg2.connect(TEST_DATABASE_URL)
+    try:
+        cur = conn.cursor()
+        for table in ("property_statistics", "user_statistics", "user_statistics_shards", "admin_state"):
+            cur.execute(f"DROP TABLE IF EXISTS {table} CASCADE")
+        conn.commit()
+        schema.clear_database(conn)
+        for create in (
+            schema.create_users_table, schema.create_properties_table, schema.create_photo_blobs_table,
+            schema.create_property_photos_table,
+            schema.create_user_property_preferences_table, schema.create_user_favorites_table,
+            schema.create_property_statistics_table, schema.create_user_statistics_table,
+            schema.create_user_statistics_shards_table, schema.create_admin_state_table,
+            schema.create_indexes,
+        ):
+            create(conn)
+        cur.execute(SEED_SQL)
+        conn.commit()
+        conn.autocommit = True
+        cur.execute("ANALYZE")
+        cur.close()
+    finally:
+        conn.close()
+    return TEST_DATABASE_URL
+
+
+def new_property(**overrides):
+    """Property in the shape of the service's request model"""
+    values = {
+        "return_contact": "1", "property_type": "квартира", "deal_type": "аренда", "price": 50000,
+        "city": "Город 7", "area": "Район 7", "street": None, "house_number": None, "apartment_number": None,
+        "rooms": 2, "balcony": True, "renovated": "Да", "total_area": 40, "floor": 3, "total_floors": 9,
+        "deposit": 1000, "description": "Объявление",
+    }
+    values.update(overrides)
+    return SimpleNamespace(**values)
+
+
+def new_filter(telegram_id):
+    return SimpleNamespace(
+        telegram_id=telegram_id, name="Новый фильтр", property_type="квартира", deal_type="аренда",
+        city="Город 7", areas="Район 7, Район 8", min_price=0, max_price=100000, min_rooms=None,
+        max_rooms=None, min_total_area=None, max_total_area=None, balcony=None, renovated=None,
+        min_deposit=None, max_deposit=None, floor=None, is_active=True, total_floors=None,
+    )
+
+
+def metered_methods(manager_class):
+    """Public coroutines wrapped by meter_methods"""
+    return {name for name, method in vars(manager_class).items() if hasattr(method, "__wrapped__")}
+
+
+def method_calls():
+    from src.database_service.db_metrics import DB_METHOD_SECONDS
+
+    return {name: sum(child.counts) for (name,), child in DB_METHOD_SECONDS.children()}
+
+
+async def run_manager_queries(manager):
+    """Calls every public coroutine of SqlDatabaseManager"""
+    telegram_id = 1000 + 42
+    filter_id = await manager.pool._pool.fetchval(
+        "SELECT id FROM user_property_preferences WHERE telegram_id = $1 LIMIT 1", telegram_id
+    )
+    property_id = PROPERTIES // 2
+
+    await manager.listen_admin_changes()
+    async with manager.pool.acquire() as conn:
+        await manager.check_user(conn, telegram_id)
+    await manager.add_filter(new_filter(telegram_id))
+    await manager.update_filter(telegram_id, filter_id, "min_price", 1000)
+    await manager.update_filter_list_param(telegram_id, filter_id, "areas", json.dumps(["Район 1"]))
+    await manager.get_filter(filter_id)
+    await manager.get_filters(telegram_id)
+    added_filter_id = await manager.pool._pool.fetchval(
+        "SELECT max(id) FROM user_property_preferences WHERE telegram_id = $1", telegram_id
+    )
+    await manager.delete_filter(telegram_id, added_filter_id)
+    await manager.add_to_favorites(telegram_id, property_id)
+    favorite_id = await manager.pool._pool.fetchval(
+        "SELECT max(id) FROM user_favorites WHERE telegram_id = $1", telegram_id
+    )
+    await manager.remove_from_favorites(favorite_id)
+    await manager.get_favorites(telegram_id, 0, 10)
+    await manager.get_property_for_filter(filter_id, telegram_id)
+    # Cursor past the end: the second lookup searches for unseen rows behind it
+    manager.search_sessions.get(telegram_id, filter_id).advance(PROPERTIES * 2)
+    await manager.get_property_for_filter(filter_id, telegram_id)
+    # Without the filter index loaded both matchers go to SQL
+    await manager.get_filters_for_property(new_property())
+    await manager.get_filters_for_properties([new_property(), new_property(city="Город 8")])
+    await manager.load_filter_index()
+    await manager.get_property_details(property_id)
+    await manager.get_property_card(property_id, viewer=telegram_id)
+    await manager.get_property_photos_count(property_id)
+    await manager.get_property_photo_path(property_id, 1)
+    await manager.get_properties(0, 10)
+    first_page = await manager.get_properties_page(None, 10)
+    await manager.get_properties_page(first_page["next_cursor"], 10)
+    favorites = await manager.get_favorites_page(telegram_id, None, 1)
+    await manager.get_favorites_page(telegram_id, favorites["next_cursor"], 1)
+    await manager.get_property_statistics(property_id)
+    await manager.is_admin(telegram_id)
+    await manager.get_admins()
+    await manager.register_admin(telegram_id)
+    await manager.unregister_admin(telegram_id)
+    await manager.change_property_state(property_id, "Активно")
+    await manager.increase_statistics(property_id, "views", 3)
+    await manager.flush_statistics()
+    await manager.get_statistics()
+    await manager.delete_property(PROPERTIES)
+    new_property_id = await manager.add_property(new_property())
+    await manager.add_properties([new_property(), new_property(price=70000)])
+    blobs = [(f"{'0' * 63}{digit}", f"/ad_images/blobs/{digit}", 1) for digit in range(3)]
+    await manager.acquire_blobs(blobs)
+    await manager.upload_images(blobs, new_property_id)
+    await manager.release_blobs([blob[0] for blob in blobs])
+
+    async def keep_files(paths):
+        pass
+
+    await manager.collect_blobs(keep_files, 3600, 100)
+
+
+@pytest.mark.asyncio
+async def test_manager_queries_use_indexes(seeded_database):
+    from src.database_service.db_manager import SqlDatabaseManager
+
+    manager = SqlDatabaseManager(seeded_database, min_size=1, max_size=2)
+    await manager.connect()
+    statements = []
+    manager.pool = RecordingPool(manager.pool, statements)
+    calls_before = method_calls()
+    try:
+        await run_manager_queries(manager)
+        calls = method_calls()
+        missed = sorted(
+            name for name in metered_methods(SqlDatabaseManager)
+            if calls.get(name, 0) == calls_before.get(name, 0)
+        )
+
+        offenders = []
+        conn = await asyncpg.connect(seeded_database)
+        try:
+            for query, args in statements:
+                if not query.lstrip().upper().startswith(("SELECT", "WITH", "UPDATE", "DELETE")):
+                    continue
+                plan = json.loads(await conn.fetchval(f"EXPLAIN (FORMAT JSON) {query}", *args))[0]["Plan"]
+                scanned = set(sequential_scans(plan)) & LARGE_TABLES
+                if scanned:
+                    offenders.append(f"{sorted(scanned)}: {' '.join(query.split())}")
+        finally:
+            await conn.close()
+    finally:
+        manager.pool = manager.pool._pool
+        await manager.disconnect()
+
+    assert not missed, f"run_manager_queries does not call {missed}"
+    assert statements, "no statements were recorded"
+    assert not offenders, "sequential scans on large tables:\n" + "\n".join(offenders)
@@ -0,0 +1,51 @@
+from types import SimpleNamespace
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import FileResponse
+
+from src.database_service.request_context import RequestContextMiddleware
+from src.logging_config import request_id_var, user_id_var
+
+
+@pytest.fixture
+def app(tmp_path):
+    photo = tmp_path / "photo.jpg"
+    photo.write_bytes(b"\xff\xd8" + b"\x00" * 1024)
+
+    app = FastAPI()
+    app.state.database_manager = SimpleNamespace(admin_version=7)
+    app.add_middleware(RequestContextMiddleware)
+
+    @app.get("/context")
+    async def context(telegram_id: int = 0):
+        return {"request_id": request_id_var.get(), "user_id": user_id_var.get()}
+
+    @app.get("/photo")
+    async def get_photo():
+        return FileResponse(photo)
+
+    return app
+
+
+@pytest.mark.asyncio
+async def test_request_id_is_adopted_and_headers_added(app):
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        response = await client.get("/context", params={"telegram_id": 42}, headers={"X-Request-ID": "req-1"})
+        generated = await client.get("/context")
+
+    assert response.json() == {"request_id": "req-1", "user_id": 42}
+    assert response.headers["X-Request-ID"] == "req-1"
+    assert response.headers["X-Admin-Version"] == "7"
+    assert generated.headers["X-Request-ID"] == generated.json()["request_id"]
+
+
+@pytest.mark.asyncio
+async def test_file_responses_pass_through(app):
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        response = await client.get("/photo")
+
+    assert response.status_code == 200
+    assert len(response.content) == 1026
+    assert response.headers["X-Admin-Version"] == "7"
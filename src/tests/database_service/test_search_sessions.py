@@ -0,0 +1,45 @@
+from src.database_service.search_sessions import SearchSession, SearchSessionStore
+
+def test_session_keeps_shown_ids_sorted():
+    session = SearchSession()
+    for property_id in (5, 9, 2, 9, 7):
+        session.advance(property_id)
+
+    assert list(session.shown) == [2, 5, 7, 9]
+    assert session.cursor == 9
+    assert session.is_shown(7)
+    assert not session.is_shown(3)
+
+def test_store_evicts_least_recently_used():
+    store = SearchSessionStore(max_sessions=2)
+    store.get(1, 10).advance(3)
+    store.get(2, 20)
+    store.get(1, 10)
+    store.get(3, 30)
+
+    assert len(store) == 2
+    assert store.get(1, 10).cursor == 3
+    assert store.reset(2, 20) is None
+
+def test_drop_filter_resets_its_sessions():
+    store = SearchSessionStore()
+    store.get(1, 10).advance(3)
+    store.get(1, 11).advance(4)
+
+    store.drop_filter(10)
+
+    assert store.get(1, 10).cursor == 0
+    assert store.get(1, 11).cursor == 4
+
+def test_behind_scan_runs_again_only_after_changes():
+    store = SearchSessionStore()
+    session = store.get(1, 10)
+    assert not store.needs_behind_scan(session)
+
+    session.advance(5)
+    assert store.needs_behind_scan(session)
+    store.mark_exhausted(session)
+    assert not store.needs_behind_scan(session)
+
+    store.properties_changed()
+    assert store.needs_behind_scan(session)
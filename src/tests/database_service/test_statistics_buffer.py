@@ -0,0 +1,55 @@
+from src.database_service.statistics_buffer import StatisticsBuffer
+
+
+def test_add_accumulates_per_property_and_totals():
+    buffer = StatisticsBuffer(flush_threshold=100, shards=4)
+    buffer.add(1, "views")
+    buffer.add(1, "views")
+    buffer.add(2, "likes", 3)
+
+    assert buffer.pending_for(1) == {"views": 2, "likes": 0, "favorites": 0}
+    assert buffer.pending_for(3) == {"views": 0, "likes": 0, "favorites": 0}
+    assert buffer.pending_totals() == {"views": 2, "likes": 3, "favorites": 0}
+
+
+def test_add_signals_threshold():
+    buffer = StatisticsBuffer(flush_threshold=2)
+    assert buffer.add(1, "views") is False
+    assert buffer.add(1, "views") is True
+
+
+def test_take_and_restore():
+    buffer = StatisticsBuffer()
+    buffer.add(1, "favorites")
+    pending, totals = buffer.take()
+
+    assert pending == {1: [0, 0, 1]}
+    # The batch being written is still visible to readers
+    assert buffer.pending_totals() == {"views": 0, "likes": 0, "favorites": 1}
+
+    buffer.add(1, "views")
+    assert buffer.pending_for(1) == {"views": 1, "likes": 0, "favorites": 1}
+    buffer.restore(pending, totals)
+    assert buffer.pending_for(1) == {"views": 1, "likes": 0, "favorites": 1}
+    assert buffer.pending_totals() == {"views": 1, "likes": 0, "favorites": 1}
+
+
+def test_commit_drops_in_flight_batch():
+    buffer = StatisticsBuffer()
+    buffer.add(1, "views", 2)
+    buffer.take()
+    buffer.add(1, "likes")
+
+    assert buffer.pending_for(1) == {"views": 2, "likes": 1, "favorites": 0}
+    buffer.commit()
+    assert buffer.pending_for(1) == {"views": 0, "likes": 1, "favorites": 0}
+    assert buffer.pending_totals() == {"views": 0, "likes": 1, "favorites": 0}
+
+
+def test_discard_and_shard_range():
+    buffer = StatisticsBuffer(shards=3)
+    buffer.add(5, "views")
+    buffer.discard(5)
+
+    assert buffer.pending_for(5)["views"] == 0
+    assert all(0 <= buffer.pick_shard() < 3 for _ in range(50))
@@ -0,0 +1,107 @@
+import json
+import logging
+
+import pytest
+
+from src import logging_config
+from src.logging_config import SamplingFilter, log_context, setup_logging, stop_logging
+
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.lines = []
+
+    def emit(self, record):
+        self.lines.append(self.format(record))
+
+
+@pytest.fixture
+def captured():
+    stop_logging()
+    root = logging.getLogger()
+    level = root.level
+    handler = ListHandler()
+    setup_logging("test", handler=handler, levels="tests.quiet=WARNING")
+    yield handler
+    stop_logging()
+    root.setLevel(level)
+    logging.getLogger("tests.quiet").setLevel(logging.NOTSET)
+
+
+class Counted:
+    renders = 0
+
+    def __str__(self):
+        Counted.renders += 1
+        return "counted"
+
+
+def test_records_are_json_with_context(captured):
+    logger = logging.getLogger("tests.logging")
+
+    with log_context("req-1", user_id=42):
+        logger.info("Property %s shown", 7, extra={"route": "search:"})
+    logger.warning("outside")
+    stop_logging()
+
+    inside, outside = (json.loads(line) for line in captured.lines)
+    assert inside["message"] == "Property 7 shown"
+    assert inside["request_id"] == "req-1"
+    assert inside["user_id"] == 42
+    assert inside["route"] == "search:"
+    assert inside["service"] == "test"
+    assert "request_id" not in outside and "user_id" not in outside
+
+
+def test_only_emitted_records_are_rendered_before_queueing(captured):
+    Counted.renders = 0
+    log_queue = logging_config.queue.Queue()
+    handler = logging_config.LazyQueueHandler(log_queue)
+
+    logging.getLogger("tests.quiet").info("skipped %s", Counted())
+    assert Counted.renders == 0
+
+    params = {"city": "Москва"}
+    handler.handle(logging.LogRecord("tests", logging.INFO, __file__, 1, "queued %s %s", (Counted(), params), None))
+    # The handler keeps mutating its objects after the call returns
+    params["rooms"] = 2
+
+    assert Counted.renders == 1
+    assert log_queue.get_nowait().getMessage() == "queued counted {'city': 'Москва'}"
+
+
+def test_exception_text_is_captured_before_queueing(captured):
+    logger = logging.getLogger("tests.logging")
+
+    try:
+        raise KeyError("property")
+    except KeyError:
+        logger.exception("failed")
+    stop_logging()
+
+    record = json.loads(captured.lines[-1])
+    assert record["message"] == "failed"
+    assert "KeyError: 'property'" in record["exc_info"]
+
+
+def test_sampling_keeps_warnings_and_uses_longest_prefix():
+    sampling = SamplingFilter({"src.bot_logic": 0.0, "src.bot_logic.router": 1.0})
+
+    def record(name, level):
+        return logging.LogRecord(name, level, __file__, 1, "message", None, None)
+
+    assert not sampling.filter(record("src.bot_logic.utils", logging.INFO))
+    assert sampling.filter(record("src.bot_logic.utils", logging.WARNING))
+    assert sampling.filter(record("src.bot_logic.router", logging.INFO))
+    assert sampling.filter(record("src.database_service.main", logging.DEBUG))
+    assert sampling.dropped == 1
+
+
+def test_full_queue_drops_instead_of_blocking():
+    handler = logging_config.LazyQueueHandler(logging_config.queue.Queue(1))
+
+    for _ in range(3):
+        handler.handle(logging.LogRecord("tests", logging.INFO, __file__, 1, "message", None, None))
+
+    assert handler.dropped == 2
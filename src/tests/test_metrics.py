@@ -0,0 +1,62 @@
+import httpx
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import Response
+
+from src.metrics import MetricsMiddleware, MetricsRegistry
+
+
+def test_render_prometheus_text():
+    registry = MetricsRegistry()
+    requests = registry.counter("app_requests_total", "Requests", ("route",))
+    latency = registry.histogram("app_latency_seconds", "Latency", buckets=(0.1, 1.0))
+    pool = registry.gauge("app_pool_size", "Pool size")
+    pool.set_function(lambda: 4)
+
+    requests.labels('/a"b').inc()
+    requests.labels('/a"b').inc(2)
+    for value in (0.05, 0.1, 0.5, 3.0):
+        latency.observe(value)
+
+    text = registry.render()
+
+    assert '# TYPE app_requests_total counter\napp_requests_total{route="/a\\"b"} 3\n' in text
+    assert 'app_latency_seconds_bucket{le="0.1"} 2\n' in text
+    assert 'app_latency_seconds_bucket{le="1"} 3\n' in text
+    assert 'app_latency_seconds_bucket{le="+Inf"} 4\n' in text
+    assert "app_latency_seconds_sum 3.65\napp_latency_seconds_count 4\n" in text
+    assert "app_pool_size 4\n" in text
+
+
+def test_register_returns_existing_metric():
+    registry = MetricsRegistry()
+    first = registry.counter("app_total", "Total", ("route",))
+
+    assert registry.counter("app_total", "Total", ("route",)) is first
+    with pytest.raises(ValueError):
+        registry.gauge("app_total", "Total", ("route",))
+    with pytest.raises(ValueError):
+        first.labels("a", "b")
+
+
+@pytest.mark.asyncio
+async def test_middleware_labels_by_route_template():
+    registry = MetricsRegistry()
+    app = FastAPI()
+    app.add_middleware(MetricsMiddleware, prefix="test", registry=registry)
+
+    @app.get("/properties/{property_id}/photo/{photo_num}")
+    async def photo(property_id: int, photo_num: int):
+        return Response(content=b"x" * 10, media_type="image/jpeg")
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        await client.get("/properties/1/photo/0")
+        await client.get("/properties/2/photo/1")
+        await client.get("/missing")
+
+    route = "/properties/{property_id}/photo/{photo_num}"
+    assert registry.get("test_http_requests_total").labels("GET", route, "200").value == 2
+    assert registry.get("test_http_requests_total").labels("GET", "unmatched", "404").value == 1
+    assert registry.get("test_http_response_bytes_total").labels(route).value == 20
+    assert registry.get("test_http_requests_in_flight").labels("GET").value == 0
+    assert sum(registry.get("test_http_request_duration_seconds").labels("GET", route).counts) == 2